@@ -7,12 +7,32 @@ SEC_BULK_COMPANYFACTS = "https://www.sec.gov/Archives/edgar/daily-index/xbrl/com
 SEC_BULK_SUBMISSIONS = "https://www.sec.gov/Archives/edgar/daily-index/bulkdata/submissions.zip"
 SEC_API_XBRL_COMPANYCONCEPT_URL = "https://data.sec.gov/api/xbrl/companyconcept"
 SEC_API_XBRL_COMPANYFACTS_URL  = "https://data.sec.gov/api/xbrl/companyfacts"
+SEC_API_SUBMISSIONS_URL = "https://data.sec.gov/submissions"
 SEC_FILES_COMPANY_TICKERS = "https://www.sec.gov/files/company_tickers.json"
 SEC_FILES_COMPANY_TICKERS_EXCHANGES = "https://www.sec.gov/files/company_tickers_exchange.json"
 #INTERNAL FILE LOCATION
 # change paths if pysec downloader is changed to separate project?
 TICKERS_CIK_FILE = "./resources/company_tickers.json"
-SEC_RATE_LIMIT_DELAY = 110 #ms
+SEC_RATE_LIMIT = 10 #requests/s
+SEC_RATE_LIMIT_TARGET = 9.5 #requests/s, default rate of the rate limiters
+RETRY_STATUS_CODES = (500, 502, 503, 504, 403, 429)
+THROTTLE_STATUS_CODES = (403, 429)
+RETRY_BACKOFF_FACTOR = 0.3 #s
+RETRY_BACKOFF_MAX = 10 #s
+FILE_NUM_JOURNAL_COMPACT_SIZE = 256 * 1024 #bytes, journal size at which the file number index is compacted
+SUBMISSIONS_FILING_COLUMNS = ["accessionNumber", "filingDate", "form", "primaryDocument", "fileNumber"] #columns of the submissions files that are used
+CHECK_INDEX_STATE_FILE = "check_index_state.json" #in root_path/index, used by IndexHandler.check_index(incremental=True)
+# filters of a job passed to Downloader.get_filings_many and their defaults
+FILINGS_JOB_DEFAULTS = {
+    "after_date": "",
+    "before_date": "",
+    "query": "",
+    "prefered_file_type": "",
+    "number_of_filings": 100,
+    "want_amendments": True,
+    "skip_not_prefered_extension": False,
+    "weight": 1,
+}
 PREFERED_FILE_TYPE_MAP = {
     "S-1": "htm",
     "S-3": "htm",
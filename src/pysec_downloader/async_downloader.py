@@ -0,0 +1,342 @@
+r'''
+asyncio version of the Downloader.
+
+the sec rate limit stays the same, but while one request waits on the
+network the next one can already be sent, and resolving urls or writing
+files no longer holds up the requests. the blocking work (requests, parsing,
+writing) runs in threads, the rate limiter is shared with every other
+Downloader on the host.
+
+usage:
+
+    import asyncio
+
+    adl = AsyncDownloader(r"C:\Users\Download_Folder", user_agent="john smith js@test.com")
+    asyncio.run(adl.get_filings(ticker_or_cik="AAPL", form_type="8-K", number_of_filings=50))
+'''
+from io import BytesIO
+from pathlib import Path
+from posixpath import join as urljoin
+import asyncio
+import inspect
+import logging
+
+import requests
+
+from ._constants import *
+from .downloader import Downloader
+from .json_parsing import load_companyfacts, loads
+from .rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDownloader:
+    '''download filings and xbrl data with up to max_in_flight requests at once.
+
+    wraps a Downloader (available as .downloader) and reuses its rate
+    limiter, lookup table and index handler. the requests go through a
+    session of its own with a connection pool of max_in_flight, it takes
+    the headers, proxies and auth of the session of the Downloader.
+
+    Args:
+        root_path: where to save the downloaded files
+        user_agent: str of 'name surname email' to comply with sec guidelines
+        retries: how many retries per request are allowed
+        rate_limiter: a RateLimiter all requests draw from
+        max_in_flight: maximum amount of concurrent requests
+        downloader: an existing Downloader to wrap instead of creating a new one
+    '''
+    def __init__(
+            self,
+            root_path: str = None,
+            user_agent: str = None,
+            retries: int = 10,
+            rate_limiter: RateLimiter = None,
+            max_in_flight: int = 10,
+            downloader: Downloader = None):
+        if downloader is None:
+            if root_path is None:
+                raise ValueError("either root_path or downloader have to be given")
+            downloader = Downloader(root_path, retries=retries, user_agent=user_agent, rate_limiter=rate_limiter)
+        self.downloader = downloader
+        self.root_path = downloader.root_path
+        self.user_agent = downloader.user_agent
+        self.index_handler = downloader.index_handler
+        self.max_in_flight = max_in_flight
+        # connections of the session are shared between the worker threads
+        self._session = requests.Session()
+        for attribute in ("headers", "proxies", "auth", "verify", "cert"):
+            setattr(self._session, attribute, getattr(downloader._session, attribute))
+        adapter = requests.adapters.HTTPAdapter(
+            max_retries=downloader._session.get_adapter("https://").max_retries,
+            pool_maxsize=max(max_in_flight, 10))
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    async def get_filing_by_accession_number(self, cik: str, form_type: str, accession_number: str, save_name: str, filing_date: str, file_nums: str, save: bool=True, create_index: bool=True, extract_zip: bool=True, skip_existing: bool=True) -> bool:
+        '''async version of Downloader.get_filing_by_accession_number'''
+        dl = self.downloader
+        form_type = dl._sanitize_form_type(form_type)
+        if (skip_existing is True) and self.index_handler.has_filing(cik, accession_number):
+            logger.debug(f"skipped {cik}:{accession_number}, already downloaded")
+            return True
+        base_url = urljoin(EDGAR_ARCHIVES_BASE_URL, cik)
+        file_url = urljoin(base_url, accession_number, save_name)
+        file, _ = await self._download_filing(file_url, skip=False, fallback_url=None)
+        if not file:
+            logger.debug("didnt save/get filing despite that it should have. file was None")
+            return False
+        if Path(save_name).suffix == ".htm":
+            file = await asyncio.to_thread(dl._resolve_relative_urls, file, base_url)
+        if save is True:
+            await asyncio.to_thread(dl._save_filing, cik, form_type, accession_number, save_name, file, extract_zip=extract_zip)
+            if (create_index is True) and (file_nums is not None):
+                for file_num in file_nums:
+                    self.index_handler._create_indexes(cik, form_type, accession_number, save_name, file_num, filing_date)
+        return True
+
+    async def get_filings(
+        self,
+        ticker_or_cik: str | list[str],
+        form_type: str | list[str],
+        after_date: str = "",
+        before_date: str = "",
+        query: str = "",
+        prefered_file_type: str | dict = "",
+        number_of_filings: int = 100,
+        want_amendments: bool = True,
+        skip_not_prefered_extension: bool = False,
+        save: bool = True,
+        extract_zip = True,
+        create_index = True,
+        resolve_urls: bool = True,
+        callback = None,
+        skip_existing: bool = True):
+        '''async version of Downloader.get_filings.
+
+        callback can be a function or a coroutine function.
+        '''
+        return await self._get_filings(
+            ticker_or_cik, form_type, after_date, before_date, query,
+            prefered_file_type, number_of_filings, want_amendments,
+            skip_not_prefered_extension, save, extract_zip, create_index,
+            resolve_urls, callback, skip_existing, bulk_index=False)
+
+    async def get_filings_bulk(
+        self,
+        ticker_or_cik: str | list[str],
+        form_type: str | list[str],
+        after_date: str = "",
+        before_date: str = "",
+        query: str = "",
+        prefered_file_type: str | dict = "",
+        number_of_filings: int = 100,
+        want_amendments: bool = True,
+        skip_not_prefered_extension: bool = False,
+        save: bool = True,
+        extract_zip = True,
+        create_index = True,
+        resolve_urls: bool = True,
+        callback = None,
+        skip_existing: bool = True):
+        '''async version of Downloader.get_filings_bulk.
+
+        callback can be a function or a coroutine function.
+        '''
+        return await self._get_filings(
+            ticker_or_cik, form_type, after_date, before_date, query,
+            prefered_file_type, number_of_filings, want_amendments,
+            skip_not_prefered_extension, save, extract_zip, create_index,
+            resolve_urls, callback, skip_existing, bulk_index=True)
+
+    async def get_xbrl_companyconcept(self, ticker_or_cik: str, taxonomy: str, tag: str) -> dict:
+        '''async version of Downloader.get_xbrl_companyconcept'''
+        dl = self.downloader
+        cik10 = dl._convert_to_cik10(ticker_or_cik)
+        url = urljoin(SEC_API_XBRL_COMPANYCONCEPT_URL, "CIK" + cik10, taxonomy, tag + ".json")
+        resp = await self._request_cached("companyconcept", "GET", url=url, headers=dl._sec_xbrl_api_headers)
+        return await asyncio.to_thread(loads, resp.content)
+
+    async def get_xbrl_companyfacts(
+        self,
+        ticker_or_cik: str,
+        from_bulk_archive: bool = True,
+        taxonomies: list[str] = None,
+        tags: list[str] = None,
+        forms: list[str] = None) -> dict:
+        '''async version of Downloader.get_xbrl_companyfacts'''
+        dl = self.downloader
+        cik10 = dl._convert_to_cik10(ticker_or_cik)
+        filename = "CIK" + cik10 + ".json"
+        if from_bulk_archive is True:
+            archive = self.index_handler._get_bulk_archive("companyfacts.zip")
+            if (archive is not None) and (filename in archive):
+                if (taxonomies is None) and (tags is None) and (forms is None):
+                    return await asyncio.to_thread(archive.read_json, filename)
+                content = await asyncio.to_thread(archive.read, filename)
+                return await asyncio.to_thread(load_companyfacts, BytesIO(content), taxonomies, tags, forms)
+        url = urljoin(SEC_API_XBRL_COMPANYFACTS_URL, filename)
+        resp = await self._request_cached("companyfacts", "GET", url=url, headers=dl._sec_xbrl_api_headers)
+        if (taxonomies is None) and (tags is None) and (forms is None):
+            return await asyncio.to_thread(loads, resp.content)
+        return await asyncio.to_thread(load_companyfacts, BytesIO(resp.content), taxonomies, tags, forms)
+
+    async def get_file_company_tickers(self) -> dict:
+        '''async version of Downloader.get_file_company_tickers'''
+        resp = await self._get(url=SEC_FILES_COMPANY_TICKERS, headers=self.downloader._sec_files_headers)
+        content = resp.json()
+        if "error" in content:
+            logger.error(f"Couldnt fetch company_tickers.json file. got: {content}")
+        return content
+
+    async def get_bulk_companyfacts(self, extract: bool=True, ciks: list[str] = None, extract_workers: int = None, skip_unchanged: bool = False):
+        '''async version of Downloader.get_bulk_companyfacts, runs in a thread.'''
+        return await asyncio.to_thread(self.downloader.get_bulk_companyfacts, extract, ciks, extract_workers, skip_unchanged)
+
+    async def get_bulk_submissions(self, extract: bool=True, ciks: list[str] = None, extract_workers: int = None, skip_unchanged: bool = False):
+        '''async version of Downloader.get_bulk_submissions, runs in a thread.'''
+        return await asyncio.to_thread(self.downloader.get_bulk_submissions, extract, ciks, extract_workers, skip_unchanged)
+
+    async def _get_filings(
+            self, ticker_or_cik, form_type, after_date, before_date, query,
+            prefered_file_type, number_of_filings, want_amendments,
+            skip_not_prefered_extension, save, extract_zip, create_index,
+            resolve_urls, callback, skip_existing: bool, bulk_index: bool):
+        dl = self.downloader
+        dl._current_ticker = ticker_or_cik
+        dl._download_counter = 0
+        cik10s, form_types = dl._prepare_search_args(ticker_or_cik, form_type)
+        hits = await self._json_from_search_api(
+            ticker_or_cik=cik10s,
+            form_type=form_types,
+            number_of_filings=number_of_filings,
+            want_amendments=want_amendments,
+            after_date=after_date,
+            before_date=before_date,
+            query=query)
+        if not hits:
+            logger.debug("returned without downloading because hits was None")
+            return
+        base_metas = dl._get_base_metas_from_hits(hits, form_types, prefered_file_type, skip_not_prefered_extension)
+        if skip_existing is True:
+            base_metas = dl._remove_existing_filings(base_metas)
+        index_entries = {} # {cik: [[form_type, accn, file_name, file_num, filing_date], [...], ...]}
+        # index writes run in a thread, one at a time
+        index_lock = asyncio.Lock()
+
+        async def handle_filing(m):
+            file, save_name = await self._download_filing(m["file_url"], m["skip"], m["fallback_url"])
+            if resolve_urls and file and Path(save_name).suffix == ".htm":
+                file = await asyncio.to_thread(dl._resolve_relative_urls, file, m["base_url"])
+            if save is True:
+                if file:
+                    await asyncio.to_thread(dl._save_filing, m["cik"], m["form_type"], m["accession_number"], save_name, file, extract_zip=extract_zip)
+                    if create_index is True:
+                        for file_num in m["file_num"]:
+                            if bulk_index is True:
+                                index_entries.setdefault(m["cik"], []).append([m["form_type"], m["accession_number"], save_name, file_num, m["filing_date"]])
+                            else:
+                                async with index_lock:
+                                    await asyncio.to_thread(self.index_handler._create_indexes, m["cik"], m["form_type"], m["accession_number"], save_name, file_num, m["filing_date"])
+                else:
+                    logger.debug("didnt save/get filing despite that it should have. file was None")
+            if callback is not None:
+                result = callback({"file": file, "meta": m})
+                if inspect.isawaitable(result):
+                    await result
+
+        # max_in_flight workers take the filings one by one, so at most
+        # max_in_flight downloaded bodies wait to be saved and indexed
+        pending = iter(base_metas)
+
+        async def worker():
+            for m in pending:
+                await handle_filing(m)
+
+        await asyncio.gather(*[worker() for _ in range(min(self.max_in_flight, len(base_metas)))])
+        if bulk_index is True:
+            for cik, entries in index_entries.items():
+                await asyncio.to_thread(self.index_handler._create_indexes_bulk, cik, entries)
+        await asyncio.to_thread(self.index_handler.flush)
+        logger.info(f"Ticker: {dl._current_ticker}, Downloads: {dl._download_counter}, Form: {form_type}")
+
+    async def _json_from_search_api(
+            self,
+            ticker_or_cik: str | list[str],
+            form_type: str | list[str],
+            number_of_filings: int = 20,
+            want_amendments = False,
+            after_date: str = "",
+            before_date: str = "",
+            query: str = ""
+            ) -> list:
+        '''async version of Downloader._json_from_search_api.
+
+        the pages depend on each other, so Downloader._iter_search_api_pages
+        requests them one after another in a thread.
+        '''
+        pages = self.downloader._iter_search_api_pages(
+            ticker_or_cik, form_type, number_of_filings, want_amendments, after_date, before_date, query)
+        gathered_responses = []
+        while (hits := await asyncio.to_thread(next, pages, None)) is not None:
+            gathered_responses += hits
+        return gathered_responses[:number_of_filings]
+
+    async def _download_filing(self, file_url: str, skip: bool, fallback_url=None):
+        '''async version of Downloader._download_filing'''
+        if file_url is None and skip is True:
+            return None, None
+        headers = self.downloader._sec_files_headers
+        resp = await self._get(url=file_url, headers=headers)
+        save_name = Path(file_url).name
+        if resp.status_code == 404:
+            if (skip is True) or (fallback_url is None):
+                logger.debug(f"skipping {file_url}")
+                return None, None
+            resp = await self._get(url=fallback_url, headers=headers)
+            save_name = Path(fallback_url).name
+        try:
+            resp.raise_for_status()
+        except requests.HTTPError as e:
+            logger.info(("unhandled HTTPError", e), exc_info=True)
+        filing = resp.content if resp.content else None
+        self.downloader._download_counter += 1
+        return filing, save_name
+
+    async def _request_cached(self, endpoint: str, method: str, url: str, headers: dict, body: dict = None) -> requests.Response:
+        '''async version of Downloader._request_cached'''
+        cache = self.downloader.cache
+        send = self._post if method == "POST" else self._get
+        kwargs = {"json": body} if body is not None else {}
+        if cache is None:
+            return await send(url=url, headers=headers, **kwargs)
+        key, cached, validators = await asyncio.to_thread(cache.lookup, endpoint, method, url, body)
+        if cached is not None:
+            return cached
+        resp = await send(url=url, headers={**headers, **validators}, **kwargs)
+        return await asyncio.to_thread(cache.store, key, endpoint, resp)
+
+    async def _get(self, *args, **kwargs):
+        return await self._request(self._session.get, *args, **kwargs)
+
+    async def _post(self, *args, **kwargs):
+        return await self._request(self._session.post, *args, **kwargs)
+
+    async def _request(self, method, *args, **kwargs):
+        '''async version of Downloader._rate_limit, sends the request in a thread.'''
+        dl = self.downloader
+        attempt = 0
+        while True:
+            if dl._is_ratelimiting is True:
+                await dl._rate_limiter.acquire_async()
+            try:
+                resp = await asyncio.to_thread(method, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = dl._get_retry_delay_for_exception(e, attempt)
+            else:
+                delay = dl._get_retry_delay_for_response(resp, attempt)
+                if delay is None:
+                    return resp
+            attempt += 1
+            await asyncio.sleep(delay)
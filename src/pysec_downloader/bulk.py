@@ -0,0 +1,484 @@
+'''
+helpers for the bulk zip files of the sec (companyfacts.zip, submissions.zip).
+
+HttpRangeFile lets zipfile read a zip on the sec servers with range requests,
+so only the central directory and the members we need are transferred.
+
+extract_zip_parallel extracts a local zip with a pool of processes.
+
+a manifest (crc32 and size of every extracted member) lets a later sync
+rewrite only the members that changed since, see get_changed_members.
+
+BulkArchive reads single members of a local zip without extracting it.
+'''
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from zipfile import BadZipFile, ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import shutil
+import struct
+import threading
+import zlib
+
+from tqdm.auto import tqdm
+
+from .json_parsing import loads
+
+logger = logging.getLogger(__name__)
+
+_WRITE_BUFFER_SIZE = 1024 * 1024
+
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\003\004"
+
+# zip local file header (30 bytes) + data descriptor (max 24 bytes) + some
+# room for a local extra field that is longer than the central one
+_LOCAL_HEADER_SLACK = 30 + 24 + 256
+
+
+def get_range_headers(headers: dict, byte_range: str = None) -> dict:
+    '''copy headers for a range request, eg: byte_range="bytes=100-"
+
+    ranges refer to the encoded body, so the server mustnt compress it.
+    '''
+    headers = dict(headers) if headers else {}
+    headers["Accept-Encoding"] = "identity"
+    if byte_range is not None:
+        headers["Range"] = byte_range
+    return headers
+
+
+class HttpRangeFile:
+    '''read only, seekable file object backed by http range requests.
+
+    every read that isnt covered by the buffered ranges results in one range
+    request of at least min_fetch bytes. use prefetch() to get a known span
+    (eg: a zip member) with a single request.
+
+    Args:
+        get: function with the signature of requests.get, eg: Downloader._get
+        url: url of the file
+        headers: headers sent with every request
+        tail_size: bytes fetched from the end of the file on creation (the
+                   end of central directory record of a zip is in there)
+        min_fetch: minimum size of a range request
+
+    Raises:
+        OSError: if the server doesnt answer range requests with 206
+    '''
+    def __init__(self, get, url: str, headers: dict = None, tail_size: int = 65536 + 22, min_fetch: int = 65536):
+        self._get_func = get
+        self.url = url
+        self.headers = dict(headers) if headers else {}
+        self.min_fetch = min_fetch
+        self.bytes_transferred = 0
+        self.requests_made = 0
+        self._pos = 0
+        self._buffer = (0, b"")
+        self.size = None
+        data, self.size = self._fetch(f"bytes=-{tail_size}")
+        self._tail = (self.size - len(data), data)
+        self.closed = False
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            n = self.size - self._pos
+        n = max(0, min(n, self.size - self._pos))
+        if n == 0:
+            return b""
+        data = self._read_buffered(self._pos, n)
+        if data is None:
+            self.prefetch(self._pos, max(n, self.min_fetch))
+            data = self._read_buffered(self._pos, n)
+        self._pos += len(data)
+        return data
+
+    def prefetch(self, start: int, length: int):
+        '''fetch bytes start to start + length (clamped to the file size) with one request.'''
+        end = min(self.size, start + length) - 1
+        if start > end:
+            return
+        data, _ = self._fetch(f"bytes={start}-{end}")
+        self._buffer = (start, data)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == os.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError(f"negative seek position: {pos}")
+        self._pos = pos
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self):
+        self.closed = True
+        self._buffer = (0, b"")
+        self._tail = (0, b"")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _read_buffered(self, start: int, n: int) -> bytes | None:
+        for buffer_start, buffer in (self._buffer, self._tail):
+            if buffer_start <= start and start + n <= buffer_start + len(buffer):
+                return buffer[start - buffer_start:start - buffer_start + n]
+        return None
+
+    def _fetch(self, byte_range: str):
+        '''make a range request and return (content, total size of the file)'''
+        resp = self._get_func(url=self.url, headers=get_range_headers(self.headers, byte_range), stream=True)
+        with resp:
+            resp.raise_for_status()
+            if resp.status_code != 206:
+                raise OSError(f"server didnt return a partial response for a range request to {self.url}, got status: {resp.status_code}")
+            content_range = resp.headers.get("Content-Range", "")
+            try:
+                total = int(content_range.rsplit("/", 1)[1])
+            except (IndexError, ValueError):
+                total = self.size
+            data = resp.content
+        self.requests_made += 1
+        self.bytes_transferred += len(data)
+        return data, total
+
+
+class BulkArchive:
+    '''read members of a local bulk zip (companyfacts.zip, submissions.zip) without extracting it.
+
+    the member index (name -> header offset, compressed size, size, compression,
+    crc) is built from the central directory on first use and kept next to
+    the zip as <zip>.index.json. it is rebuilt if the size or modification
+    time of the zip changes. the zip is memory mapped, so reading a member is
+    a slice of the map and one inflate.
+
+    usage:
+
+        with BulkArchive(root_path / "companyfacts.zip") as archive:
+            facts = archive.read_json("CIK0000320193.json")
+
+    Args:
+        path: path of the zip
+
+    Raises:
+        FileNotFoundError: if the zip doesnt exist
+    '''
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.index_path = Path(str(self.path) + ".index.json")
+        self._lock = threading.Lock()
+        self._file = open(self.path, "rb")
+        stat = os.fstat(self._file.fileno())
+        self._signature = [stat.st_size, stat.st_mtime_ns]
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size > 0 else None
+        self._members = self._load_or_build_index()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._members
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def names(self) -> list[str]:
+        return list(self._members.keys())
+
+    def get_member_info(self, name: str) -> dict:
+        '''get size, compressed size and crc32 of a member.
+
+        Raises:
+            KeyError: if there is no member called name
+        '''
+        header_offset, compress_size, file_size, compress_type, crc = self._members[name]
+        return {"file_size": file_size, "compress_size": compress_size, "crc": crc}
+
+    def read(self, name: str) -> bytes:
+        '''read and inflate a member.
+
+        Raises:
+            KeyError: if there is no member called name
+            BadZipFile: if the member is corrupted
+        '''
+        header_offset, compress_size, file_size, compress_type, crc = self._members[name]
+        with self._lock:
+            header = _LOCAL_HEADER.unpack(self._mmap[header_offset:header_offset + _LOCAL_HEADER.size])
+            if header[0] != _LOCAL_HEADER_SIGNATURE:
+                raise BadZipFile(f"bad local file header for {name} in {self.path}")
+            data_offset = header_offset + _LOCAL_HEADER.size + header[10] + header[11]
+            raw = self._mmap[data_offset:data_offset + compress_size]
+        if compress_type == ZIP_STORED:
+            data = raw
+        elif compress_type == ZIP_DEFLATED:
+            data = zlib.decompress(raw, -15, file_size or zlib.DEF_BUF_SIZE)
+        else:
+            with ZipFile(self.path, "r") as z:
+                data = z.read(name)
+        if zlib.crc32(data) != crc:
+            raise BadZipFile(f"bad crc32 for {name} in {self.path}")
+        return data
+
+    def is_current(self) -> bool:
+        '''check if the zip on disk is still the one this archive was opened on'''
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return False
+        return [stat.st_size, stat.st_mtime_ns] == self._signature
+
+    def read_json(self, name: str) -> dict:
+        '''read a member and parse it as json. raises KeyError like read()'''
+        return loads(self.read(name))
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _load_or_build_index(self) -> dict:
+        try:
+            index = json.loads(self.index_path.read_text())
+            if index["signature"] == self._signature:
+                return index["members"]
+        except (OSError, ValueError, KeyError):
+            pass
+        logger.info(f"building member index of {self.path}")
+        with ZipFile(self._file, "r") as z:
+            members = {
+                i.filename: [i.header_offset, i.compress_size, i.file_size, i.compress_type, i.CRC]
+                for i in z.infolist() if not i.is_dir()}
+        tmp_path = Path(str(self.index_path) + ".tmp")
+        try:
+            tmp_path.write_text(json.dumps({"signature": self._signature, "members": members}))
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"couldnt save member index of {self.path}: {e}")
+        return members
+
+
+def get_member_span(info: ZipInfo) -> int:
+    '''upper bound of bytes taken up by the local header, data and data descriptor of a member.'''
+    return _LOCAL_HEADER_SLACK + len(info.filename.encode("utf-8")) + len(info.extra) + info.compress_size
+
+
+def group_members_by_span(members: list[ZipInfo], max_gap: int = 65536, max_group_size: int = 16 * 1024 * 1024) -> list[list[ZipInfo]]:
+    '''group members that lie close to each other in the zip, so each group
+    can be fetched with one range request.
+
+    Returns:
+        lists of members sorted by their offset in the zip
+    '''
+    groups = []
+    group_start = group_end = None
+    for info in sorted(members, key=lambda i: i.header_offset):
+        end = info.header_offset + get_member_span(info)
+        if groups and (info.header_offset - group_end <= max_gap) and (end - group_start <= max_group_size):
+            groups[-1].append(info)
+            group_end = max(group_end, end)
+        else:
+            groups.append([info])
+            group_start, group_end = info.header_offset, end
+    return groups
+
+
+def is_cik_member(name: str, cik10s: set[str]) -> bool:
+    '''check if a member of a bulk zip (CIK##########.json or CIK##########-submissions-###.json) belongs to one of cik10s'''
+    return name[:3] == "CIK" and name[3:13] in cik10s and name[13:14] in (".", "-")
+
+
+def extract_remote_members(range_file: HttpRangeFile, extract_path: str | Path, select) -> list[str]:
+    '''extract the members of a remote zip for which select(name) is True.
+
+    Args:
+        range_file: HttpRangeFile of the zip
+        extract_path: folder to extract into
+        select: function taking a member name and returning a bool
+    Returns:
+        names of the extracted members
+    '''
+    with ZipFile(range_file, "r") as z:
+        return extract_remote_infos(z, range_file, [i for i in z.infolist() if select(i.filename)], extract_path)
+
+
+def extract_remote_infos(z: ZipFile, range_file: HttpRangeFile, members: list[ZipInfo], extract_path: str | Path) -> list[str]:
+    '''extract members of z, a ZipFile opened on range_file. members close
+    to each other are fetched with one request.
+
+    Returns:
+        names of the extracted members
+    '''
+    extracted = []
+    for group in group_members_by_span(members):
+        start = group[0].header_offset
+        end = max(i.header_offset + get_member_span(i) for i in group)
+        range_file.prefetch(start, end - start)
+        for info in group:
+            z.extract(info, extract_path)
+            extracted.append(info.filename)
+    return extracted
+
+
+def extract_zip_parallel(zip_path: str | Path, extract_path: str | Path, workers: int = None, skip_unchanged: bool = False, progress: bool = True, names: set[str] = None) -> dict:
+    '''extract a zip with a pool of processes.
+
+    the members are split into chunks of about the same uncompressed size,
+    each worker opens its own handle on the zip and writes the members of
+    its chunks with a large write buffer.
+
+    Args:
+        zip_path: path of the zip
+        extract_path: folder to extract into, created if it doesnt exist
+        workers: number of processes, defaults to os.cpu_count()
+        skip_unchanged: dont rewrite members whose file already exists with
+                        the same size and crc32
+        progress: show a progress bar (in uncompressed bytes)
+        names: only extract these members
+    Returns:
+        dict with keys: extracted, skipped, bytes_written
+    '''
+    extract_path = Path(extract_path)
+    extract_path.mkdir(parents=True, exist_ok=True)
+    workers = workers if workers else (os.cpu_count() or 1)
+    with ZipFile(zip_path, "r") as z:
+        members = [i for i in z.infolist() if (not i.is_dir()) and ((names is None) or (i.filename in names))]
+    chunks = _split_members(members, workers * 8)
+    stats = {"extracted": 0, "skipped": 0, "bytes_written": 0}
+    with tqdm(total=sum(i.file_size for i in members), unit="B", unit_scale=True, disable=not progress, desc="extracting") as bar:
+        if workers == 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                _add_stats(stats, _extract_members(str(zip_path), str(extract_path), [i.filename for i in chunk], skip_unchanged))
+                bar.update(sum(i.file_size for i in chunk))
+        else:
+            # spawn, forking a process with running threads can deadlock
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = {
+                    pool.submit(_extract_members, str(zip_path), str(extract_path), [i.filename for i in chunk], skip_unchanged): sum(i.file_size for i in chunk)
+                    for chunk in chunks}
+                for future in as_completed(futures):
+                    _add_stats(stats, future.result())
+                    bar.update(futures[future])
+    logger.debug(f"extracted {zip_path} into {extract_path}: {stats}")
+    return stats
+
+
+def _add_stats(stats: dict, other: dict):
+    for key, value in other.items():
+        stats[key] += value
+
+
+def _split_members(members: list[ZipInfo], n: int) -> list[list[ZipInfo]]:
+    '''split members into at most n chunks of about the same uncompressed size'''
+    chunks = [[] for _ in range(min(n, len(members)))]
+    sizes = [0] * len(chunks)
+    for info in sorted(members, key=lambda i: i.file_size, reverse=True):
+        smallest = sizes.index(min(sizes))
+        chunks[smallest].append(info)
+        sizes[smallest] += info.file_size
+    return chunks
+
+
+def _extract_members(zip_path: str, extract_path: str, names: list[str], skip_unchanged: bool) -> dict:
+    '''extract names from the zip at zip_path, runs in a worker process.'''
+    stats = {"extracted": 0, "skipped": 0, "bytes_written": 0}
+    with ZipFile(zip_path, "r") as z:
+        for name in names:
+            info = z.getinfo(name)
+            target = _get_extract_target(Path(extract_path), name)
+            if skip_unchanged and is_unchanged(target, info.file_size, info.CRC):
+                stats["skipped"] += 1
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with z.open(info, "r") as src, open(target, "wb", buffering=_WRITE_BUFFER_SIZE) as dst:
+                shutil.copyfileobj(src, dst, _WRITE_BUFFER_SIZE)
+            stats["extracted"] += 1
+            stats["bytes_written"] += info.file_size
+    return stats
+
+
+def _get_extract_target(extract_path: Path, name: str) -> Path:
+    '''get the path to extract a member to, without leaving extract_path (like ZipFile.extract)'''
+    # drop drive letters, empty, "." and ".." parts
+    name = name.replace("\\", "/").rsplit(":", 1)[-1]
+    parts = [p for p in name.split("/") if p not in ("", ".", "..")]
+    return extract_path.joinpath(*parts)
+
+
+def is_unchanged(path: Path, size: int, crc: int) -> bool:
+    '''check if the file at path has size and crc32 crc'''
+    try:
+        if path.stat().st_size != size:
+            return False
+    except FileNotFoundError:
+        return False
+    value = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(_WRITE_BUFFER_SIZE):
+            value = zlib.crc32(chunk, value)
+    return value == crc
+
+
+def load_manifest(path: str | Path) -> dict:
+    '''load the manifest of an extracted bulk zip.
+
+    Returns:
+        dict with keys:
+            members: {name: [crc32, size]} of the extracted members
+            validators: {name: [etag, last_modified]} of files refreshed from the api
+    '''
+    try:
+        manifest = json.loads(Path(path).read_text())
+        return {"members": manifest.get("members", {}), "validators": manifest.get("validators", {})}
+    except (FileNotFoundError, ValueError):
+        return {"members": {}, "validators": {}}
+
+
+def save_manifest(path: str | Path, manifest: dict):
+    path = Path(path)
+    tmp_path = Path(str(path) + ".tmp")
+    tmp_path.write_text(json.dumps(manifest))
+    os.replace(tmp_path, path)
+
+
+def get_changed_members(members: list[ZipInfo], manifest_members: dict, extract_path: str | Path) -> list[ZipInfo]:
+    '''get the members whose crc32/size differ from the manifest or whose file is missing'''
+    extract_path = Path(extract_path)
+    return [
+        i for i in members
+        if (manifest_members.get(i.filename) != [i.CRC, i.file_size]) or (not _get_extract_target(extract_path, i.filename).is_file())]
+
+
+def remove_members(extract_path: str | Path, names: list[str]) -> int:
+    '''remove the extracted files of names, returns the number of files removed'''
+    removed = 0
+    for name in names:
+        try:
+            _get_extract_target(Path(extract_path), name).unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
@@ -0,0 +1,200 @@
+'''
+persistent cache for responses of the sec apis (full text search, xbrl api).
+
+responses are kept in a sqlite file keyed by the normalized request (method,
+url and json body). every endpoint has its own time to live, after that the
+entry is revalidated with If-None-Match/If-Modified-Since if the sec sent an
+ETag/Last-Modified, otherwise it is requested again. the least recently used
+entries are evicted once the cache grows beyond max_size bytes.
+
+the file can be shared by several Downloaders and processes.
+
+usage:
+
+    cache = ResponseCache(r"C:\\Users\\Download_Folder\\response_cache.sqlite", ttls={"search": 300})
+    dl = Downloader(r"C:\\Users\\Download_Folder", user_agent="john smith js@test.com", cache=cache)
+    # or let the Downloader create one in its root_path
+    dl = Downloader(r"C:\\Users\\Download_Folder", user_agent="john smith js@test.com", cache=True)
+    dl.get_xbrl_companyfacts("AAPL")
+    cache.stats()
+'''
+from pathlib import Path
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTLS = {
+    "search": 600, # s
+    "companyconcept": 3600,
+    "companyfacts": 3600,
+}
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024 # bytes
+
+# headers kept with a cached response, the content is stored decoded so
+# Content-Encoding and Content-Length dont apply anymore
+_KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class ResponseCache:
+    '''sqlite backed cache of successful (200) responses.
+
+    Args:
+        path: location of the sqlite file, created if it doesnt exist
+        ttls: seconds an entry of an endpoint is used without asking the sec,
+              updates DEFAULT_TTLS. endpoints: "search", "companyconcept", "companyfacts"
+        default_ttl: ttl of endpoints not in ttls
+        max_size: bytes of content kept before the least recently used entries are evicted
+    '''
+    def __init__(self, path: str | Path, ttls: dict = None, default_ttl: float = 0, max_size: int = DEFAULT_MAX_SIZE):
+        if max_size <= 0:
+            raise ValueError(f"max_size has to be larger than 0, got: {max_size}")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttls = {**DEFAULT_TTLS, **(ttls if ttls else {})}
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            ("CREATE TABLE IF NOT EXISTS responses ("
+             "key TEXT PRIMARY KEY, endpoint TEXT, url TEXT, headers TEXT, content BLOB, "
+             "etag TEXT, last_modified TEXT, stored_at REAL, last_access REAL, size INTEGER)"))
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._hits = 0
+        self._misses = 0
+        self._revalidations = 0
+        self._evictions = 0
+
+    def get_ttl(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    def make_key(self, method: str, url: str, body: dict = None) -> str:
+        '''normalize a request into a key, the order of keys in body doesnt matter.'''
+        normalized = json.dumps(
+            [method.upper(), url, body], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def lookup(self, endpoint: str, method: str, url: str, body: dict = None):
+        '''look up a request.
+
+        Returns:
+            (key, response, validators): response is the cached requests.Response
+            if it is still fresh, else None. validators are the headers to
+            revalidate an expired entry with, pass them along with the request
+            and hand the response to store().
+        '''
+        key = self.make_key(method, url, body)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, headers, content, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                self._misses += 1
+                return key, None, {}
+            cached_url, headers, content, etag, last_modified, stored_at = row
+            if now - stored_at < self.get_ttl(endpoint):
+                self._hits += 1
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                return key, self._build_response(cached_url, headers, content), {}
+            self._misses += 1
+        validators = {}
+        if etag:
+            validators["If-None-Match"] = etag
+        if last_modified:
+            validators["If-Modified-Since"] = last_modified
+        return key, None, validators
+
+    def store(self, key: str, endpoint: str, resp: requests.Response) -> requests.Response:
+        '''store the response to a request looked up with key.
+
+        Returns:
+            the cached response if resp is a 304 Not Modified, else resp
+        '''
+        now = time.time()
+        if resp.status_code == 304:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT url, headers, content FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._revalidations += 1
+                    self._conn.execute(
+                        "UPDATE responses SET stored_at = ?, last_access = ? WHERE key = ?", (now, now, key))
+                    return self._build_response(*row)
+            # the entry was evicted in the meantime, nothing to answer with
+            logger.debug(f"got 304 for {resp.url} but the cached response is gone")
+            return resp
+        if resp.status_code != 200:
+            return resp
+        content = resp.content
+        if len(content) > self.max_size:
+            return resp
+        headers = {h: resp.headers[h] for h in _KEPT_HEADERS if h in resp.headers}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, resp.url, json.dumps(headers), content,
+                 headers.get("ETag"), headers.get("Last-Modified"), now, now, len(content)))
+            self._evict()
+        return resp
+
+    def clear(self):
+        '''remove all entries'''
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        '''get the counters of this instance and the size of the cache.
+
+        Returns:
+            dict with keys:
+                hits: requests answered from the cache
+                misses: requests not in the cache or expired
+                revalidations: expired entries the sec confirmed as unchanged (304)
+                evictions: entries removed to stay below max_size
+                entries: entries in the cache
+                size: bytes of content in the cache
+        '''
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "revalidations": self._revalidations,
+                "evictions": self._evictions,
+                "entries": entries,
+                "size": size}
+
+    def close(self):
+        self._conn.close()
+
+    def _evict(self):
+        '''remove the least recently used entries until the cache fits in max_size'''
+        size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if size <= self.max_size:
+            return
+        for key, entry_size in self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._evictions += 1
+            size -= entry_size
+            if size <= self.max_size:
+                break
+
+    def _build_response(self, url: str, headers: str, content: bytes) -> requests.Response:
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.url = url
+        resp.headers = CaseInsensitiveDict(json.loads(headers))
+        resp._content = content
+        resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+        return resp
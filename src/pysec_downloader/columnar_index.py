@@ -0,0 +1,309 @@
+'''
+index of the filings of all ciks kept as one partitioned parquet dataset
+(index/columnar_index/<partition>=<value>/*.parquet).
+
+the csv/json index of IndexHandler answers questions about one cik,
+ColumnarIndex answers questions across all of them (eg: every 424B5 filed
+in 2023) without opening the per cik files. filters are pushed down into
+the parquet files, so only matching partitions and row groups are read.
+
+entries are buffered and written to new parquet files by flush(), which
+the Downloader calls at the end of every download (and atexit, for what is
+left over). many small files are merged into one per partition by compact().
+needs pyarrow: pip install pysec-downloader[columnar]
+
+usage:
+
+    columnar_index = ColumnarIndex(r"C:\\Users\\Download_Folder", partition_by="year")
+    index_handler = IndexHandler(r"C:\\Users\\Download_Folder", columnar_index=columnar_index)
+    dl = Downloader(r"C:\\Users\\Download_Folder", user_agent="john smith js@test.com", index_handler=index_handler)
+    # add the entries of an already existing index once
+    columnar_index.build_from_index(index_handler)
+    dl.get_filings("AAPL", "8-K")
+    columnar_index.query(form_types=["424B5"], after_date="2023-01-01", before_date="2023-12-31", as_dataframe=True)
+'''
+from datetime import date
+from os import path
+from pathlib import Path
+from uuid import uuid4
+import atexit
+import logging
+import os
+import shutil
+import threading
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+import pandas as pd
+
+from .downloader import _ensure_no_dash_accn
+
+logger = logging.getLogger(__name__)
+
+PARTITION_KEYS = ("year", "form_type")
+DEFAULT_FLUSH_SIZE = 10000 # buffered entries
+
+_COLUMNS = ["cik", "form_type", "accession_number", "file_number", "file_path", "filing_date"]
+
+
+def _none_if_na(value):
+    return None if pd.isna(value) else str(value)
+
+
+def _get_schema():
+    return pa.schema([
+        ("cik", pa.string()),
+        ("form_type", pa.string()),
+        ("accession_number", pa.string()),
+        ("file_number", pa.string()),
+        ("file_path", pa.string()),
+        ("filing_date", pa.date32()),
+        ("year", pa.int16())])
+
+
+class ColumnarIndex:
+    '''parquet dataset with the index entries of every cik.
+
+    columns: cik, form_type, accession_number, file_number, file_path
+    (relative to root_path/filings) and filing_date.
+
+    Attributes:
+        path: folder of the dataset
+        partition_by: column the dataset is partitioned by
+    Args:
+        root_path: root path of the files, same as for IndexHandler
+        partition_by: "year" (of the filing date) or "form_type", has to match
+                      the partitioning of an existing dataset
+        flush_size: number of buffered entries after which they are written
+    Raises:
+        ImportError: if pyarrow isnt installed
+        ValueError: if partition_by is unknown or differs from the existing dataset
+    '''
+    def __init__(self, root_path: str | Path, partition_by: str = "year", flush_size: int = DEFAULT_FLUSH_SIZE):
+        if pa is None:
+            raise ImportError("ColumnarIndex needs pyarrow, install it with: pip install pysec-downloader[columnar]")
+        if partition_by not in PARTITION_KEYS:
+            raise ValueError(f"partition_by has to be one of {PARTITION_KEYS}, got: {partition_by}")
+        self.path = Path(root_path) / "index" / "columnar_index"
+        existing = self._get_existing_partitioning()
+        if (existing is not None) and (existing != partition_by):
+            raise ValueError(f"the dataset at {self.path} is partitioned by {existing}, not by {partition_by}")
+        self.partition_by = partition_by
+        self.flush_size = flush_size
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # entries added outside of a download (eg: get_filing_by_accession_number) arent lost at exit
+        atexit.register(self.close)
+
+    def add(self, cik: str, items: list[list]):
+        '''buffer index entries, they are written once flush_size is reached.
+
+        Args:
+            cik: cik with leading 0's
+            items: list of entries like so: [[form_type, accn, file_name, file_num, filing_date]]
+        '''
+        rows = [
+            (cik, form_type, _ensure_no_dash_accn(accn), file_num, path.join(cik, form_type, accn, file_name), filing_date)
+            for form_type, accn, file_name, file_num, filing_date in items]
+        with self._buffer_lock:
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= self.flush_size
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        '''write the buffered entries to new parquet files.
+
+        Returns:
+            number of entries written
+        '''
+        with self._buffer_lock:
+            rows, self._buffer = self._buffer, []
+        if rows == []:
+            return 0
+        table = self._rows_to_table(rows)
+        with self._write_lock:
+            self._write(table)
+        logger.debug(f"flushed {len(rows)} entries to the columnar index")
+        return len(rows)
+
+    def close(self):
+        '''write the remaining buffered entries'''
+        self.flush()
+
+    def query(
+        self,
+        form_types: str | list[str] = None,
+        after_date: str | date = None,
+        before_date: str | date = None,
+        ciks: str | list[str] = None,
+        file_numbers: str | list[str] = None,
+        columns: list[str] = None,
+        as_dataframe: bool = False):
+        '''get the entries matching all of the given filters.
+
+        buffered entries are flushed first. arguments left as None dont filter.
+
+        Args:
+            form_types: form type or list of form types
+            after_date: entries filed on or after this date, eg: "2023-01-01"
+            before_date: entries filed on or before this date
+            ciks: cik or list of ciks with leading 0's
+            file_numbers: file number or list of file numbers
+            columns: columns to return, defaults to all
+            as_dataframe: return a pandas DataFrame instead of a pyarrow Table
+        Returns:
+            pyarrow.Table or pandas.DataFrame
+        '''
+        self.flush()
+        columns = columns if columns is not None else _COLUMNS
+        unknown = set(columns) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown columns: {sorted(unknown)}")
+        if not self._has_data():
+            table = _get_schema().empty_table().select(columns)
+        else:
+            expression = self._build_filter(form_types, after_date, before_date, ciks, file_numbers)
+            table = self._get_dataset().to_table(columns=columns, filter=expression)
+        return table.to_pandas() if as_dataframe is True else table
+
+    def compact(self) -> dict:
+        '''merge the files of every partition into one and drop duplicate entries.
+
+        the merged file is written next to the old files (with a "_" prefix,
+        so it isnt read) and renamed before the old files are removed, an
+        interrupted compaction leaves duplicates the next one removes.
+
+        Returns:
+            dict with keys: partitions, files_removed, duplicates_removed
+        '''
+        self.flush()
+        report = {"partitions": 0, "files_removed": 0, "duplicates_removed": 0}
+        if not self._has_data():
+            return report
+        with self._write_lock:
+            for partition in sorted(p for p in self.path.iterdir() if p.is_dir()):
+                files = sorted(partition.glob("*.parquet"))
+                if files == []:
+                    continue
+                table = ds.dataset([str(f) for f in files], format="parquet").to_table()
+                df = table.to_pandas().drop_duplicates(subset=["cik", "file_number", "file_path"])
+                if (len(files) == 1) and (len(df) == len(table)):
+                    continue
+                merged = pa.Table.from_pandas(df, schema=table.schema, preserve_index=False)
+                name = f"part-{uuid4().hex}-0.parquet"
+                pq.write_table(merged, partition / ("_" + name))
+                os.replace(partition / ("_" + name), partition / name)
+                for f in files:
+                    f.unlink()
+                report["partitions"] += 1
+                report["files_removed"] += len(files)
+                report["duplicates_removed"] += len(table) - len(df)
+        logger.info(f"compacted columnar index: {report}")
+        return report
+
+    def build_from_index(self, index_handler) -> int:
+        '''replace the dataset with the entries of index_handler.
+
+        Args:
+            index_handler: IndexHandler or SQLiteIndexHandler of the same root_path
+        Returns:
+            number of entries written
+        '''
+        with self._buffer_lock:
+            self._buffer = []
+        with self._write_lock:
+            if self.path.exists():
+                shutil.rmtree(self.path)
+        filings_path = index_handler.root_path / "filings"
+        written = 0
+        for cik in index_handler._get_indexed_ciks():
+            try:
+                records = index_handler.get_local_filings_by_cik(cik)
+            except (FileNotFoundError, KeyError):
+                continue
+            # the csv index gives NaN for an empty file number
+            rows = [
+                (cik, _none_if_na(r["form_type"]), _none_if_na(r["accession_number"]), _none_if_na(r["file_number"]),
+                 path.relpath(r["file_path"], filings_path), None if pd.isna(r["filing_date"]) else str(r["filing_date"])[:10])
+                for r in records]
+            with self._buffer_lock:
+                self._buffer.extend(rows)
+            written += len(rows)
+            if len(self._buffer) >= self.flush_size:
+                self.flush()
+        self.flush()
+        self.compact()
+        logger.info(f"built columnar index with {written} entries")
+        return written
+
+    def _build_filter(self, form_types, after_date, before_date, ciks, file_numbers):
+        '''combine the filters of query into one expression, partitions are pruned on year/form_type'''
+        expressions = []
+        if form_types is not None:
+            expressions.append(pc.field("form_type").isin(self._as_list(form_types)))
+        if ciks is not None:
+            expressions.append(pc.field("cik").isin(self._as_list(ciks)))
+        if file_numbers is not None:
+            expressions.append(pc.field("file_number").isin(self._as_list(file_numbers)))
+        if after_date is not None:
+            after_date = date.fromisoformat(str(after_date)[:10])
+            expressions.append(pc.field("filing_date") >= pa.scalar(after_date, pa.date32()))
+            if self.partition_by == "year":
+                expressions.append(pc.field("year") >= after_date.year)
+        if before_date is not None:
+            before_date = date.fromisoformat(str(before_date)[:10])
+            expressions.append(pc.field("filing_date") <= pa.scalar(before_date, pa.date32()))
+            if self.partition_by == "year":
+                expressions.append(pc.field("year") <= before_date.year)
+        if expressions == []:
+            return None
+        expression = expressions[0]
+        for e in expressions[1:]:
+            expression = expression & e
+        return expression
+
+    def _rows_to_table(self, rows: list[tuple]):
+        columns = list(zip(*rows))
+        filing_dates = pa.array(columns[5], pa.string()).cast(pa.date32())
+        arrays = [pa.array(c, pa.string()) for c in columns[:5]]
+        arrays += [filing_dates, pc.year(filing_dates).cast(pa.int16())]
+        return pa.Table.from_arrays(arrays, schema=_get_schema())
+
+    def _write(self, table):
+        ds.write_dataset(
+            table,
+            self.path,
+            format="parquet",
+            partitioning=self._get_partitioning(),
+            basename_template=f"part-{uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore")
+
+    def _get_dataset(self):
+        return ds.dataset(self.path, format="parquet", schema=_get_schema(), partitioning=self._get_partitioning())
+
+    def _get_partitioning(self):
+        field = _get_schema().field(self.partition_by)
+        return ds.partitioning(pa.schema([field]), flavor="hive")
+
+    def _get_existing_partitioning(self) -> str | None:
+        if not self.path.exists():
+            return None
+        for p in self.path.iterdir():
+            if p.is_dir() and ("=" in p.name):
+                return p.name.split("=", 1)[0]
+        return None
+
+    def _has_data(self) -> bool:
+        return self.path.exists() and any(self.path.rglob("*.parquet"))
+
+    @staticmethod
+    def _as_list(value) -> list:
+        return [value] if isinstance(value, str) else list(value)
@@ -26,6 +26,7 @@ from bs4 import BeautifulSoup
 import requests
 import json
 from urllib3.util import Retry
+import urllib3
 import time
 from functools import wraps, reduce
 import logging
@@ -33,13 +34,32 @@ import pandas as pd
 from posixpath import join as urljoin
 from pathlib import Path
 from os import PathLike, path
+import os
 from urllib.parse import urlparse
 from zipfile import BadZipFile, ZipFile
-from csv import writer
-from datetime import datetime
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import queue
+import threading
+from csv import reader, writer
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import random
+from collections import OrderedDict
 import pandas as pd
 from tqdm.auto import tqdm
 import shutil
+import zlib
+from contextlib import contextmanager
+from .rate_limiter import RateLimiter, _locked_file, get_default_rate_limiter
+from .cache import ResponseCache
+from .planner import DownloadPlan
+from .submissions_store import SubmissionsStore
+from .json_parsing import load, load_companyfacts, load_submissions, loads
+from .bulk import (
+    BulkArchive, HttpRangeFile, extract_remote_infos, extract_remote_members, extract_zip_parallel, get_changed_members,
+    get_member_span, get_range_headers, is_cik_member, load_manifest, remove_members, save_manifest)
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
@@ -96,19 +116,90 @@ def _get_correct_primary_file_name(main_file: str):
     else:
         return main_file
 
+def _resolve_relative_urls(filing: str, base_url: str):
+    'changes relative to absolute urls.'
+    soup = BeautifulSoup(filing, features="lxml")
+    base = base_url
+    for rurl in soup.find_all("a", href=True):
+        href = rurl["href"]
+        if href.startswith("http") or href.startswith("#"):
+            pass
+        else:
+            rurl["href"] = urljoin(base, href)
+    
+    for image in soup.find_all("img", src=True):
+        image["src"] = urljoin(base, image["src"])
+    
+    return soup.encode(soup.original_encoding) if soup.original_encoding else soup
+
+def _process_filing(file: bytes, save_name: str, base_url: str, resolve_urls: bool, extract_path: str | None):
+    '''cpu bound part of handling a downloaded filing, runs in a worker process.
+
+    resolves relative urls of htm files and extracts zip files into extract_path
+    (if it isnt None). returns the file as bytes.'''
+    if resolve_urls and Path(save_name).suffix == ".htm":
+        file = _resolve_relative_urls(file, base_url)
+        if not isinstance(file, bytes):
+            file = str(file).encode("utf-8")
+    if (extract_path is not None) and (save_name[-3:] == "zip"):
+        Path(extract_path).mkdir(parents=True, exist_ok=True)
+        with ZipFile(BytesIO(file), "r") as z:
+            z.extractall(extract_path)
+    return file
+
+def _parse_retry_after(retry_after: str | None) -> float | None:
+    '''convert the value of a Retry-After header (seconds or http-date) to seconds.'''
+    if not retry_after:
+        return None
+    try:
+        return max(0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def _get_retry_backoff(attempt: int) -> float:
+    '''exponential backoff with jitter in seconds for the attempt-th retry (0 based).'''
+    backoff = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_FACTOR * (2 ** attempt))
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
 
 class IndexHandler:
     '''create, add to and query the index for files downloaded with Downloader
     
     Attributes:
         root_path: root path of the files.
+        submissions_store: columnar copy of the bulk submissions, see SubmissionsStore
+    Args:
+        dataframe_cache_size: number of base indexes kept in memory as dataframes,
+                              they are reloaded if their file changes
+        columnar_index: ColumnarIndex every new entry is also added to
+        stream_json: parse the submissions files incrementally and only keep
+                     the filing columns that are used (needs ijson, otherwise
+                     the files are parsed whole), lowers the memory needed for
+                     companies with a long filing history
     '''
 
-    def __init__(self, root_path):
+    def __init__(self, root_path, dataframe_cache_size: int = 128, columnar_index=None, stream_json: bool = False):
         self.root_path = self._prepare_root_path(root_path)
+        self.columnar_index = columnar_index
+        self.stream_json = stream_json
+        self.submissions_store = SubmissionsStore(self.root_path)
         self._checked_index_creation = False
         self._base_index_path = self.root_path / "index" / "base_index"
         self._num_index_path = self.root_path / "index" / "file_num_index"
+        self._bulk_archives = {}
+        self._accession_numbers = {} # cik: {accession_number: relative file path}
+        self._dataframe_cache_size = dataframe_cache_size
+        self._dataframes = OrderedDict() # cik: ((mtime_ns, size), dataframe), least recently used first
+        self._dataframes_lock = threading.Lock()
+        self._file_num_locks = {} # cik: threading.Lock, guards appending to and compacting the file number index
+        self._file_num_locks_lock = threading.Lock()
 
 
     
@@ -116,25 +207,32 @@ class IndexHandler:
         '''gets all the index entries of form_type and cik.
         
         Returns:
-            dict with keys: form_type, file_number, file_path, filing_date
+            list of dicts with keys: form_type, file_number, file_path, filing_date, accession_number.
+            the values are str, file_number is None if the filing has none
         '''
         df = self._get_base_index_as_dataframe(cik)
-        return df[df["form_type"] == form_type].to_dict("records")
+        return self._dataframe_to_records(df[df["form_type"] == form_type])
     
     def get_local_filings_by_cik(self, cik: str):
         '''gets all the index entries of this cik
         
         Returns:
-            dict with keys: form_Type, file_number, file_path, filing_date
+            list of dicts with keys: form_type, file_number, file_path, filing_date, accession_number.
+            the values are str, file_number is None if the filing has none
         '''
-        return self._get_base_index_as_dataframe(cik).to_dict("records")
+        return self._dataframe_to_records(self._get_base_index_as_dataframe(cik))
     
 
     def get_newer_filings_meta(self, cik: str, after: str, tracked_filings: set = set([None])):
         '''check a submission file and get filings newer than 'after'.
         
         only works if you have downloaded the bulk submissions file!
-        Downloader -> get_bulk_submissions()
+        Downloader -> get_bulk_submissions(), if it was saved without
+        extracting (extract=False) it is read from submissions.zip.
+        if the submissions store is built (submissions_store.build()) it is
+        read from there instead.
+        the older filings in the pages listed in "filings.files" are included,
+        only pages with filings on or after 'after' are read.
         
         Args:
             path: str or pathlike object
@@ -148,42 +246,216 @@ class IndexHandler:
         '''
         if len(cik) < 10:
             cik = cik.zfill(10)
-        path = self.root_path / "submissions" / ("CIK" + cik + ".json") 
+        if self.submissions_store.is_available():
+            return self._get_newer_filings_meta_from_store([cik], after, tracked_filings)
         new_filings = {cik: []}
         none_set = set([None])
-        with open(path, "r") as f:
-            j = json.load(f)
-            stop_idx = None
+        for filing in self._iter_submission_filings(cik, after=after):
+            if filing["filingDate"] < after:
+                # filings are ordered descending by date
+                break
+            if (filing["form"] in tracked_filings) or (tracked_filings == none_set):
+                new_filings[cik].append(
+                   [filing["form"],
+                    _ensure_no_dash_accn(filing["accessionNumber"]),
+                    _get_correct_primary_file_name(filing["primaryDocument"]),
+                    filing["filingDate"],
+                    [filing["fileNumber"]]])
+        return new_filings
+
+    def get_newer_filings_meta_batch(self, ciks: list[str], after: str, tracked_filings: set = set([None])):
+        '''get filings newer than 'after' for many ciks at once.
+
+        with a built submissions store this is one scan of the store,
+        otherwise every submission file is read like in get_newer_filings_meta.
+        ciks without a submission file get an empty list.
+
+        Args:
+            ciks: list of ciks
+            after: format yyyy-mm-dd
+            tracked_filings: set of form types, eg: set(["S-3", "S-1"])
+
+        Returns:
+            dict[key:list] like get_newer_filings_meta with every cik as key
+        '''
+        cik10s = [cik.zfill(10) for cik in ciks]
+        if self.submissions_store.is_available():
+            return self._get_newer_filings_meta_from_store(cik10s, after, tracked_filings)
+        new_filings = {}
+        for cik in cik10s:
             try:
-                filing_dates = sorted(j["filings"]["recent"]["filingDate"], reverse=True)
-                len_f_dates = len(filing_dates)
-
-                for r in range(0, len_f_dates, 1):
-                    if filing_dates[r] >= after:
-                        if r == len_f_dates:
-                            break
-                        stop_idx = r
-                    else:
-                        break
-                        
-                if stop_idx is not None:
-                    filing = j["filings"]["recent"]
-                    for idx in range(0, stop_idx, 1):
-                        if (filing["form"][idx] in tracked_filings) or (tracked_filings == none_set):
-                            new_filings[cik].append(
-                               [filing["form"][idx],
-                                _ensure_no_dash_accn(filing["accessionNumber"][idx]),
-                                _get_correct_primary_file_name(filing["primaryDocument"][idx]),
-                                filing["filingDate"][idx],
-                                [filing["fileNumber"][idx]]])
-            except KeyError as e:
-                raise e
-                pass #second filing not handled yet
-            finally:
-                del j
+                new_filings.update(self.get_newer_filings_meta(cik, after, tracked_filings))
+            except FileNotFoundError:
+                logger.debug(f"no submissions file for cik: {cik}")
+                new_filings[cik] = []
+        return new_filings
+
+    def _get_newer_filings_meta_from_store(self, cik10s: list[str], after: str, tracked_filings: set):
+        '''query the submissions store, see get_newer_filings_meta_batch'''
+        form_types = None if tracked_filings == set([None]) else list(tracked_filings)
+        df = self.submissions_store.query(ciks=cik10s, form_types=form_types, after=after).to_pandas()
+        df = df.sort_values(["cik", "filingDate"], ascending=[True, False], kind="stable")
+        df["accessionNumber"] = df["accessionNumber"].str.replace("-", "", regex=False)
+        df["primaryDocument"] = df["primaryDocument"].str.rsplit("/", n=1).str[-1]
+        new_filings = {cik: [] for cik in cik10s}
+        for cik, form, accn, primary_doc, filing_date, file_num in df.itertuples(index=False):
+            new_filings[cik].append([form, accn, primary_doc, filing_date, [file_num]])
         return new_filings
+
+    def _iter_submission_filings(self, cik: str, after: str = None, before: str = None):
+        '''yield the filings of a submission file as dicts, newest first.
+
+        the filings in "filings.recent" are followed by the older ones of the
+        pages listed in "filings.files" (CIK##########-submissions-001.json, ...).
+        a page is only loaded once the filings before it were consumed and
+        only if its date range overlaps after - before, pages that arent
+        in the bulk submissions are skipped.
+
+        keys are the ones of the submissions file, eg: "accessionNumber",
+        "filingDate", "form", "primaryDocument", "fileNumber".
+
+        Args:
+            after: skip pages with only filings before this date (yyyy-mm-dd)
+            before: skip pages with only filings after this date
+        '''
+        filings = self._load_submissions_file("CIK" + cik.zfill(10) + ".json", SUBMISSIONS_FILING_COLUMNS)["filings"]
+        pages = sorted(filings.get("files", []), key=lambda p: p.get("filingTo", ""), reverse=True)
+        yield from self._iter_filing_columns(filings.pop("recent"))
+        del filings
+        for page in pages:
+            if (after is not None) and (page.get("filingTo", after) < after):
+                continue
+            if (before is not None) and (page.get("filingFrom", before) > before):
+                continue
+            try:
+                columns = self._load_submissions_file(page["name"], SUBMISSIONS_FILING_COLUMNS)
+            except FileNotFoundError:
+                logger.debug(f"skipped submissions page {page['name']}, not in the bulk submissions")
+                continue
+            yield from self._iter_filing_columns(columns)
+
+    def _iter_filing_columns(self, columns: dict):
+        '''yield the rows of the filing columns of a submissions file as dicts'''
+        keys = list(columns.keys())
+        for values in zip(*[columns[k] for k in keys]):
+            yield dict(zip(keys, values))
+
+    def _load_submissions_file(self, name: str, columns: list[str] = None) -> dict:
+        '''load a file of the bulk submissions, eg: "CIK0000320193.json".
+
+        reads the extracted file in /submissions or, if that doesnt exist,
+        the member of submissions.zip.
+
+        Args:
+            columns: with stream_json only these filing columns are kept,
+                     see json_parsing.load_submissions
+        Raises:
+            FileNotFoundError: if neither has the file
+        '''
+        path = self.root_path / "submissions" / name
+        parse = load if (columns is None) or (self.stream_json is False) else lambda f: load_submissions(f, columns)
+        if path.is_file():
+            with open(path, "rb") as f:
+                return parse(f)
+        archive = self._get_bulk_archive("submissions.zip")
+        if (archive is not None) and (name in archive):
+            return parse(BytesIO(archive.read(name)))
+        raise FileNotFoundError(f"{name} is neither in {path.parent} nor in {self.root_path / 'submissions.zip'}")
+
+    def _get_submissions_file_signature(self, name: str) -> list | None:
+        '''get a value that changes when the submissions file name changes.
+
+        (mtime, size) of the extracted file or (crc, size) of the member of
+        submissions.zip, None if neither has the file.
+        '''
+        try:
+            stat = (self.root_path / "submissions" / name).stat()
+            return ["file", stat.st_mtime_ns, stat.st_size]
+        except FileNotFoundError:
+            pass
+        archive = self._get_bulk_archive("submissions.zip")
+        if (archive is not None) and (name in archive):
+            info = archive.get_member_info(name)
+            return ["zip", info["crc"], info["file_size"]]
+        return None
+
+    def _get_bulk_archive(self, name: str) -> BulkArchive | None:
+        '''get the BulkArchive of root_path/name or None if the zip doesnt exist.'''
+        archive = self._bulk_archives.get(name)
+        if archive is not None:
+            if archive.is_current():
+                return archive
+            self._close_bulk_archive(name)
+        path = self.root_path / name
+        if not path.is_file():
+            return None
+        self._bulk_archives[name] = BulkArchive(path)
+        return self._bulk_archives[name]
+
+    def _close_bulk_archive(self, name: str):
+        archive = self._bulk_archives.pop(name, None)
+        if archive is not None:
+            archive.close()
     
 
+    def has_filing(self, cik: str, accession_number: str, check_file: bool = True) -> bool:
+        '''check if a filing is in the index of cik.
+
+        the accession numbers of a cik are read from its base index once
+        and kept in memory, so this is a dict lookup (plus a stat of the
+        file if check_file is True).
+
+        Args:
+            cik: cik with leading 0's
+            accession_number: with or without dashes
+            check_file: also check if the indexed file exists
+        '''
+        rel_path = self._get_accession_numbers(cik).get(_ensure_no_dash_accn(accession_number))
+        if rel_path is None:
+            return False
+        if check_file is True:
+            return (self.root_path / "filings" / Path(rel_path)).is_file()
+        return True
+
+    def _get_accession_numbers(self, cik: str) -> dict:
+        '''get {accession_number: relative file path} of all filings in the base index of cik'''
+        if cik not in self._accession_numbers:
+            accession_numbers = {}
+            try:
+                with open(self._get_base_index_path(cik), "r", newline="") as f:
+                    rows = reader(f)
+                    next(rows, None)
+                    for row in rows:
+                        try:
+                            accession_numbers[self._get_accession_number_from_relative_path(row[2])] = row[2]
+                        except (IndexError, TypeError):
+                            logger.debug(f"couldnt get accession number from base index row: {row}")
+            except FileNotFoundError:
+                pass
+            self._accession_numbers[cik] = accession_numbers
+        return self._accession_numbers[cik]
+
+    def _is_indexed(self, cik: str, accn: str, file_num: str, rel_file_path: str) -> bool:
+        '''check if the base index of cik already has a row for rel_file_path and file_num.
+
+        the base index is only read if the accession number is indexed with
+        this file path, eg: when a filing is downloaded again because its
+        file was missing.
+        '''
+        if self._get_accession_numbers(cik).get(_ensure_no_dash_accn(accn)) != rel_file_path:
+            return False
+        try:
+            with open(self._get_base_index_path(cik), "r", newline="") as f:
+                rows = reader(f)
+                next(rows, None)
+                return any((len(row) > 2) and (row[1] == (file_num or "")) and (row[2] == rel_file_path) for row in rows)
+        except FileNotFoundError:
+            return False
+
+    def _add_to_accession_numbers(self, cik: str, accn: str, rel_file_path: str):
+        if cik in self._accession_numbers:
+            self._accession_numbers[cik][_ensure_no_dash_accn(accn)] = rel_file_path
+
     def get_related_filings(self, cik: str, file_number: str):
         '''check the file number index for other filings with file_number
         
@@ -194,99 +466,343 @@ class IndexHandler:
             a list of lists where each of those lists has the fields:
                 form_type, relative_file_path, filing_date    
         '''
-        with open(self._get_file_num_index_path(cik), "r") as f:
-            index = json.load(f)
-            return index[file_number]
+        return self._read_file_num_index(cik)[file_number]
 
 
-    def check_index(self):
+    def check_index(self, dry_run: bool = False, incremental: bool = False, workers: int = 8) -> dict:
         '''
         check the index and remove none existant entries.
         
         check if files listed in the index are present and
         if there are duplicate values in the base_index.
-        Removes the duplicates and entries not present locally.'''
-        # get all base indexes
-        base_indexes = [p for p in self._base_index_path.glob("*.csv")]
-        base_remove_count = 0
-        num_indexes = [p for p in self._num_index_path.glob("*.json")]
-        num_remove_count = 0
-
-        for b in base_indexes:
-            logger.debug(f"remove_count before: {base_remove_count}")
-            base_remove_count += self._check_base_index_file(b)
-            logger.debug(f"remove_count after remove: {base_remove_count}")
-
-
-        for n in num_indexes:
-            num_remove_count += self._check_num_index_file(n)
-        logger.info((f"completed check of indexes \n"
-                     f"base_index: {base_remove_count} entries removed \n"
-                     f"num_index: {num_remove_count} entries removed \n"))
-
-    def _check_base_index_file(self, b):
-        '''check if a file in the base index is missing and remove the entry if it is.'''
-        base_remove_count = 0
-        base_changed = False
-        original = pd.read_csv(b, delimiter=",")
-            # remove duplicates
-        df = original.drop_duplicates()
-        if len(df) != len(original):
-            base_changed = True
-            base_remove_count += len(original) - len(df)
-        drop_rows = []
-            # load the file_num_index
-        for row in df.iloc:
-            if not (self.root_path /  "filings" / Path(row["file_path"])).is_file():
-                logger.debug(f"{(self.root_path / 'filings' / Path(row['file_path']))} didnt exist")
-                base_changed = True
-                drop_rows.append(row.name)
-        if base_changed is True:
-            if  drop_rows != []:
-                base_remove_count += len(drop_rows)
-                df = df.drop(drop_rows)
-            df.to_csv(b, index=False)
-            logger.debug(f"changed base_index: {b}")
-        return base_remove_count
-
-    def _check_num_index_file(self, n):
-        '''check if a file in the num index is missing and remove it if it is.'''
-        num_remove_count = 0
-        with open(n, "r+") as file_num_index:
-            num_changed =  False
-            num_index = json.load(file_num_index)
-            file_nums_to_remove = []
-            logger.debug(f"original num_index: {json.dumps(num_index, indent=2)}")
-                  # remove entry from file_num_index
-            for file_num in num_index.keys():
-                offset = 0
-                for idx, entry in enumerate(num_index[file_num]):
-                    if not (self.root_path / "filings" / Path(entry[1])).is_file():
-                        num_index[file_num].pop(idx - offset)
-                        offset += 1
-                        num_remove_count += 1
-                        num_changed = True
-                if num_index[file_num] == []:
-                    file_nums_to_remove.append(file_num)
-            if file_nums_to_remove != []:
-                for file_num_to_remove in file_nums_to_remove:
-                    del num_index[file_num_to_remove]
-        if num_changed is True:
-            with open(n, "w") as file_num_index:
-                logger.debug(f"changed num_index: {json.dumps(num_index, indent=2)}")
-                json.dump(num_index, file_num_index)
-            logger.debug(f"changed num_index: {n}")
-        return num_remove_count
+        Removes the duplicates and entries not present locally.
+
+        the folder filings/<cik> of every indexed cik is walked once (in
+        workers threads) and the index entries are compared against the files
+        found, instead of checking every entry with a stat() call.
+
+        Args:
+            dry_run: only report what would be removed, dont change the index
+            incremental: only check ciks whose folders (filings/<cik> and
+                         its form type folders) or index files changed since
+                         the last check. deleting single files inside an
+                         accession number folder isnt noticed in this mode.
+            workers: number of threads walking the folders
+        Returns:
+            dict with keys:
+                checked_ciks: number of ciks checked
+                skipped_ciks: number of unchanged ciks skipped (incremental)
+                base_index_removed: duplicate/missing entries removed from the base index
+                num_index_removed: missing entries removed from the file number index
+                missing: {cik: [relative paths of missing files]}
+        '''
+        ciks = self._get_indexed_ciks()
+        state = self._load_check_index_state() if incremental is True else {}
+        to_check = [cik for cik in ciks if state.get(cik) != self._get_check_index_signature(cik)]
+        existing_files = self._scan_filings(to_check, workers)
+        report = {
+            "checked_ciks": len(to_check),
+            "skipped_ciks": len(ciks) - len(to_check),
+            "base_index_removed": 0,
+            "num_index_removed": 0,
+            "missing": {}}
+        for cik in to_check:
+            base_removed, missing = self._check_base_index_file(cik, existing_files[cik], dry_run=dry_run)
+            num_removed, num_missing = self._check_num_index_file(cik, existing_files[cik], dry_run=dry_run)
+            report["base_index_removed"] += base_removed
+            report["num_index_removed"] += num_removed
+            missing = sorted(set(missing) | set(num_missing))
+            if missing != []:
+                report["missing"][cik] = missing
+        if dry_run is False:
+            self._accession_numbers = {}
+            new_state = {cik: state[cik] for cik in ciks if cik in state}
+            for cik in to_check:
+                new_state[cik] = self._get_check_index_signature(cik)
+            self._save_check_index_state(new_state)
+        logger.info((f"completed check of indexes{' (dry run)' if dry_run else ''} \n"
+                     f"ciks: {report['checked_ciks']} checked, {report['skipped_ciks']} unchanged \n"
+                     f"base_index: {report['base_index_removed']} entries removed \n"
+                     f"num_index: {report['num_index_removed']} entries removed \n"))
+        return report
+
+    def _get_indexed_ciks(self) -> list[str]:
+        '''ciks with a base index, a file number index or a journal'''
+        ciks = set(p.stem for p in self._base_index_path.glob("*.csv"))
+        ciks.update(p.name.split(".", 1)[0] for p in self._num_index_path.glob("*.json*"))
+        return sorted(ciks)
+
+    def _scan_filings(self, ciks: list[str], workers: int = 8) -> dict:
+        '''get {cik: set of relative paths ("/" separated) of all files in filings/<cik>}'''
+        if ciks == []:
+            return {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(ciks, pool.map(self._scan_filing_folder, ciks)))
+
+    def _scan_filing_folder(self, cik: str) -> set:
+        '''walk filings/<cik> with os.scandir and return the relative paths of all files'''
+        filings_path = self.root_path / "filings"
+        found = set()
+        folders = [cik]
+        while folders:
+            folder = folders.pop()
+            try:
+                with os.scandir(filings_path / folder) as entries:
+                    for entry in entries:
+                        rel_path = folder + "/" + entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            folders.append(rel_path)
+                        elif entry.is_file():
+                            found.add(rel_path)
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+        return found
+
+    def _get_check_index_signature(self, cik: str) -> list:
+        '''mtimes of filings/<cik> and its form type folders and the (mtime, size) of the index files of cik'''
+        signature = []
+        cik_folder = self.root_path / "filings" / cik
+        try:
+            signature.append(cik_folder.stat().st_mtime_ns)
+            with os.scandir(cik_folder) as entries:
+                signature.extend(sorted(
+                    (entry.name, entry.stat().st_mtime_ns) for entry in entries if entry.is_dir(follow_symlinks=False)))
+        except FileNotFoundError:
+            signature.append(None)
+        for index_path in [self._get_base_index_path(cik), self._get_file_num_index_path(cik), self._get_file_num_journal_path(cik)]:
+            try:
+                stat = index_path.stat()
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        # json has no tuples, compare in the form it is saved in
+        return json.loads(json.dumps(signature))
+
+    def _load_check_index_state(self) -> dict:
+        try:
+            with open(self.root_path / "index" / CHECK_INDEX_STATE_FILE, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_check_index_state(self, state: dict):
+        self._ensure_index_folders()
+        state_path = self.root_path / "index" / CHECK_INDEX_STATE_FILE
+        tmp_path = state_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    def _check_base_index_file(self, cik: str, existing_files: set, dry_run: bool = False):
+        '''remove duplicates and entries whose file isnt in existing_files from the base index of cik.
+
+        Returns:
+            (number of removed entries, relative paths of the missing files)
+        '''
+        base_path = self._get_base_index_path(cik)
+        try:
+            with open(base_path, "r", newline="") as f:
+                rows = list(reader(f))
+        except FileNotFoundError:
+            return 0, []
+        if rows == []:
+            return 0, []
+        header, rows = rows[0], rows[1:]
+        kept = []
+        seen = set()
+        missing = []
+        for row in rows:
+            if tuple(row) in seen:
+                continue
+            seen.add(tuple(row))
+            if (len(row) < 3) or (row[2].replace("\\", "/") not in existing_files):
+                logger.debug(f"{row} didnt exist")
+                missing.append(row[2] if len(row) > 2 else None)
+                continue
+            kept.append(row)
+        removed = len(rows) - len(kept)
+        if (removed != 0) and (dry_run is False):
+            tmp_path = base_path.with_suffix(".csv.tmp")
+            with open(tmp_path, "w", newline="") as f:
+                writer(f).writerows([header] + kept)
+            os.replace(tmp_path, base_path)
+            logger.debug(f"changed base_index: {base_path}")
+        return removed, missing
+
+    def _check_num_index_file(self, cik: str, existing_files: set, dry_run: bool = False):
+        '''remove entries whose file isnt in existing_files from the num index of cik and compact it.
+
+        Returns:
+            (number of removed entries, relative paths of the missing files)
+        '''
+        missing = []
+        def remove_missing(num_index):
+            missing.clear()
+            checked = {}
+            for file_num, entries in num_index.items():
+                kept = []
+                for e in entries:
+                    if e[1].replace("\\", "/") in existing_files:
+                        kept.append(e)
+                    else:
+                        missing.append(e[1])
+                if kept != []:
+                    checked[file_num] = kept
+            return checked
+        remove_missing(self._read_file_num_index(cik))
+        has_journal = self._get_file_num_journal_path(cik).exists() or self._get_file_num_journal_path(cik, compacting=True).exists()
+        if (dry_run is False) and ((missing != []) or has_journal):
+            self._compact_file_num_index(cik, transform=remove_missing)
+            if missing != []:
+                logger.debug(f"changed num_index of: {cik}")
+        return len(missing), missing
+
+    def compact_file_num_indexes(self):
+        '''merge the journals of the file number index into the compacted index files.
+
+        happens automatically once a journal is larger than FILE_NUM_JOURNAL_COMPACT_SIZE.
+        '''
+        for journal in self._num_index_path.glob("*.jsonl"):
+            self._compact_file_num_index(journal.stem)
+
+    def _read_file_num_index(self, cik: str) -> dict:
+        '''get the file number index of cik as {file_num: [[form_type, rel_file_path, filing_date], ...]}
+
+        the index is the compacted file (<cik>.json) plus the entries of the
+        journal (<cik>.jsonl) and of a journal whose compaction didnt finish.
+        an incomplete last line of a journal (crash while appending) is ignored.
+        '''
+        index = {}
+        seen = set()
+        def add(file_num, row):
+            if (file_num, tuple(row)) not in seen:
+                seen.add((file_num, tuple(row)))
+                index.setdefault(file_num, []).append(row)
+        try:
+            with open(self._get_file_num_index_path(cik), "r") as f:
+                for file_num, rows in json.load(f).items():
+                    for row in rows:
+                        add(file_num, row)
+        except FileNotFoundError:
+            pass
+        for journal_path in [self._get_file_num_journal_path(cik, compacting=True), self._get_file_num_journal_path(cik)]:
+            try:
+                with open(journal_path, "r") as f:
+                    for line in f:
+                        try:
+                            file_num, form_type, rel_file_path, filing_date = json.loads(line)
+                        except ValueError:
+                            logger.debug(f"skipped incomplete line in {journal_path}: {line}")
+                            continue
+                        add(file_num, [form_type, rel_file_path, filing_date])
+            except FileNotFoundError:
+                pass
+        return index
+
+    @contextmanager
+    def _lock_file_num_index(self, cik: str):
+        '''hold the lock of the file number index of cik, across threads and processes (<cik>.lock)'''
+        with self._file_num_locks_lock:
+            lock = self._file_num_locks.setdefault(cik, threading.Lock())
+        with lock:
+            self._num_index_path.mkdir(parents=True, exist_ok=True)
+            with _locked_file(self._num_index_path / (str(cik) + ".lock")):
+                yield
+
+    def _append_to_file_num_index(self, cik: str, items: list[list]):
+        '''append [file_num, form_type, rel_file_path, filing_date] entries to the journal of cik'''
+        journal_path = self._get_file_num_journal_path(cik)
+        lines = "".join(json.dumps(item) + "\n" for item in items).encode()
+        with self._lock_file_num_index(cik):
+            fd = os.open(journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+            try:
+                os.write(fd, lines)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+        if size > FILE_NUM_JOURNAL_COMPACT_SIZE:
+            self._compact_file_num_index(cik)
+
+    def _compact_file_num_index(self, cik: str, transform=None):
+        '''merge the journal of cik into its compacted index file.
+
+        the journal is first moved aside, so new entries go to a new journal
+        while compacting, and the compacted file is replaced atomically. if the
+        process dies in between, the moved journal is still read and merged
+        the next time.
+
+        Args:
+            transform: function applied to the index before it is written
+        '''
+        with self._lock_file_num_index(cik):
+            self._compact_file_num_index_locked(cik, transform)
+
+    def _compact_file_num_index_locked(self, cik: str, transform=None):
+        journal_path = self._get_file_num_journal_path(cik)
+        compacting_path = self._get_file_num_journal_path(cik, compacting=True)
+        if journal_path.exists() and not compacting_path.exists():
+            os.replace(journal_path, compacting_path)
+        index = self._read_file_num_index(cik)
+        if transform is not None:
+            index = transform(index)
+        index_path = self._get_file_num_index_path(cik)
+        tmp_path = index_path.with_suffix(f".json.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, index_path)
+        compacting_path.unlink(missing_ok=True)
     
     def _get_base_index_as_dataframe(self, cik: str):
-        '''get the index of cik as a dataframe with absolute file paths and the accession number added'''
+        '''get the index of cik as a dataframe with absolute file paths and the accession number added.
+
+        the dataframe is kept in memory until the base index file changes
+        (mtime or size), callers get a copy.
+        '''
         index_path = self._get_base_index_path(cik)
-        df = pd.read_csv(index_path)
-        for row in df.iloc:       
-            df.loc[row.name, ("file_path", )] = self._relative_to_absolute_filing_path(row["file_path"])
-            df.loc[row.name, ("accession_number", )] = self._get_accession_number_from_relative_path(row["file_path"])
+        stat = index_path.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._dataframes_lock:
+            cached = self._dataframes.get(cik)
+            if (cached is not None) and (cached[0] == signature):
+                self._dataframes.move_to_end(cik)
+                return cached[1].copy()
+        df = self._read_base_index(index_path)
+        with self._dataframes_lock:
+            self._dataframes[cik] = (signature, df)
+            self._dataframes.move_to_end(cik)
+            while len(self._dataframes) > self._dataframe_cache_size:
+                self._dataframes.popitem(last=False)
+        return df.copy()
+
+    def _read_base_index(self, index_path: Path) -> pd.DataFrame:
+        '''read a base index file and add the absolute file paths and accession numbers'''
+        df = pd.read_csv(index_path, dtype={"form_type": str, "file_number": str, "file_path": str, "filing_date": str})
+        return self._set_index_dtypes(self._add_absolute_paths_and_accession_numbers(df))
+
+    def _add_absolute_paths_and_accession_numbers(self, df: pd.DataFrame) -> pd.DataFrame:
+        '''replace the relative file_path with the absolute one and add the accession_number column.
+
+        the accession number is the folder the file is in (cik/form_type/accession_number/file_name).
+        '''
+        parts = df["file_path"].str.replace("\\", "/", regex=False)
+        df["accession_number"] = parts.str.rsplit("/", n=2).str[-2].str.replace("-", "", regex=False)
+        df["file_path"] = str(self.root_path / "filings") + os.sep + parts.str.replace("/", os.sep, regex=False)
+        return df
+
+    def _set_index_dtypes(self, df: pd.DataFrame) -> pd.DataFrame:
+        df["form_type"] = df["form_type"].astype("category")
+        df["filing_date"] = pd.to_datetime(df["filing_date"], errors="coerce")
         return df
 
+    def _dataframe_to_records(self, df: pd.DataFrame) -> list[dict]:
+        '''convert an index dataframe back to records of str values (yyyy-mm-dd filing dates), missing values become None'''
+        df = df.astype({"form_type": object})
+        df["filing_date"] = df["filing_date"].dt.strftime("%Y-%m-%d")
+        df = df.astype(object).where(df.notna(), None)
+        return df.to_dict("records")
+
     def _get_base_index_path(self, cik10: str):
         return self._base_index_path / cik10 +".csv"
     
@@ -309,6 +825,10 @@ class IndexHandler:
 
     def _get_accession_number_from_relative_path(self, rel_path: str | Path):
         if isinstance(rel_path, str):
+            # the accession number usually is the parent folder, check that first
+            parts = rel_path.replace("\\", "/").rsplit("/", 2)
+            if (len(parts) > 1) and (len(_ensure_no_dash_accn(parts[-2])) == 18):
+                return _ensure_no_dash_accn(parts[-2])
             rel_path = Path(rel_path)
         if isinstance(rel_path, Path):
             for parent in Path(rel_path).parents:
@@ -324,39 +844,27 @@ class IndexHandler:
         return p
     
     def _create_indexes(self, cik: str, form_type: str, accn: str, file_name: str, file_num: str, filing_date: str):
-        # need to fix rewritting whole json every time, how could i use seek()?
-        '''create index files or add to them. accession number is included in the file_path'''
-        if self._checked_index_creation is False:
-            if not self._base_index_path.exists():
-                self._base_index_path.mkdir(parents=True)
-            if not self._num_index_path.exists():
-                self._num_index_path.mkdir(parents=True)
-            self._checked_index_creation = True
+        '''create index files or add to them. accession number is included in the file_path
+
+        an entry that is already indexed (eg: a filing downloaded again
+        because its file was missing) isnt added a second time.
+        '''
+        self._ensure_index_folders()
         rel_file_path = path.join(cik, form_type, accn, file_name)
+        if self._is_indexed(cik, accn, file_num, rel_file_path):
+            logger.debug(f"{rel_file_path} is already indexed under file number {file_num}")
+            return
         base_path = self._get_base_index_path(cik)
-        file_num_path = self._get_file_num_index_path(cik)
         base_path_row = [form_type, file_num, rel_file_path, filing_date]
-        file_num_row = [form_type, rel_file_path, filing_date]
+        self._add_to_accession_numbers(cik, accn, rel_file_path)
 
         with open(base_path, "a", newline="") as f:
             if base_path.stat().st_size == 0:
                 base_header = ["form_type", "file_number", "file_path", "filing_date"]
                 writer(f).writerow(base_header)
             writer(f).writerow(base_path_row)
-        content = None
-        try:
-            with open(file_num_path, "r") as f:
-                content = json.load(f)
-        except FileNotFoundError:
-            with open(file_num_path, "w") as f:
-                content = {}
-        try:
-            if file_num_row not in content[file_num]:
-                content[file_num].append(file_num_row)
-        except KeyError:
-            content[file_num] = [file_num_row]
-        with open(file_num_path, "w") as f:
-            json.dump(content, f)
+        self._append_to_file_num_index(cik, [[file_num, form_type, rel_file_path, filing_date]])
+        self._add_to_columnar_index(cik, [[form_type, accn, file_name, file_num, filing_date]])
         
                 
     def _create_indexes_bulk(self, cik:str, items: list[list]):
@@ -364,38 +872,55 @@ class IndexHandler:
         
         Args:
             cik:  a central index key (10 character form/zfilled) eg: 0000234323
-            items: list of entries like so: [[form_type, accn, file_name, file_num, filing_date]] '''
+            items: list of entries like so: [[form_type, accn, file_name, file_num, filing_date]],
+                   entries that are already indexed are skipped
+        '''
+        self._ensure_index_folders()
+        items = [item for item in items if not self._is_indexed(cik, item[1], item[3], path.join(cik, item[0], item[1], item[2]))]
+        if items == []:
+            return
         base_path = self._get_base_index_path(cik)
-        file_num_path = self._get_file_num_index_path(cik)
-        file_num_content = None
-        try:
-            with open(file_num_path, "r") as num_file:
-                file_num_content = json.load(num_file)
-        except FileNotFoundError:
-            file_num_content = {}
+        file_num_rows = []
         with open(base_path, "a", newline="") as base_file:
             if base_path.stat().st_size == 0:
                 base_header = ["form_type", "file_number", "file_path", "filing_date"]
                 writer(base_file).writerow(base_header)
             for item in items:
                 rel_file_path = path.join(cik, item[0], item[1], item[2])
-                base_path_row = [item[0], item[1], rel_file_path, item[4]]
-                file_num_row = [item[0], rel_file_path, item[4]]
+                base_path_row = [item[0], item[3], rel_file_path, item[4]]
                 writer(base_file).writerow(base_path_row)
-                try:
-                    file_num_content[item[1]].append(file_num_row)
-                except KeyError:
-                    file_num_content[item[1]] = []
-                    file_num_content[item[1]].append(file_num_row)
-        with open(file_num_path, "w") as num_file:
-            json.dump(file_num_content, num_file)
+                self._add_to_accession_numbers(cik, item[1], rel_file_path)
+                file_num_rows.append([item[3], item[0], rel_file_path, item[4]])
+        self._append_to_file_num_index(cik, file_num_rows)
+        self._add_to_columnar_index(cik, items)
+
+    def _add_to_columnar_index(self, cik: str, items: list[list]):
+        '''add new entries to the columnar index, if there is one'''
+        if self.columnar_index is not None:
+            self.columnar_index.add(cik, items)
+
+    def flush(self):
+        '''write the buffered entries of the columnar index, if there is one'''
+        if self.columnar_index is not None:
+            self.columnar_index.flush()
               
     
+    def _ensure_index_folders(self):
+        if self._checked_index_creation is False:
+            if not self._base_index_path.exists():
+                self._base_index_path.mkdir(parents=True)
+            if not self._num_index_path.exists():
+                self._num_index_path.mkdir(parents=True)
+            self._checked_index_creation = True
+
     def _get_base_index_path(self, cik):
         return self._base_index_path / (str(cik)+".csv")
     
     def _get_file_num_index_path(self, cik):
         return self._num_index_path / (str(cik)+".json")
+
+    def _get_file_num_journal_path(self, cik, compacting: bool = False):
+        return self._num_index_path / (str(cik) + (".jsonl.compacting" if compacting else ".jsonl"))
     
 
 class Downloader:
@@ -413,24 +938,37 @@ class Downloader:
                    an argument to specify an alternative
         user_agent: str of 'name surname email' to comply with sec guidelines
     Args:
-        retries: how many retries per request are allowed
+        retries: how many retries per request are allowed, every retry
+                 goes through the rate limiter
         create_folder: if root folder should be created, parents included if
                        it doesnt exist.
+        rate_limiter: a RateLimiter all requests draw from, defaults to the
+                      limiter shared by all Downloaders on this host
+                      (see rate_limiter.get_default_rate_limiter)
+        cache: a ResponseCache for the responses of the search and xbrl apis,
+               or True to create one in root_path/response_cache.sqlite.
+               available as .cache, see ResponseCache.stats for hit/miss counts.
+        index_handler: the IndexHandler to use, eg: a SQLiteIndexHandler,
+                       defaults to an IndexHandler of root_path
     
     Raises:
         OsError: if root_path doesnt exist and create_folder is False
         ValueError: if root_path isnt correct type (allowed: str, pathlib.Path)
     '''
-    def __init__(self, root_path: str, retries: int = 10, user_agent: str = None, create_folder=True):
+    def __init__(self, root_path: str, retries: int = 10, user_agent: str = None, create_folder=True, rate_limiter: RateLimiter = None, cache: ResponseCache | bool = None, index_handler: IndexHandler = None):
         self.user_agent = user_agent if user_agent else "maxi musterman max@muster.com"
         self._is_ratelimiting = True
         self.root_path = self._prepare_root_path(root_path)
-        self._next_try_systime_ms = self._get_systime_ms()
+        self._rate_limiter = rate_limiter if rate_limiter else get_default_rate_limiter()
+        self._retries = retries
         self._session = self._create_session(retry=retries)
         self._sec_files_headers = self._construct_sec_files_headers()
         self._sec_xbrl_api_headers = self._construct_sec_xbrl_api_headers()
         self._lookuptable_ticker_cik = self._load_or_update_lookuptable_ticker_cik()
-        self.index_handler = IndexHandler(root_path)
+        self.index_handler = index_handler if index_handler else IndexHandler(root_path)
+        if cache is True:
+            cache = ResponseCache(self.root_path / "response_cache.sqlite")
+        self.cache = cache if cache else None
         self._download_counter = 0
         self._current_ticker = None
         
@@ -449,33 +987,45 @@ class Downloader:
         else:
             raise ValueError(f"root_path is expect to be of type str or pathlib.Path, got type: {type(path)}")
 
-    def get_filing_by_accession_number(self, cik: str, form_type: str, accession_number: str, save_name: str, filing_date: str, file_nums: str, save: bool=True, create_index: bool=True, extract_zip: bool=True):
+    def get_filing_by_accession_number(self, cik: str, form_type: str, accession_number: str, save_name: str, filing_date: str, file_nums: str, save: bool=True, create_index: bool=True, extract_zip: bool=True, skip_existing: bool=True) -> bool:
+        '''download a single filing.
+
+        Args:
+            skip_existing: dont download the filing if it is in the index
+                           and its file exists.
+        Returns:
+            True if the filing was downloaded or skipped as existing,
+            False if no file was received.
+        '''
         form_type = self._sanitize_form_type(form_type)
         logger.debug(f"\n Called get_filing_by_accession_number with args: {locals()}")
+        if (skip_existing is True) and self.index_handler.has_filing(cik, accession_number):
+            logger.debug(f"skipped {cik}:{accession_number}, already downloaded")
+            return True
         base_url = urljoin(EDGAR_ARCHIVES_BASE_URL, cik)
         file_url = urljoin(base_url, accession_number, save_name)
         logger.debug(f"file_url: {file_url}")
         file, _ = self._download_filing(file_url, skip=False, fallback_url=None)
-        if Path(save_name).suffix == "htm":
+        if not file:
+            logger.debug("didnt save/get filing despite that it should have. file was None")
+            return False
+        if Path(save_name).suffix == ".htm":
             file = self._resolve_relative_urls(file, base_url)
         if save is True:
-                if file:
-                    self._save_filing(cik, form_type, accession_number, save_name, file, extract_zip=extract_zip)
-                    if (create_index is True) and (file_nums is not None):
-                        for file_num in file_nums:
-                            self.index_handler._create_indexes(cik, form_type, accession_number, save_name, file_num, filing_date)
-                else:
-                    logger.debug("didnt save/get filing despite that it should have. file was None")
-        
+            self._save_filing(cik, form_type, accession_number, save_name, file, extract_zip=extract_zip)
+            if (create_index is True) and (file_nums is not None):
+                for file_num in file_nums:
+                    self.index_handler._create_indexes(cik, form_type, accession_number, save_name, file_num, filing_date)
+        return True
 
     def get_filings_bulk(
         self,
-        ticker_or_cik: str,
-        form_type: str,
+        ticker_or_cik: str | list[str],
+        form_type: str | list[str],
         after_date: str = "",
         before_date: str = "",
         query: str = "",
-        prefered_file_type: str = "",
+        prefered_file_type: str | dict = "",
         number_of_filings: int = 100,
         want_amendments: bool = True,
         skip_not_prefered_extension: bool = False,
@@ -483,7 +1033,10 @@ class Downloader:
         extract_zip = True,
         create_index = True,
         resolve_urls: bool = True,
-        callback = None):
+        callback = None,
+        pipeline: bool = False,
+        pipeline_workers: int = 4,
+        skip_existing: bool = True):
         '''download filings.  EXPERIMENTAL.
 
         unlike get_filings this will write to the indexes in bulk after downloading
@@ -492,13 +1045,20 @@ class Downloader:
         rewritting the file_num index every time.
         
         Args:
-            ticker_or_cik: either a ticker symbol "AAPL" or a 10digit cik
-            form_type: what form you want. valid forms are found in SUPPORTED_FILINGS
+            ticker_or_cik: either a ticker symbol "AAPL" or a 10digit cik, or a list of them.
+                           all of them are searched for in one query.
+            form_type: what form you want. valid forms are found in SUPPORTED_FILINGS.
+                       a list of forms is searched for in one query and the hits are
+                       handled according to their form.
             after_date: date after which to consider filings
             before_date: date before which to consider filings
             query: query according to https://www.sec.gov/edgar/search/efts-faq.html.
-            prefered_file_type: what filetype to prefer when looking for filings, see PREFERED_FILE_TYPES for handled extensions
-            number_of_filings: how many filings to download.
+            prefered_file_type: what filetype to prefer when looking for filings, see PREFERED_FILE_TYPES for handled extensions.
+                                either one filetype for all forms or a dict of {form_type: filetype},
+                                forms without an entry use their default.
+            number_of_filings: how many filings to download in total. with a list of
+                               ciks and/or forms this caps the combined query,
+                               not each cik/form, so raise it accordingly.
             want_amendements: if we want to include amendment files or not
             skip_not_prefered_extension: either download or exclude if prefered_file_type
                                fails to match/download
@@ -506,23 +1066,22 @@ class Downloader:
             resolve_url: resolves relative urls to absolute ones in "htm"/"html" files 
             callback: pass a function that expects a dict of {"file": file, "meta": meta}
                       meta includes the metadata.
+            pipeline: overlap downloading, resolving urls/extracting zips (in
+                      pipeline_workers processes) and saving/indexing (in a
+                      writer thread, which also calls the callback).
+            pipeline_workers: number of worker processes used if pipeline is True
+            skip_existing: dont download filings that are in the index and
+                           whose file exists.
         '''
         # set these for info at end
         self._current_ticker = ticker_or_cik
         self._download_counter = 0
 
-        cik10 = self._convert_to_cik10(ticker_or_cik)
-        if prefered_file_type == (None or ""):
-            if form_type not in PREFERED_FILE_TYPE_MAP.keys():
-                logger.info(f"No Default file_type set for this form_type: {form_type}. defaulting to 'htm'")
-                prefered_file_type = "htm"
-            else:
-                prefered_file_type = PREFERED_FILE_TYPE_MAP[form_type] 
-                                
+        cik10s, form_types = self._prepare_search_args(ticker_or_cik, form_type)
         logger.debug((f"\n Called get_filings with args: {locals()}"))
         hits = self._json_from_search_api(
-            ticker_or_cik=cik10,
-            form_type=form_type,
+            ticker_or_cik=cik10s,
+            form_type=form_types,
             number_of_filings=number_of_filings,
             want_amendments=want_amendments,
             after_date=after_date,
@@ -531,45 +1090,44 @@ class Downloader:
         if not hits:
             logger.debug("returned without downloading because hits was None")
             return
-        base_meta = [self._get_base_metadata_from_hit(h) for h in hits]
-        base_metas = [self._guess_full_url(
-            h, prefered_file_type, skip_not_prefered_extension) for h in base_meta]
+        base_metas = self._get_base_metas_from_hits(hits, form_types, prefered_file_type, skip_not_prefered_extension)
+        if skip_existing is True:
+            base_metas = self._remove_existing_filings(base_metas)
         
-        index_entries = [] # [[form_type, accn, file_name, file_num, filing_date], [...], ...]
-        for m in base_metas:
-            # check if file is in index, if so check if it actually exists,
-            #  if both are true skip and log the skipped file and this reason
-            file, save_name = self._download_filing(m["file_url"], m["skip"], m["fallback_url"])
-            if resolve_urls and Path(save_name).suffix == ".htm":
-                file = self._resolve_relative_urls(file, m["base_url"])
-            if save is True:
-                if file:
-                    self._save_filing(m["cik"], m["form_type"], m["accession_number"], save_name, file, extract_zip=extract_zip)
-                    if create_index is True:
-                        file_nums = m["file_num"]
-                        for file_num in file_nums:
-                            index_entries.append([m["form_type"], m["accession_number"], save_name, file_num, m["filing_date"]])
-                            # self.index_handler._create_indexes(m["cik"], m["form_type"], m["accession_number"], save_name, file_num, m["filing_date"])
-                else:
-                    logger.debug("didnt save/get filing despite that it should have. file was None")                
-            if callback != None:
-                callback({"file": file, "meta": m})
+        self._download_filings_bulk(
+            base_metas, resolve_urls, save, extract_zip, create_index,
+            callback, pipeline, pipeline_workers)
+        logger.info(f"Ticker: {self._current_ticker}, Downloads: {self._download_counter}, Form: {form_type}")           
+        self.index_handler.flush()
+        logger.debug(f"rate limiter: {self.get_rate_limit_stats()}")
+        return
+    
+    def _download_filings_bulk(self, base_metas: list[dict], resolve_urls: bool, save: bool, extract_zip: bool, create_index: bool, callback, pipeline: bool, pipeline_workers: int):
+        '''download the filings of base_metas and write their index entries in bulk at the end'''
+        index_entries = {} # {cik: [[form_type, accn, file_name, file_num, filing_date], [...], ...]}
+        if pipeline is True:
+            self._download_filings_pipelined(
+                base_metas, resolve_urls, save, extract_zip, create_index,
+                callback, pipeline_workers, index_entries=index_entries)
+        else:
+            for m in base_metas:
+                self._download_and_save_filing(
+                    m, resolve_urls, save, extract_zip, create_index, callback, index_entries=index_entries)
         try:
-            self.index_handler._create_indexes_bulk(cik10, index_entries)
+            for cik, entries in index_entries.items():
+                self.index_handler._create_indexes_bulk(cik, entries)
         except Exception as e:
             logger.debug(("undhandled exception in get_filings trying to create the index entries in bulk", e))
             raise e
-        logger.info(f"Ticker: {self._current_ticker}, Downloads: {self._download_counter}, Form: {form_type}")           
-        return
-    
+
     def get_filings(
         self,
-        ticker_or_cik: str,
-        form_type: str,
+        ticker_or_cik: str | list[str],
+        form_type: str | list[str],
         after_date: str = "",
         before_date: str = "",
         query: str = "",
-        prefered_file_type: str = "",
+        prefered_file_type: str | dict = "",
         number_of_filings: int = 100,
         want_amendments: bool = True,
         skip_not_prefered_extension: bool = False,
@@ -577,17 +1135,27 @@ class Downloader:
         extract_zip = True,
         create_index = True,
         resolve_urls: bool = True,
-        callback = None):
+        callback = None,
+        pipeline: bool = False,
+        pipeline_workers: int = 4,
+        skip_existing: bool = True):
         '''download filings.
         
         Args:
-            ticker_or_cik: either a ticker symbol "AAPL" or a 10digit cik
-            form_type: what form you want. valid forms are found in SUPPORTED_FILINGS
+            ticker_or_cik: either a ticker symbol "AAPL" or a 10digit cik, or a list of them.
+                           all of them are searched for in one query.
+            form_type: what form you want. valid forms are found in SUPPORTED_FILINGS.
+                       a list of forms is searched for in one query and the hits are
+                       handled according to their form.
             after_date: date after which to consider filings
             before_date: date before which to consider filings
             query: query according to https://www.sec.gov/edgar/search/efts-faq.html.
-            prefered_file_type: what filetype to prefer when looking for filings, see PREFERED_FILE_TYPES for handled extensions
-            number_of_filings: how many filings to download.
+            prefered_file_type: what filetype to prefer when looking for filings, see PREFERED_FILE_TYPES for handled extensions.
+                                either one filetype for all forms or a dict of {form_type: filetype},
+                                forms without an entry use their default.
+            number_of_filings: how many filings to download in total. with a list of
+                               ciks and/or forms this caps the combined query,
+                               not each cik/form, so raise it accordingly.
             want_amendements: if we want to include amendment files or not
             skip_not_prefered_extension: either download or exclude if prefered_file_type
                                fails to match/download
@@ -595,23 +1163,22 @@ class Downloader:
             resolve_url: resolves relative urls to absolute ones in "htm"/"html" files 
             callback: pass a function that expects a dict of {"file": file, "meta": meta}
                       meta includes the metadata.
+            pipeline: overlap downloading, resolving urls/extracting zips (in
+                      pipeline_workers processes) and saving/indexing (in a
+                      writer thread, which also calls the callback).
+            pipeline_workers: number of worker processes used if pipeline is True
+            skip_existing: dont download filings that are in the index and
+                           whose file exists.
         '''
         # set these for info at end
         self._current_ticker = ticker_or_cik
         self._download_counter = 0
 
-        cik10 = self._convert_to_cik10(ticker_or_cik)
-        if prefered_file_type == (None or ""):
-            if form_type not in PREFERED_FILE_TYPE_MAP.keys():
-                logger.info(f"No Default file_type set for this form_type: {form_type}. defaulting to 'htm'")
-                prefered_file_type = "htm"
-            else:
-                prefered_file_type = PREFERED_FILE_TYPE_MAP[form_type] 
-                                
+        cik10s, form_types = self._prepare_search_args(ticker_or_cik, form_type)
         logger.debug((f"\n Called get_filings with args: {locals()}"))
         hits = self._json_from_search_api(
-            ticker_or_cik=cik10,
-            form_type=form_type,
+            ticker_or_cik=cik10s,
+            form_type=form_types,
             number_of_filings=number_of_filings,
             want_amendments=want_amendments,
             after_date=after_date,
@@ -620,31 +1187,390 @@ class Downloader:
         if not hits:
             logger.debug("returned without downloading because hits was None")
             return
-        base_meta = [self._get_base_metadata_from_hit(h) for h in hits]
-        base_metas = [self._guess_full_url(
-            h, prefered_file_type, skip_not_prefered_extension) for h in base_meta]
+        base_metas = self._get_base_metas_from_hits(hits, form_types, prefered_file_type, skip_not_prefered_extension)
+        if skip_existing is True:
+            base_metas = self._remove_existing_filings(base_metas)
         
-        for m in base_metas:
-            # check if file is in index, if so check if it actually exists,
-            #  if both are true skip and log the skipped file and this reason
-            file, save_name = self._download_filing(m["file_url"], m["skip"], m["fallback_url"])
-            if resolve_urls and Path(save_name).suffix == ".htm":
-                file = self._resolve_relative_urls(file, m["base_url"])
-            if save is True:
-                if file:
-                    self._save_filing(m["cik"], m["form_type"], m["accession_number"], save_name, file, extract_zip=extract_zip)
-                    if create_index is True:
-                        file_nums = m["file_num"]
-                        for file_num in file_nums:
-                            self.index_handler._create_indexes(m["cik"], m["form_type"], m["accession_number"], save_name, file_num, m["filing_date"])
-                else:
-                    logger.debug("didnt save/get filing despite that it should have. file was None")                
-            if callback != None:
-                callback({"file": file, "meta": m})
+        if pipeline is True:
+            self._download_filings_pipelined(
+                base_metas, resolve_urls, save, extract_zip, create_index,
+                callback, pipeline_workers)
+        else:
+            for m in base_metas:
+                self._download_and_save_filing(
+                    m, resolve_urls, save, extract_zip, create_index, callback)
         logger.info(f"Ticker: {self._current_ticker}, Downloads: {self._download_counter}, Form: {form_type}")           
+        self.index_handler.flush()
+        logger.debug(f"rate limiter: {self.get_rate_limit_stats()}")
         return
     
 
+    def plan_filings(
+        self,
+        ticker_or_cik: str | list[str],
+        form_type: str | list[str],
+        after_date: str = "",
+        before_date: str = "",
+        prefered_file_type: str | dict = "",
+        number_of_filings: int = None,
+        want_amendments: bool = True,
+        skip_not_prefered_extension: bool = False,
+        skip_existing: bool = True) -> DownloadPlan:
+        '''plan a download from the local bulk submissions, without any requests.
+
+        only works if you have downloaded the bulk submissions file!
+        Downloader -> get_bulk_submissions() (extract=False works as well).
+        the recent filings of a submission file are followed by the older
+        ones of its pages (CIK##########-submissions-001.json, ...), pages
+        outside of after_date - before_date arent read.
+
+        Args:
+            ticker_or_cik: a ticker/cik or a list of them
+            form_type: a form or a list of forms, amendments of these are
+                       included if want_amendments is True
+            after_date: yyyy-mm-dd, only include filings filed on or after it
+            before_date: yyyy-mm-dd, only include filings filed on or before it
+            prefered_file_type: see get_filings
+            number_of_filings: maximum amount of filings per cik, None for all
+            want_amendments: include amendments of form_type
+            skip_not_prefered_extension: see get_filings
+            skip_existing: leave out filings that are in the index and whose file exists
+        
+        Raises:
+            FileNotFoundError: if the submission file of a cik isnt available locally
+
+        Returns:
+            a DownloadPlan, execute it with execute_plan()
+        '''
+        cik10s, form_types = self._prepare_search_args(ticker_or_cik, form_type)
+        prefered_file_types = {}
+        items = []
+        for cik10 in cik10s:
+            found = 0
+            for filing in self.index_handler._iter_submission_filings(cik10, after=after_date or None, before=before_date or None):
+                if (number_of_filings is not None) and (found >= number_of_filings):
+                    break
+                if (before_date != "") and (filing["filingDate"] > before_date):
+                    continue
+                if (after_date != "") and (filing["filingDate"] < after_date):
+                    # filings are ordered descending by date
+                    break
+                is_amendment = filing["form"][-2:] == "/A"
+                if not ((filing["form"] in form_types) or (want_amendments and is_amendment and filing["form"][:-2] in form_types)):
+                    continue
+                requested = self._get_requested_form_type(filing["form"], form_types)
+                if requested not in prefered_file_types:
+                    prefered_file_types[requested] = self._get_prefered_file_type_for_form(requested, prefered_file_type)
+                m = self._guess_full_url(
+                    self._get_base_metadata_from_submission(cik10, filing),
+                    prefered_file_types[requested],
+                    skip_not_prefered_extension)
+                m["save_path"] = None if m["file_url"] is None else str(self._get_filing_save_path(
+                    m["cik"], m["form_type"], m["accession_number"], Path(m["file_url"]).name))
+                items.append(m)
+                found += 1
+        if skip_existing is True:
+            items = self._remove_existing_filings(items)
+        plan = DownloadPlan(items, self._rate_limiter.effective_rate)
+        logger.info(f"planned download: {plan.summary()}")
+        return plan
+
+    def execute_plan(
+        self,
+        plan: DownloadPlan,
+        save: bool = True,
+        extract_zip = True,
+        create_index = True,
+        resolve_urls: bool = True,
+        callback = None,
+        pipeline: bool = False,
+        pipeline_workers: int = 4,
+        skip_existing: bool = True):
+        '''download the filings of a plan created by plan_filings.
+
+        makes no requests to the search api, index entries are written in
+        bulk at the end like in get_filings_bulk.
+
+        Args:
+            plan: a DownloadPlan
+            skip_existing: skip filings downloaded since the plan was made
+            others: see get_filings
+        '''
+        self._current_ticker = None
+        self._download_counter = 0
+        base_metas = [dict(m) for m in plan]
+        if skip_existing is True:
+            base_metas = self._remove_existing_filings(base_metas)
+        self._download_filings_bulk(
+            base_metas, resolve_urls, save, extract_zip, create_index,
+            callback, pipeline, pipeline_workers)
+        logger.info(f"Planned filings: {len(plan)}, Downloads: {self._download_counter}")
+        self.index_handler.flush()
+        logger.debug(f"rate limiter: {self.get_rate_limit_stats()}")
+
+    def get_filings_many(
+        self,
+        jobs: list,
+        fairness: str = "round_robin",
+        save: bool = True,
+        extract_zip = True,
+        create_index = True,
+        resolve_urls: bool = True,
+        callback = None,
+        skip_existing: bool = True) -> list[dict]:
+        '''download the filings of many tickers/ciks, sharing the rate limit fairly between them.
+
+        instead of finishing one job before starting the next, every job is
+        split into units of one request (a page of search results or a filing)
+        and the units of all jobs are interleaved. a ticker with a few filings
+        is done after a few rounds, no matter how many filings the others have.
+        the index entries of a job are written in bulk once it is done.
+
+        Args:
+            jobs: list of dicts with the keys "ticker_or_cik", "form_type" and
+                  optionally "after_date", "before_date", "query", "prefered_file_type",
+                  "number_of_filings", "want_amendments", "skip_not_prefered_extension"
+                  (see get_filings) and "weight".
+                  tuples of (ticker_or_cik, form_type) or (ticker_or_cik, form_type, {filters})
+                  work as well.
+            fairness: "round_robin": every job takes turns
+                      "weighted": a job gets weight requests for every request of a job with weight 1
+            save, extract_zip, create_index, resolve_urls, callback, skip_existing:
+                  see get_filings, apply to all jobs
+        
+        Raises:
+            ValueError: if a job or fairness is invalid
+
+        Returns:
+            list of dicts with the stats of each job, in the order of jobs:
+                ticker_or_cik, form_type: as given in the job
+                search_requests: pages of search results requested
+                hits: filings found
+                skipped_existing: filings skipped because they were already downloaded
+                downloads: filings downloaded
+                failed: filings that couldnt be downloaded
+                duration: seconds from the start of get_filings_many until the job was done
+                error: the exception that stopped the job or None
+        '''
+        if fairness not in ("round_robin", "weighted"):
+            raise ValueError(f"fairness has to be 'round_robin' or 'weighted', got: {fairness}")
+        jobs = [self._normalize_filings_job(job) for job in jobs]
+        cik10s = self._resolve_ciks([t for job in jobs for t in job["tickers_or_ciks"]])
+        self._current_ticker = None
+        self._download_counter = 0
+        start = time.time()
+        stats = []
+        active = []
+        for job in jobs:
+            job_stats = {
+                "ticker_or_cik": job["ticker_or_cik"],
+                "form_type": job["form_type"],
+                "search_requests": 0,
+                "hits": 0,
+                "skipped_existing": 0,
+                "downloads": 0,
+                "failed": 0,
+                "duration": None,
+                "error": None}
+            stats.append(job_stats)
+            unresolved = [t for t in job["tickers_or_ciks"] if cik10s[t] is None]
+            if unresolved:
+                job_stats["error"] = KeyError(f"couldnt resolve the cik of: {unresolved}")
+                job_stats["duration"] = time.time() - start
+                logger.error(f"skipping job {job['ticker_or_cik']}:{job['form_type']}, {job_stats['error']}")
+                continue
+            job["cik10s"] = [cik10s[t] for t in job["tickers_or_ciks"]]
+            steps = self._iter_filings_job(job, job_stats, save, extract_zip, create_index, resolve_urls, callback, skip_existing)
+            weight = job["weight"] if fairness == "weighted" else 1
+            active.append({"steps": steps, "stats": job_stats, "weight": weight, "credit": 0})
+        # smooth weighted round robin, with equal weights it is a plain round robin
+        while active:
+            total_weight = sum(a["weight"] for a in active)
+            for a in active:
+                a["credit"] += a["weight"]
+            current = max(active, key=lambda a: a["credit"])
+            current["credit"] -= total_weight
+            try:
+                next(current["steps"])
+            except StopIteration:
+                current["stats"]["duration"] = time.time() - start
+                active.remove(current)
+            except Exception as e:
+                logger.error(f"job {current['stats']['ticker_or_cik']}:{current['stats']['form_type']} failed: {e}")
+                current["stats"]["error"] = e
+                current["stats"]["duration"] = time.time() - start
+                active.remove(current)
+        logger.info(f"Jobs: {len(jobs)}, Downloads: {self._download_counter}, Duration: {time.time() - start:.1f}s")
+        self.index_handler.flush()
+        logger.debug(f"rate limiter: {self.get_rate_limit_stats()}")
+        return stats
+
+    def _normalize_filings_job(self, job: dict | tuple) -> dict:
+        '''turn a job of get_filings_many into a dict with all filters set'''
+        if isinstance(job, (tuple, list)):
+            if len(job) not in (2, 3):
+                raise ValueError(f"expected a job of (ticker_or_cik, form_type) or (ticker_or_cik, form_type, filters), got: {job}")
+            filters = dict(job[2]) if len(job) == 3 else {}
+            job = {"ticker_or_cik": job[0], "form_type": job[1], **filters}
+        job = dict(job)
+        unknown = set(job.keys()) - set(FILINGS_JOB_DEFAULTS.keys()) - {"ticker_or_cik", "form_type"}
+        if unknown:
+            raise ValueError(f"unknown keys in job: {unknown}")
+        if ("ticker_or_cik" not in job) or ("form_type" not in job):
+            raise ValueError(f"a job needs a ticker_or_cik and a form_type, got: {job}")
+        if job.get("weight", 1) <= 0:
+            raise ValueError(f"weight has to be larger than 0, got: {job['weight']}")
+        normalized = {**FILINGS_JOB_DEFAULTS, **job}
+        ticker_or_cik = normalized["ticker_or_cik"]
+        normalized["tickers_or_ciks"] = [ticker_or_cik] if isinstance(ticker_or_cik, str) else list(ticker_or_cik)
+        form_type = normalized["form_type"]
+        normalized["form_types"] = [form_type] if isinstance(form_type, str) else list(form_type)
+        return normalized
+
+    def _iter_filings_job(self, job: dict, stats: dict, save: bool, extract_zip: bool, create_index: bool, resolve_urls: bool, callback, skip_existing: bool):
+        '''run a job of get_filings_many, yields after every search page and every filing.'''
+        hits = []
+        for page in self._iter_search_api_pages(
+                ticker_or_cik=job["cik10s"],
+                form_type=job["form_types"],
+                number_of_filings=job["number_of_filings"],
+                want_amendments=job["want_amendments"],
+                after_date=job["after_date"],
+                before_date=job["before_date"],
+                query=job["query"]):
+            stats["search_requests"] += 1
+            hits += page
+            yield
+        hits = hits[:job["number_of_filings"]]
+        stats["hits"] = len(hits)
+        base_metas = self._get_base_metas_from_hits(hits, job["form_types"], job["prefered_file_type"], job["skip_not_prefered_extension"])
+        if skip_existing is True:
+            base_metas = self._remove_existing_filings(base_metas)
+            stats["skipped_existing"] = len(hits) - len(base_metas)
+        index_entries = {}
+        for m in base_metas:
+            file = self._download_and_save_filing(
+                m, resolve_urls, save, extract_zip, create_index, callback, index_entries=index_entries)
+            if file:
+                stats["downloads"] += 1
+            else:
+                stats["failed"] += 1
+            yield
+        for cik, entries in index_entries.items():
+            self.index_handler._create_indexes_bulk(cik, entries)
+
+    def _download_and_save_filing(self, m: dict, resolve_urls: bool, save: bool, extract_zip: bool, create_index: bool, callback, index_entries: dict = None):
+        '''download the filing described by the base_meta m, save and index it.
+
+        Args:
+            index_entries: if given, index entries are collected in it by cik
+                           instead of being written to the index directly
+        Returns:
+            the file or None if it couldnt be downloaded
+        '''
+        file, save_name = self._download_filing(m["file_url"], m["skip"], m["fallback_url"])
+        if resolve_urls and file and Path(save_name).suffix == ".htm":
+            file = self._resolve_relative_urls(file, m["base_url"])
+        if save is True:
+            if file:
+                self._save_filing(m["cik"], m["form_type"], m["accession_number"], save_name, file, extract_zip=extract_zip)
+                if create_index is True:
+                    for file_num in m["file_num"]:
+                        if index_entries is not None:
+                            index_entries.setdefault(m["cik"], []).append([m["form_type"], m["accession_number"], save_name, file_num, m["filing_date"]])
+                        else:
+                            self.index_handler._create_indexes(m["cik"], m["form_type"], m["accession_number"], save_name, file_num, m["filing_date"])
+            else:
+                logger.debug("didnt save/get filing despite that it should have. file was None")
+        if callback != None:
+            callback({"file": file, "meta": m})
+        return file
+
+    def _remove_existing_filings(self, base_metas: list[dict]) -> list[dict]:
+        '''remove the filings that are in the index and whose files exist'''
+        remaining = [m for m in base_metas if not self.index_handler.has_filing(m["cik"], m["accession_number"])]
+        if len(remaining) != len(base_metas):
+            logger.info(f"skipping {len(base_metas) - len(remaining)} already downloaded filings")
+        return remaining
+
+    def _download_filings_pipelined(
+            self,
+            base_metas: list[dict],
+            resolve_urls: bool,
+            save: bool,
+            extract_zip: bool,
+            create_index: bool,
+            callback,
+            workers: int,
+            index_entries: dict = None):
+        '''download, process and save filings in three overlapping stages.
+
+        1. this thread downloads the filings one after another at the rate limit
+        2. a pool of worker processes resolves urls and extracts zips (_process_filing)
+        3. a writer thread saves the filings, adds them to the index and calls
+           callback, in the order they were downloaded
+
+        at most 2 * workers filings are downloaded but not yet written, if the
+        later stages fall behind the download stage waits for them.
+
+        Args:
+            index_entries: if given, index entries are collected in it by cik
+                           instead of being written to the index directly
+        '''
+        processed = queue.Queue(maxsize=2 * workers)
+        writer_errors = []
+
+        def write():
+            while True:
+                item = processed.get()
+                if item is None:
+                    return
+                if writer_errors:
+                    # keep draining so the download stage never blocks on a full queue
+                    continue
+                m, save_name, future = item
+                try:
+                    file = future.result() if future is not None else None
+                    if save is True:
+                        if file:
+                            self._save_filing(m["cik"], m["form_type"], m["accession_number"], save_name, file, extract_zip=False)
+                            if create_index is True:
+                                for file_num in m["file_num"]:
+                                    if index_entries is not None:
+                                        index_entries.setdefault(m["cik"], []).append([m["form_type"], m["accession_number"], save_name, file_num, m["filing_date"]])
+                                    else:
+                                        self.index_handler._create_indexes(m["cik"], m["form_type"], m["accession_number"], save_name, file_num, m["filing_date"])
+                        else:
+                            logger.debug("didnt save/get filing despite that it should have. file was None")
+                    if callback != None:
+                        callback({"file": file, "meta": m})
+                except Exception as e:
+                    logger.debug(("exception in writer stage of the filing pipeline", e))
+                    writer_errors.append(e)
+
+        # spawn so the workers dont inherit the locks held by the writer thread
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            writer_thread = threading.Thread(target=write, name="pysec_filing_writer", daemon=True)
+            writer_thread.start()
+            try:
+                for m in base_metas:
+                    if writer_errors:
+                        break
+                    file, save_name = self._download_filing(m["file_url"], m["skip"], m["fallback_url"])
+                    if not file:
+                        processed.put((m, save_name, None))
+                        continue
+                    extract_path = None
+                    if (save is True) and (extract_zip is True):
+                        extract_path = str(self._get_filing_save_path(m["cik"], m["form_type"], m["accession_number"], save_name).parent)
+                    future = pool.submit(_process_filing, file, save_name, m["base_url"], resolve_urls, extract_path)
+                    processed.put((m, save_name, future))
+            finally:
+                processed.put(None)
+                writer_thread.join()
+        if writer_errors:
+            raise writer_errors[0]
+
     def get_xbrl_companyconcept(self, ticker_or_cik: str, taxonomy: str, tag: str):
         '''
         Args:
@@ -665,15 +1591,32 @@ class Downloader:
         url = SEC_API_XBRL_COMPANYCONCEPT_URL
         for x in [urlcik, taxonomy, filename]:
             url = urljoin(url, x)
-        resp = self._get(url=url, headers=self._sec_xbrl_api_headers)
-        content = resp.json()
+        resp = self._request_cached("companyconcept", "GET", url=url, headers=self._sec_xbrl_api_headers)
+        content = loads(resp.content)
         return content
     
-    def get_xbrl_companyfacts(self, ticker_or_cik: str) -> dict:
+    def get_xbrl_companyfacts(
+        self,
+        ticker_or_cik: str,
+        from_bulk_archive: bool = True,
+        taxonomies: list[str] = None,
+        tags: list[str] = None,
+        forms: list[str] = None) -> dict:
         '''download a companyfacts file.
+
+        if any of taxonomies, tags or forms is given the file is parsed
+        incrementally (see json_parsing.load_companyfacts) and only the
+        selected facts are kept, without a cache the response is parsed
+        while it is downloaded.
         
         Args:
             ticker_or_cik: ticker like "AAPL" or cik like "1852973" or "0001852973"
+            from_bulk_archive: read the file from companyfacts.zip in root_path
+                               if it exists (see get_bulk_companyfacts(extract=False)),
+                               only download it if the cik isnt in there.
+            taxonomies: only keep these taxonomies, eg: ["us-gaap"]
+            tags: only keep these tags, eg: ["Revenues", "AccountsPayableCurrent"]
+            forms: only keep facts reported in these form types, eg: ["10-K"]
         
         Returns:
             python representation of the json file with contents described
@@ -681,69 +1624,348 @@ class Downloader:
             - https://www.sec.gov/edgar/sec-api-documentation
         '''     
         cik10 = self._convert_to_cik10(ticker_or_cik)
+        selected = (taxonomies is not None) or (tags is not None) or (forms is not None)
         # build URL
         filename = "CIK" + cik10 + ".json"
+        if from_bulk_archive is True:
+            archive = self.index_handler._get_bulk_archive("companyfacts.zip")
+            if (archive is not None) and (filename in archive):
+                if selected is False:
+                    return archive.read_json(filename)
+                return load_companyfacts(BytesIO(archive.read(filename)), taxonomies, tags, forms)
         url = urljoin(SEC_API_XBRL_COMPANYFACTS_URL, filename)
         # make call
-        resp = self._get(url=url, headers=self._sec_xbrl_api_headers)
-        content = resp.json()
+        if (selected is True) and (self.cache is None):
+            with self._get(url=url, headers=self._sec_xbrl_api_headers, stream=True) as resp:
+                resp.raise_for_status()
+                resp.raw.decode_content = True
+                return load_companyfacts(resp.raw, taxonomies, tags, forms)
+        resp = self._request_cached("companyfacts", "GET", url=url, headers=self._sec_xbrl_api_headers)
+        if selected is True:
+            return load_companyfacts(BytesIO(resp.content), taxonomies, tags, forms)
+        content = loads(resp.content)
         return content
     
-    def get_bulk_companyfacts(self, extract: bool=True):
+    def get_bulk_companyfacts(self, extract: bool=True, ciks: list[str] = None, extract_workers: int = None, skip_unchanged: bool = False):
         '''get all the companyfacts in one zip file (~1GB, extracted ~12GB)
         
         Args:
             extract: extract the zip into /companyfacts or just save the zip
                      in the root_path
+            ciks: only get the companyfacts of these ciks/tickers. reads the
+                  index of the remote zip and extracts only their files
+                  into /companyfacts with range requests instead of
+                  downloading the whole zip.
+            extract_workers: number of processes used to extract the zip,
+                             defaults to the number of cpus
+            skip_unchanged: dont rewrite files that already exist with the
+                            same size and crc32
+        Returns:
+            names of the extracted files if ciks was given
         '''
+        if ciks is not None:
+            return self._extract_remote_zip_members_by_cik(url=SEC_BULK_COMPANYFACTS, extract_path=self.root_path / "companyfacts", ciks=ciks)
         if extract is True:
-            self._handle_download_zip_file_with_extract(url=SEC_BULK_COMPANYFACTS, extract_path=self.root_path / "companyfacts")
+            self._handle_download_zip_file_with_extract(url=SEC_BULK_COMPANYFACTS, extract_path=self.root_path / "companyfacts", workers=extract_workers, skip_unchanged=skip_unchanged)
         else:
             self._handle_download_zip_file_without_extract(url=SEC_BULK_COMPANYFACTS, save_path=self.root_path / "companyfacts.zip")
             
     
-    def get_bulk_submissions(self, extract: bool=True):
+    def get_bulk_submissions(self, extract: bool=True, ciks: list[str] = None, extract_workers: int = None, skip_unchanged: bool = False):
         '''get all the submissions in one zip file (~1.2GB, extracted ~6GB)
         
         Args:
             extract: extract the zip into /submissions or just save the zip
                      in the root_path
+            ciks: only get the submissions of these ciks/tickers. reads the
+                  index of the remote zip and extracts only their files
+                  into /submissions with range requests instead of
+                  downloading the whole zip.
+            extract_workers: number of processes used to extract the zip,
+                             defaults to the number of cpus
+            skip_unchanged: dont rewrite files that already exist with the
+                            same size and crc32
+        Returns:
+            names of the extracted files if ciks was given
         '''
+        self.index_handler.submissions_store.invalidate()
+        if ciks is not None:
+            return self._extract_remote_zip_members_by_cik(url=SEC_BULK_SUBMISSIONS, extract_path=self.root_path / "submissions", ciks=ciks)
         if extract is True:
-            self._handle_download_zip_file_with_extract(url=SEC_BULK_SUBMISSIONS, extract_path=self.root_path / "submissions")
+            self._handle_download_zip_file_with_extract(url=SEC_BULK_SUBMISSIONS, extract_path=self.root_path / "submissions", workers=extract_workers, skip_unchanged=skip_unchanged)
         else:
             self._handle_download_zip_file_without_extract(url=SEC_BULK_SUBMISSIONS, save_path=self.root_path / "submissions.zip")
 
+    def sync_bulk_submissions(self, ciks: list[str] = None, max_range_fraction: float = 0.25, extract_workers: int = None) -> dict:
+        '''bring the extracted bulk submissions in /submissions up to date,
+        rewriting only the files that changed since the last sync.
 
-    def _handle_download_zip_file_without_extract(self, url: str, save_path: str):
-        resp = self._get(url=url, headers=self._sec_files_headers, stream=True)
+        see _sync_bulk for how and what is reported.
+
+        Args:
+            ciks: only refresh the submissions of these ciks/tickers with
+                  conditional requests to data.sec.gov/submissions, pages of
+                  their filing history that arent on disk yet are fetched too
+            max_range_fraction: fetch only the changed members with range
+                                requests, as long as they make up less than
+                                this fraction of the zip
+            extract_workers: number of processes used to extract the zip
+        '''
+        self.index_handler.submissions_store.invalidate()
+        return self._sync_bulk(
+            url=SEC_BULK_SUBMISSIONS, api_url=SEC_API_SUBMISSIONS_URL, extract_path=self.root_path / "submissions",
+            ciks=ciks, max_range_fraction=max_range_fraction, extract_workers=extract_workers)
+
+    def sync_bulk_companyfacts(self, ciks: list[str] = None, max_range_fraction: float = 0.25, extract_workers: int = None) -> dict:
+        '''bring the extracted companyfacts in /companyfacts up to date, like sync_bulk_submissions.
+
+        with ciks the files are refreshed from data.sec.gov/api/xbrl/companyfacts.
+        '''
+        return self._sync_bulk(
+            url=SEC_BULK_COMPANYFACTS, api_url=SEC_API_XBRL_COMPANYFACTS_URL, extract_path=self.root_path / "companyfacts",
+            ciks=ciks, max_range_fraction=max_range_fraction, extract_workers=extract_workers)
+
+    def _sync_bulk(self, url: str, api_url: str, extract_path: Path, ciks: list[str], max_range_fraction: float, extract_workers: int) -> dict:
+        '''sync extract_path with the bulk zip at url.
+
+        the crc32 and size of every extracted member are kept in
+        <extract_path>.manifest.json. without ciks the central directory of
+        the remote zip is read with range requests and compared to the
+        manifest, changed members are fetched with range requests or, if
+        they are too many, the zip is downloaded and only they are extracted.
+        files of members no longer in the zip are removed.
+        with ciks only their files are requested from api_url, with
+        If-None-Match/If-Modified-Since if they were refreshed before.
+
+        Returns:
+            dict with keys:
+                mode: "range", "full" or "api"
+                files_checked: members/ciks compared
+                files_changed: files written
+                files_removed: files of members no longer in the zip
+                files_saved: files that didnt have to be written again
+                bytes_transferred: bytes downloaded
+                bytes_saved: bytes of the zip (or unchanged api files) not downloaded
+        '''
+        manifest_path = Path(str(extract_path) + ".manifest.json")
+        manifest = load_manifest(manifest_path)
+        extract_path.mkdir(parents=True, exist_ok=True)
+        if ciks is not None:
+            report = self._sync_bulk_by_cik(api_url, extract_path, manifest, ciks)
+        else:
+            report = self._sync_bulk_archive(url, extract_path, manifest, max_range_fraction, extract_workers)
+        save_manifest(manifest_path, manifest)
+        logger.info(f"synced {extract_path}: {report}")
+        return report
+
+    def _sync_bulk_archive(self, url: str, extract_path: Path, manifest: dict, max_range_fraction: float, extract_workers: int) -> dict:
+        '''sync with the whole zip, see _sync_bulk. updates manifest'''
+        report = {"mode": "range", "files_checked": 0, "files_changed": 0, "files_removed": 0, "files_saved": 0, "bytes_transferred": 0, "bytes_saved": 0}
+        with HttpRangeFile(self._get, url, headers=self._sec_files_headers) as f:
+            with ZipFile(f, "r") as z:
+                members = [i for i in z.infolist() if not i.is_dir()]
+                changed = get_changed_members(members, manifest["members"], extract_path)
+                if sum(get_member_span(i) for i in changed) <= max_range_fraction * f.size:
+                    extract_remote_infos(z, f, changed, extract_path)
+                    report["files_changed"] = len(changed)
+                else:
+                    report["mode"] = "full"
+            report["bytes_transferred"] = f.bytes_transferred
+            zip_size = f.size
+        if report["mode"] == "full":
+            save_path = self.root_path / "temp.zip"
+            self._download_file_resumable(url=url, save_path=save_path)
+            with ZipFile(save_path, "r") as z:
+                members = [i for i in z.infolist() if not i.is_dir()]
+            changed = get_changed_members(members, manifest["members"], extract_path)
+            # files of members missing from the manifest may already be up to date
+            stats = extract_zip_parallel(
+                save_path, extract_path, workers=extract_workers, skip_unchanged=True, names=set(i.filename for i in changed))
+            save_path.unlink()
+            report["files_changed"] = stats["extracted"]
+            report["bytes_transferred"] += zip_size
+        names = set(i.filename for i in members)
+        report["files_removed"] = remove_members(extract_path, [n for n in manifest["members"] if n not in names])
+        report["files_checked"] = len(members)
+        report["files_saved"] = len(members) - report["files_changed"]
+        report["bytes_saved"] = max(0, zip_size - report["bytes_transferred"])
+        manifest["members"] = {i.filename: [i.CRC, i.file_size] for i in members}
+        return report
+
+    def _sync_bulk_by_cik(self, api_url: str, extract_path: Path, manifest: dict, ciks: list[str]) -> dict:
+        '''refresh the files of ciks with conditional requests to api_url, see _sync_bulk. updates manifest
+
+        pages listed in "filings.files" of a submissions file
+        (CIK##########-submissions-001.json, ...) that arent in extract_path
+        are fetched as well.
+        '''
+        report = {"mode": "api", "files_checked": 0, "files_changed": 0, "files_removed": 0, "files_saved": 0, "bytes_transferred": 0, "bytes_saved": 0}
+        for cik10 in sorted(set(self._convert_to_cik10(c) for c in ciks)):
+            name = f"CIK{cik10}.json"
+            if not self._sync_api_file(api_url, extract_path, manifest, name, report):
+                continue
+            try:
+                with open(extract_path / name, "rb") as f:
+                    pages = load_submissions(f, columns=[]).get("filings", {}).get("files", [])
+            except ValueError as e:
+                logger.debug(f"couldnt read the pages of {name}: {e}")
+                continue
+            for page in pages:
+                if ("name" in page) and not (extract_path / page["name"]).is_file():
+                    self._sync_api_file(api_url, extract_path, manifest, page["name"], report)
+        return report
+
+    def _sync_api_file(self, api_url: str, extract_path: Path, manifest: dict, name: str, report: dict) -> bool:
+        '''refresh extract_path/name with a conditional request to api_url, updates manifest and report.
+
+        Returns:
+            True if the file exists afterwards, False if api_url doesnt have it
+        '''
+        target = extract_path / name
+        headers = dict(self._sec_xbrl_api_headers)
+        etag, last_modified = manifest["validators"].get(name, [None, None])
+        if target.is_file():
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        report["files_checked"] += 1
+        resp = self._get(url=urljoin(api_url, name), headers=headers)
+        if resp.status_code == 304:
+            report["files_saved"] += 1
+            report["bytes_saved"] += target.stat().st_size
+            return True
+        if resp.status_code == 404:
+            logger.debug(f"no file {name} at {api_url}")
+            return False
         resp.raise_for_status()
-        if resp:
-            with resp as r:
-                total_length = int(r.headers.get("Content-Length"))
-                with tqdm.wrapattr(r.raw, "read", total=total_length, desc="") as raw:
-                    with open(save_path, "wb") as f:
-                        shutil.copyfileobj(raw, f)
+        content = resp.content
+        tmp_path = Path(str(target) + ".tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, target)
+        # a later sync with the zip skips the member if its content is the same
+        manifest["members"][name] = [zlib.crc32(content), len(content)]
+        manifest["validators"][name] = [resp.headers.get("ETag"), resp.headers.get("Last-Modified")]
+        report["files_changed"] += 1
+        report["bytes_transferred"] += len(content)
+        return True
+
+    def _extract_remote_zip_members_by_cik(self, url: str, extract_path: Path, ciks: list[str]) -> list[str]:
+        '''extract only the members belonging to ciks from the zip at url using range requests.'''
+        cik10s = set(self._convert_to_cik10(c) for c in ciks)
+        extract_path.mkdir(parents=True, exist_ok=True)
+        with HttpRangeFile(self._get, url, headers=self._sec_files_headers) as f:
+            extracted = extract_remote_members(f, extract_path, lambda name: is_cik_member(name, cik10s))
+            logger.info(
+                (f"extracted {len(extracted)} files for {len(cik10s)} ciks from {url}, "
+                 f"transferred {f.bytes_transferred} of {f.size} bytes in {f.requests_made} requests"))
+        return extracted
+
+
+    def _handle_download_zip_file_without_extract(self, url: str, save_path: str):
+        # release the memory map of the old zip before replacing it
+        self.index_handler._close_bulk_archive(Path(save_path).name)
+        self._download_file_resumable(url=url, save_path=Path(save_path))
     
-    def _handle_download_zip_file_with_extract(self, url, extract_path: str):
-        resp = self._get(url=url, headers=self._sec_files_headers, stream=True)
-        resp.raise_for_status()
-        if resp:
-            with resp as r:
-                total_length = int(r.headers.get("Content-Length"))
-                save_path = self.root_path / "temp.zip"
-                if save_path.exists() and save_path.is_file():
-                    save_path.unlink()
-                with tqdm.wrapattr(r.raw, "read", total=total_length, desc="") as raw:
-                    (self.root_path / "submissions").mkdir(parents=True, exist_ok=True)
-                    with open(save_path, "wb") as f:
-                        shutil.copyfileobj(raw, f)
-                logger.debug(f"wrote the zip file successfully, url: {url}, interim_save_path: {save_path}")
-                with ZipFile(save_path, "r") as z:
-                    logger.debug(f"starting extraction of zip file:{datetime.now()}")
-                    z.extractall(extract_path)
-                    logger.debug(f"finished extraction of zip file: {datetime.now()}")
-                save_path.unlink()
+    def _handle_download_zip_file_with_extract(self, url, extract_path: str, workers: int = None, skip_unchanged: bool = False):
+        save_path = self.root_path / "temp.zip"
+        self._download_file_resumable(url=url, save_path=save_path)
+        logger.debug(f"wrote the zip file successfully, url: {url}, interim_save_path: {save_path}")
+        logger.debug(f"starting extraction of zip file:{datetime.now()}")
+        stats = extract_zip_parallel(save_path, extract_path, workers=workers, skip_unchanged=skip_unchanged)
+        logger.debug(f"finished extraction of zip file: {datetime.now()}, {stats}")
+        save_path.unlink()
+
+    def _download_file_resumable(self, url: str, save_path: Path):
+        '''download a (large) file to save_path and resume if the download breaks off.
+
+        the download is written to save_path.part, its ETag/Last-Modified and
+        size are kept in save_path.part.json. a later call (or a retry after
+        the connection dropped) continues with a Range request as long as the
+        file on the server didnt change (If-Range). the file is only moved
+        to save_path once its size matches the size announced by the server.
+
+        Raises:
+            requests.HTTPError: if the server responds with an error status
+            OSError: if the download is still incomplete after self._retries resumes
+        '''
+        part_path = Path(str(save_path) + ".part")
+        meta_path = Path(str(save_path) + ".part.json")
+        meta = self._read_partial_download_meta(url, part_path, meta_path)
+        resumes = 0
+        while True:
+            offset = part_path.stat().st_size if part_path.exists() else 0
+            validator = meta.get("etag") or meta.get("last_modified")
+            resuming = (offset > 0) and bool(validator)
+            headers = get_range_headers(self._sec_files_headers, f"bytes={offset}-" if resuming else None)
+            if resuming:
+                headers["If-Range"] = validator
+            try:
+                resp = self._get(url=url, headers=headers, stream=True)
+                if resp.status_code == 416 or (resp.status_code == 206 and self._get_content_range_start(resp) != offset):
+                    resp.close()
+                    if offset == meta.get("size"):
+                        # we already have the whole file
+                        break
+                    logger.info(f"couldnt resume download of {url} at {offset} bytes, starting over")
+                    part_path.unlink()
+                    meta = {}
+                    continue
+                resp.raise_for_status()
+                with resp as r:
+                    if r.status_code == 206:
+                        mode = "ab"
+                    else:
+                        offset = 0
+                        mode = "wb"
+                        length = r.headers.get("Content-Length")
+                        meta = {
+                            "url": url,
+                            "etag": r.headers.get("ETag"),
+                            "last_modified": r.headers.get("Last-Modified"),
+                            "size": int(length) if length else None}
+                        meta_path.write_text(json.dumps(meta))
+                    with tqdm.wrapattr(r.raw, "read", total=meta["size"], initial=offset, desc="") as raw:
+                        with open(part_path, mode) as f:
+                            shutil.copyfileobj(raw, f)
+            except (requests.ConnectionError, requests.Timeout, urllib3.exceptions.HTTPError) as e:
+                logger.info(f"download of {url} broke off at {part_path.stat().st_size if part_path.exists() else 0} bytes: {e}")
+            else:
+                size = part_path.stat().st_size
+                if (meta["size"] is None) or (size == meta["size"]):
+                    break
+                if size > meta["size"]:
+                    part_path.unlink()
+                    meta_path.unlink()
+                    raise OSError(f"download of {url} is larger than expected: {size} > {meta['size']} bytes")
+                logger.info(f"download of {url} incomplete: {size}/{meta['size']} bytes")
+            resumes += 1
+            if resumes > self._retries:
+                raise OSError(f"couldnt complete download of {url} after {self._retries} resumes, partial download kept at {part_path}")
+        part_path.replace(save_path)
+        meta_path.unlink(missing_ok=True)
+
+    def _read_partial_download_meta(self, url: str, part_path: Path, meta_path: Path) -> dict:
+        '''load the meta of a partial download of url, discards partial downloads of other urls'''
+        meta = {}
+        if meta_path.exists():
+            try:
+                meta = json.loads(meta_path.read_text())
+            except ValueError:
+                meta = {}
+        if meta.get("url") != url:
+            meta = {}
+            part_path.unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+        return meta
+
+    def _get_content_range_start(self, resp: requests.Response) -> int | None:
+        '''get the first byte position of a "Content-Range: bytes start-end/total" header'''
+        content_range = resp.headers.get("Content-Range", "")
+        try:
+            return int(content_range.split(" ", 1)[1].split("-", 1)[0])
+        except (IndexError, ValueError):
+            return None
                     
 
     def get_file_company_tickers(self) -> dict:
@@ -875,6 +2097,23 @@ class Downloader:
                 f"Creating new default session"))
             self._create_session()
         return
+
+    def get_rate_limit_stats(self) -> dict:
+        '''get throughput, queue wait and throttling metrics of the rate limiter.
+
+        see TokenBucketRateLimiter.stats for the keys.
+        '''
+        return self._rate_limiter.stats()
+
+    def set_rate_limiter(self, rate_limiter: RateLimiter):
+        '''use a custom rate limiter, eg: one shared with other Downloaders.
+
+        Args:
+            rate_limiter: an instance of a RateLimiter subclass
+        '''
+        if not isinstance(rate_limiter, RateLimiter):
+            raise ValueError(f"rate_limiter is expected to be of type RateLimiter, got type: {type(rate_limiter)}")
+        self._rate_limiter = rate_limiter
     
     
     def _construct_sec_xbrl_api_headers(self):
@@ -893,6 +2132,29 @@ class Downloader:
             "Accept-Encoding": "gzip, deflate",
             "Host": host}
     
+    def _resolve_ciks(self, tickers_or_ciks: list[str]) -> dict:
+        '''get the 10 digit ciks of many tickers/ciks at once.
+
+        the ticker:cik lookup table is updated at most once, if any
+        of the tickers arent in it.
+
+        Returns:
+            dict of {ticker_or_cik: cik10 or None if it couldnt be resolved}
+        '''
+        tickers = set(t for t in tickers_or_ciks if not str(t).isdigit())
+        missing = [t for t in tickers if t.upper() not in self._lookuptable_ticker_cik]
+        if missing:
+            logger.info(f"updating the ticker:cik lookup table, didnt find: {missing}")
+            self._update_lookuptable_tickers_cik()
+            self._lookuptable_ticker_cik = self._load_or_update_lookuptable_ticker_cik()
+        resolved = {}
+        for t in tickers_or_ciks:
+            if (t in tickers) and (t.upper() not in self._lookuptable_ticker_cik):
+                resolved[t] = None
+            else:
+                resolved[t] = self._convert_to_cik10(t)
+        return resolved
+
     def _convert_to_cik10(self, ticker_or_cik: str):
         '''try to get the 10 digit cik from a ticker or a cik
         Args:
@@ -982,8 +2244,55 @@ class Downloader:
     def _sanitize_form_type(self, form_type: str) -> str:
         'remove "/" from the form_type and replace with "."'
         return form_type.replace("/", ".")
+
+    def _get_prefered_file_type(self, form_type: str, prefered_file_type: str) -> str:
+        'return prefered_file_type or the default for form_type if it isnt set'
+        if prefered_file_type == (None or ""):
+            if form_type not in PREFERED_FILE_TYPE_MAP.keys():
+                logger.info(f"No Default file_type set for this form_type: {form_type}. defaulting to 'htm'")
+                return "htm"
+            else:
+                return PREFERED_FILE_TYPE_MAP[form_type]
+        return prefered_file_type
     
     
+    def _get_requested_form_type(self, hit_form_type: str, form_types: list[str]) -> str:
+        'return the requested form a hit belongs to, amendments belong to their original form'
+        if hit_form_type in form_types:
+            return hit_form_type
+        if hit_form_type[-2:] == "/A" and hit_form_type[:-2] in form_types:
+            return hit_form_type[:-2]
+        return hit_form_type
+
+    def _get_prefered_file_type_for_form(self, form_type: str, prefered_file_type: str | dict) -> str:
+        'like _get_prefered_file_type, but prefered_file_type can also be a dict of {form_type: filetype}'
+        if isinstance(prefered_file_type, dict):
+            return self._get_prefered_file_type(form_type, prefered_file_type.get(form_type, ""))
+        return self._get_prefered_file_type(form_type, prefered_file_type)
+
+    def _prepare_search_args(self, ticker_or_cik: str | list[str], form_type: str | list[str]) -> tuple[list[str], list[str]]:
+        'convert a ticker/cik or list of them and a form or list of forms to lists of cik10s and forms'
+        tickers_or_ciks = [ticker_or_cik] if isinstance(ticker_or_cik, str) else list(ticker_or_cik)
+        form_types = [form_type] if isinstance(form_type, str) else list(form_type)
+        if (tickers_or_ciks == []) or (form_types == []):
+            raise ValueError(f"need at least one ticker/cik and form_type, got: {ticker_or_cik}, {form_type}")
+        return [self._convert_to_cik10(t) for t in tickers_or_ciks], form_types
+
+    def _get_base_metas_from_hits(self, hits: list[dict], form_types: list[str], prefered_file_type: str | dict, skip_not_prefered_extension: bool) -> list[dict]:
+        '''get the base_meta with guessed file urls of each hit.
+
+        the prefered_file_type of a hit is the one of the form it was requested as.
+        '''
+        prefered_file_types = {}
+        base_metas = []
+        for h in hits:
+            requested = self._get_requested_form_type(h["_source"]["file_type"], form_types)
+            if requested not in prefered_file_types:
+                prefered_file_types[requested] = self._get_prefered_file_type_for_form(requested, prefered_file_type)
+            base_metas.append(self._guess_full_url(
+                self._get_base_metadata_from_hit(h), prefered_file_types[requested], skip_not_prefered_extension))
+        return base_metas
+
     def _get_filing_save_path(self, ticker_or_cik: str, form_type: str, accn: str, file_name: str) -> str:
         'constructs and returns save path for a filing'
         return reduce(lambda x, y: Path.joinpath(x, y), [self.root_path, "filings", ticker_or_cik, self._sanitize_form_type(form_type), _ensure_no_dash_accn(accn), file_name])
@@ -1049,19 +2358,7 @@ class Downloader:
     
     def _resolve_relative_urls(self, filing: str, base_url: str):
         'changes relative to absolute urls.'
-        soup = BeautifulSoup(filing, features="lxml")
-        base = base_url
-        for rurl in soup.find_all("a", href=True):
-            href = rurl["href"]
-            if href.startswith("http") or href.startswith("#"):
-                pass
-            else:
-                rurl["href"] = urljoin(base, href)
-        
-        for image in soup.find_all("img", src=True):
-            image["src"] = urljoin(base, image["src"])
-        
-        return soup.encode(soup.original_encoding) if soup.original_encoding else soup
+        return _resolve_relative_urls(filing, base_url)
     
 
     def _get_systime_ms(self):
@@ -1088,92 +2385,214 @@ class Downloader:
             "filing_date": filing_date}
    
 
+    def _get_base_metadata_from_submission(self, cik: str, filing: dict) -> dict:
+        '''like _get_base_metadata_from_hit, for a filing of a submission file (see IndexHandler._iter_submission_filings)'''
+        accession_number_no_dash = _ensure_no_dash_accn(filing["accessionNumber"])
+        submission_base_url = urljoin(urljoin(EDGAR_ARCHIVES_BASE_URL, cik), accession_number_no_dash)
+        main_file_name = _get_correct_primary_file_name(filing["primaryDocument"])
+        if not main_file_name:
+            # filings without a primary document still have the full text submission
+            main_file_name = filing["accessionNumber"] + ".txt"
+        return {
+            "form_type": self._sanitize_form_type(filing["form"]),
+            "accession_number": accession_number_no_dash,
+            "cik": cik,
+            "base_url": submission_base_url,
+            "main_file_name": main_file_name,
+            "xsl": None,
+            "file_num": [filing["fileNumber"]],
+            "filing_date": filing["filingDate"]}
+
     def _json_from_search_api(
             self,
-            ticker_or_cik: str,
-            form_type: str,
+            ticker_or_cik: str | list[str],
+            form_type: str | list[str],
             number_of_filings: int = 20,
             want_amendments = False,
             after_date: str = "",
             before_date: str = "",
             query: str = ""
             ) -> dict:
-        '''gets a list of filings submitted to the sec.'''
+        '''gets a list of filings submitted to the sec.
+
+        lists of ciks and forms are searched for in one paginated query,
+        number_of_filings is the maximum amount of hits of that query.
+        '''
         gathered_responses = []
-        headers = { 
-            "User-Agent": self.user_agent,
-            "Accept-Encoding": "gzip, deflate",
-            "Host": "efts.sec.gov"}
+        for hits in self._iter_search_api_pages(
+                ticker_or_cik, form_type, number_of_filings, want_amendments, after_date, before_date, query):
+            gathered_responses += hits
+        return gathered_responses[:number_of_filings]
+
+    def _iter_search_api_pages(
+            self,
+            ticker_or_cik: str | list[str],
+            form_type: str | list[str],
+            number_of_filings: int = 20,
+            want_amendments = False,
+            after_date: str = "",
+            before_date: str = "",
+            query: str = ""):
+        '''request the pages of a search one by one and yield the filtered hits of each.
+
+        every page is one request, the last one may yield an empty list.
+        '''
+        gathered_count = 0
+        headers = self._construct_sec_search_api_headers()
         start_index = 0
-        while len(gathered_responses) < number_of_filings:
-            post_body = {
-                "dateRange": "custom",
-                "startdt": after_date,
-                "enddt": before_date,
-                "entityName": ticker_or_cik,
-                "forms": [form_type],
-                "from": start_index,
-                "q": query}
-            resp = self._post(url=SEC_SEARCH_API_URL, json=post_body, headers=headers)
+        while gathered_count < number_of_filings:
+            post_body = self._build_search_api_post_body(
+                ticker_or_cik, form_type, start_index, after_date, before_date, query)
+            resp = self._request_cached("search", "POST", url=SEC_SEARCH_API_URL, headers=headers, body=post_body)
             resp.raise_for_status()
             result = resp.json()
+            hits, query_size = self._parse_search_api_result(
+                result, ticker_or_cik, form_type, want_amendments, after_date, before_date, gathered_count)
+            if hits is None:
+                yield []
+                return
+            gathered_count += len(hits)
+            start_index += query_size
+            yield hits
 
-            logger.debug(f"result from POST call: {result}")
-            
-            if "error" in result:
-                try:
-                    root_cause = result["error"]["root_cause"]
-                    if not root_cause:
-                        raise ValueError
-                    else:
-                        raise ValueError(f"error reason: {root_cause[0]['reason']}")  
-                except (KeyError, IndexError) as e:
-                    raise e
-            if not result:
-                break
+    def _construct_sec_search_api_headers(self):
+        return { 
+            "User-Agent": self.user_agent,
+            "Accept-Encoding": "gzip, deflate",
+            "Host": "efts.sec.gov"}
 
-            if result["hits"]["hits"] == []:
-                if len(gathered_responses) == 0:
-                    logger.info(f"[{ticker_or_cik}:{form_type}] -> No filings found for this combination")
-                break
-            
-            for res in result["hits"]["hits"]:
-                # only filter for amendments here
-                res_form_type = res["_source"]["file_type"]
-                is_amendment = res_form_type[-2:] == "/A"
-                if not want_amendments and is_amendment:
-                    continue
-                # make sure that no wrong filing type is added
-                if (not is_amendment) and (res_form_type != form_type):
-                    continue
-                # make sure to only get filings after date and before date
-                # assuming that all entries are ordered descending by time
-                if (after_date != "") and (res["_source"]["file_date"] < after_date):
-                    break
-                if (before_date != "") and (res["_source"]["file_date"] > before_date):
-                    break
-                gathered_responses.append(res)
+    def _build_search_api_post_body(self, ticker_or_cik: str | list[str], form_type: str | list[str], start_index: int, after_date: str, before_date: str, query: str) -> dict:
+        ciks = [ticker_or_cik] if isinstance(ticker_or_cik, str) else list(ticker_or_cik)
+        post_body = {
+            "dateRange": "custom",
+            "startdt": after_date,
+            "enddt": before_date,
+            "forms": [form_type] if isinstance(form_type, str) else list(form_type),
+            "from": start_index,
+            "q": query}
+        if len(ciks) == 1:
+            post_body["entityName"] = ciks[0]
+        else:
+            # entityName only takes one entity, the ciks filter takes many
+            post_body["ciks"] = ciks
+        return post_body
 
-            query_size = result["query"]["size"]
-            start_index += query_size
-        return gathered_responses[:number_of_filings]
+    def _parse_search_api_result(self, result: dict, ticker_or_cik: str | list[str], form_type: str | list[str], want_amendments: bool, after_date: str, before_date: str, gathered_count: int):
+        '''filter the hits of one page of the search api.
+
+        Returns:
+            (hits, query_size) or (None, None) if there are no more pages
+        '''
+        logger.debug(f"result from POST call: {result}")
+        
+        if "error" in result:
+            try:
+                root_cause = result["error"]["root_cause"]
+                if not root_cause:
+                    raise ValueError
+                else:
+                    raise ValueError(f"error reason: {root_cause[0]['reason']}")  
+            except (KeyError, IndexError) as e:
+                raise e
+        if not result:
+            return None, None
+
+        if result["hits"]["hits"] == []:
+            if gathered_count == 0:
+                logger.info(f"[{ticker_or_cik}:{form_type}] -> No filings found for this combination")
+            return None, None
+        
+        form_types = [form_type] if isinstance(form_type, str) else form_type
+        hits = []
+        for res in result["hits"]["hits"]:
+            # only filter for amendments here
+            res_form_type = res["_source"]["file_type"]
+            is_amendment = res_form_type[-2:] == "/A"
+            if not want_amendments and is_amendment:
+                continue
+            # make sure that no wrong filing type is added
+            if (not is_amendment) and (res_form_type not in form_types):
+                continue
+            # make sure to only get filings after date and before date
+            # assuming that all entries are ordered descending by time
+            if (after_date != "") and (res["_source"]["file_date"] < after_date):
+                break
+            if (before_date != "") and (res["_source"]["file_date"] > before_date):
+                break
+            hits.append(res)
+        return hits, result["query"]["size"]
     
     def _rate_limit(func):
         '''decorate a function to limit call rate in a synchronous program.
+
+        every call (retries included) takes a token from self._rate_limiter,
+        which can be shared between Downloaders, threads and processes.
+        retries on connection errors and RETRY_STATUS_CODES up to self._retries
+        times, waiting for Retry-After or an exponential backoff with jitter.
+        throttled responses (THROTTLE_STATUS_CODES) are reported to the limiter
+        so it can slow down for everyone using it.
         Can be toggled on/off by calling set_ratelimiting(bool)'''
         @wraps(func)
         def wrapper(self, *args, **kwargs):
-            if self._is_ratelimiting is False:
-                return func(self, *args, **kwargs)
-            time.sleep(
-                max(0, ((self._next_try_systime_ms - self._get_systime_ms()
-                ) / 1000) ))
-            result = func(self, *args, **kwargs)
-            self._next_try_systime_ms = self._get_systime_ms(
-            ) + SEC_RATE_LIMIT_DELAY 
-            return result
+            attempt = 0
+            while True:
+                if self._is_ratelimiting is True:
+                    self._rate_limiter.acquire()
+                try:
+                    resp = func(self, *args, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    delay = self._get_retry_delay_for_exception(e, attempt)
+                else:
+                    delay = self._get_retry_delay_for_response(resp, attempt)
+                    if delay is None:
+                        return resp
+                attempt += 1
+                time.sleep(delay)
         return wrapper
+
+    def _get_retry_delay_for_exception(self, e: Exception, attempt: int) -> float:
+        '''get the seconds to wait before retrying after e, raises e if out of retries.'''
+        if attempt >= self._retries:
+            raise e
+        logger.debug(f"retrying after {e}, attempt: {attempt + 1}")
+        return _get_retry_backoff(attempt)
+
+    def _get_retry_delay_for_response(self, resp: requests.Response, attempt: int) -> float | None:
+        '''report resp to the rate limiter and get the seconds to wait before
+        retrying, None if resp should be returned as is.'''
+        retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+        if self._is_ratelimiting is True:
+            if resp.status_code in THROTTLE_STATUS_CODES:
+                self._rate_limiter.throttled(retry_after)
+            else:
+                self._rate_limiter.succeeded()
+        if (resp.status_code not in RETRY_STATUS_CODES) or (attempt >= self._retries):
+            return None
+        delay = _get_retry_backoff(attempt)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        logger.debug(f"retrying {resp.url} after status {resp.status_code} in {delay:.2f}s, attempt: {attempt + 1}")
+        resp.close()
+        return delay
         
+    def _request_cached(self, endpoint: str, method: str, url: str, headers: dict, body: dict = None) -> requests.Response:
+        '''send a GET/POST request through self.cache if there is one.
+
+        Args:
+            endpoint: name of the endpoint, decides the ttl (see ResponseCache)
+            body: json body of a POST request
+        '''
+        send = self._post if method == "POST" else self._get
+        kwargs = {"json": body} if body is not None else {}
+        if self.cache is None:
+            return send(url=url, headers=headers, **kwargs)
+        key, cached, validators = self.cache.lookup(endpoint, method, url, body)
+        if cached is not None:
+            logger.debug(f"answered {method} {url} from the cache")
+            return cached
+        resp = send(url=url, headers={**headers, **validators}, **kwargs)
+        return self.cache.store(key, endpoint, resp)
+
     @_rate_limit
     def _get(self, *args, **kwargs):
         '''wrapped to comply with sec rate limit across calls'''
@@ -1187,16 +2606,11 @@ class Downloader:
         
 
     def _create_session(self, retry: int=10) -> requests.Session:
-        '''create a session used by the Downloader with a retry
-        strategy on all urls. retries on status:
-            500, 502, 503, 504, 403 .'''
-        r = Retry(
-            total=retry,
-            read=retry,
-            connect=retry,
-            backoff_factor = float(0.3),
-            status_forcelist=(500, 502, 503, 504, 403))
-        r.backoff_max = 10
+        '''create a session used by the Downloader.
+
+        the session itself doesnt retry, retries are done in _rate_limit
+        (up to self._retries) so every retry goes through the rate limiter.'''
+        r = Retry(total=0, read=False)
         session = requests.Session()
         adapter = requests.adapters.HTTPAdapter(max_retries=r) 
         session.mount("http://", adapter)
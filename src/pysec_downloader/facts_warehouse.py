@@ -0,0 +1,297 @@
+'''
+columnar copy of the bulk companyfacts (index/facts_warehouse).
+
+every fact of every companyfacts file becomes one row with the columns
+cik, taxonomy, tag, unit, start, end, val, accn, fy, fp, form, filed and
+frame. the rows are partitioned into buckets by cik (bucket=<int(cik) % buckets>),
+inside a bucket they are sorted by taxonomy, tag and cik, so a query for
+one tag across all companies only reads the matching row groups.
+
+build() converts the extracted files in /companyfacts (or companyfacts.zip)
+with a pool of processes. later calls only convert the files that changed
+since (by mtime/size or crc/size of the zip member) and rewrite only the
+buckets they belong to.
+needs pyarrow: pip install pysec-downloader[columnar]
+
+usage:
+
+    dl = Downloader(r"C:\\Users\\Download_Folder", user_agent="john smith js@test.com")
+    dl.get_bulk_companyfacts()
+    warehouse = FactsWarehouse(r"C:\\Users\\Download_Folder")
+    warehouse.build()
+    warehouse.query(tags="AccountsPayableCurrent", frames="CY2023Q4I", as_dataframe=True)
+'''
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from zipfile import ZipFile
+import json
+import logging
+import multiprocessing
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from .json_parsing import load, loads
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = 64
+
+COLUMNS = ["cik", "taxonomy", "tag", "unit", "start", "end", "val", "accn", "fy", "fp", "form", "filed", "frame"]
+
+_MANIFEST_FILE = "_manifest.json"
+_PART_FILE = "part-0.parquet"
+
+
+def _get_schema():
+    return pa.schema([
+        ("cik", pa.string()),
+        ("taxonomy", pa.string()),
+        ("tag", pa.string()),
+        ("unit", pa.string()),
+        ("start", pa.date32()),
+        ("end", pa.date32()),
+        ("val", pa.float64()),
+        ("accn", pa.string()),
+        ("fy", pa.int32()),
+        ("fp", pa.string()),
+        ("form", pa.string()),
+        ("filed", pa.date32()),
+        ("frame", pa.string())])
+
+
+class FactsWarehouse:
+    '''parquet dataset with the facts of all companyfacts files.
+
+    Attributes:
+        path: folder of the dataset
+        buckets: number of buckets the ciks are split into
+    Args:
+        root_path: root path of the Downloader, the companyfacts are read
+                   from root_path/companyfacts or root_path/companyfacts.zip
+        buckets: has to match the number of buckets of an existing dataset
+    Raises:
+        ImportError: if pyarrow isnt installed
+        ValueError: if buckets differs from the existing dataset
+    '''
+    def __init__(self, root_path: str | Path, buckets: int = DEFAULT_BUCKETS):
+        if pa is None:
+            raise ImportError("FactsWarehouse needs pyarrow, install it with: pip install pysec-downloader[columnar]")
+        self.root_path = Path(root_path)
+        self.path = self.root_path / "index" / "facts_warehouse"
+        self.buckets = buckets
+        existing = self._load_manifest().get("buckets")
+        if (existing is not None) and (existing != buckets):
+            raise ValueError(f"the dataset at {self.path} has {existing} buckets, not {buckets}")
+
+    def build(self, workers: int = None, progress: bool = True) -> dict:
+        '''convert the companyfacts files that changed since the last build.
+
+        Args:
+            workers: number of processes, defaults to os.cpu_count()
+            progress: show a progress bar (in buckets)
+        Raises:
+            FileNotFoundError: if there are no bulk companyfacts
+        Returns:
+            dict with keys:
+                files: companyfacts files in the source
+                converted: files converted
+                removed: files no longer in the source whose facts were dropped
+                buckets_updated: buckets rewritten
+                facts: facts in the rewritten buckets
+        '''
+        from tqdm.auto import tqdm
+        source, signatures = self._get_source()
+        manifest = self._load_manifest()
+        old_signatures = manifest.get("files", {})
+        changed = [n for n, sig in signatures.items() if old_signatures.get(n) != sig]
+        removed = [n for n in old_signatures if n not in signatures]
+        by_bucket = {}
+        for name in changed + removed:
+            converting, dropping = by_bucket.setdefault(self._get_bucket(name[3:13]), ([], []))
+            (converting if name in signatures else dropping).append(name)
+        workers = workers if workers else (os.cpu_count() or 1)
+        self.path.mkdir(parents=True, exist_ok=True)
+        stats = {"files": len(signatures), "converted": len(changed), "removed": len(removed), "buckets_updated": len(by_bucket), "facts": 0}
+        tasks = [
+            (str(source), str(self.path / f"bucket={bucket}"), sorted(converting), sorted(n[3:13] for n in converting + dropping))
+            for bucket, (converting, dropping) in sorted(by_bucket.items())]
+        with tqdm(total=len(tasks), unit="buckets", disable=not progress, desc="building facts warehouse") as bar:
+            if workers == 1 or len(tasks) <= 1:
+                for task in tasks:
+                    stats["facts"] += _update_bucket(*task)
+                    bar.update(1)
+            else:
+                # spawn, forking a process with running threads can deadlock
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    futures = [pool.submit(_update_bucket, *task) for task in tasks]
+                    for future in as_completed(futures):
+                        stats["facts"] += future.result()
+                        bar.update(1)
+        self._save_manifest({"buckets": self.buckets, "files": signatures})
+        logger.info(f"built facts warehouse from {source}: {stats}")
+        return stats
+
+    def query(
+        self,
+        tags: str | list[str] = None,
+        taxonomies: str | list[str] = None,
+        ciks: str | list[str] = None,
+        frames: str | list[str] = None,
+        units: str | list[str] = None,
+        forms: str | list[str] = None,
+        fy: int | list[int] = None,
+        columns: list[str] = None,
+        as_dataframe: bool = False):
+        '''get the facts matching all of the given filters, arguments left as None dont filter.
+
+        Args:
+            tags: eg: "AccountsPayableCurrent"
+            taxonomies: eg: "us-gaap", "dei"
+            ciks: ciks with leading 0's, only the buckets of the ciks are read
+            frames: eg: "CY2023Q4I"
+            units: eg: "USD", "shares"
+            forms: form type of the filing the fact was reported in, eg: "10-K"
+            fy: fiscal year of the filing
+            columns: columns to return, defaults to all
+            as_dataframe: return a pandas DataFrame instead of a pyarrow Table
+        Returns:
+            pyarrow.Table or pandas.DataFrame
+        '''
+        columns = columns if columns is not None else COLUMNS
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown columns: {sorted(unknown)}")
+        files = sorted(self.path.glob("bucket=*/" + _PART_FILE)) if self.path.exists() else []
+        if ciks is not None:
+            ciks = self._as_list(ciks)
+            buckets = set(f"bucket={self._get_bucket(cik)}" for cik in ciks)
+            files = [f for f in files if f.parent.name in buckets]
+        if files == []:
+            table = _get_schema().empty_table().select(columns)
+        else:
+            expression = None
+            for column, values in (("tag", tags), ("taxonomy", taxonomies), ("cik", ciks), ("frame", frames), ("unit", units), ("form", forms), ("fy", fy)):
+                if values is not None:
+                    e = pc.field(column).isin(self._as_list(values))
+                    expression = e if expression is None else expression & e
+            dataset = ds.dataset([str(f) for f in files], format="parquet", schema=_get_schema())
+            table = dataset.to_table(columns=columns, filter=expression)
+        return table.to_pandas() if as_dataframe is True else table
+
+    def _get_bucket(self, cik: str) -> int:
+        return int(cik) % self.buckets
+
+    def _get_source(self) -> tuple[Path, dict]:
+        '''get the folder or zip to build from and {name: signature} of its companyfacts files'''
+        folder = self.root_path / "companyfacts"
+        if folder.is_dir():
+            signatures = {}
+            for entry in os.scandir(folder):
+                if _is_companyfacts_file(entry.name):
+                    stat = entry.stat()
+                    signatures[entry.name] = [stat.st_mtime_ns, stat.st_size]
+            if signatures != {}:
+                return folder, signatures
+        zip_path = self.root_path / "companyfacts.zip"
+        if zip_path.is_file():
+            with ZipFile(zip_path, "r") as z:
+                return zip_path, {i.filename: [i.CRC, i.file_size] for i in z.infolist() if _is_companyfacts_file(i.filename)}
+        raise FileNotFoundError(f"there are no bulk companyfacts in {folder} or {zip_path}")
+
+    def _load_manifest(self) -> dict:
+        try:
+            return json.loads((self.path / _MANIFEST_FILE).read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest: dict):
+        tmp_path = self.path / (_MANIFEST_FILE + ".tmp")
+        tmp_path.write_text(json.dumps(manifest))
+        os.replace(tmp_path, self.path / _MANIFEST_FILE)
+
+    @staticmethod
+    def _as_list(value) -> list:
+        return [value] if isinstance(value, (str, int)) else list(value)
+
+
+def _is_companyfacts_file(name: str) -> bool:
+    return name.startswith("CIK") and name.endswith(".json") and len(name) == 18
+
+
+def _flatten_companyfacts(cik: str, content: dict, columns: dict):
+    '''append the facts of a companyfacts file to columns'''
+    for taxonomy, tags in content.get("facts", {}).items():
+        for tag, tag_data in tags.items():
+            for unit, facts in tag_data.get("units", {}).items():
+                for fact in facts:
+                    columns["cik"].append(cik)
+                    columns["taxonomy"].append(taxonomy)
+                    columns["tag"].append(tag)
+                    columns["unit"].append(unit)
+                    for c in COLUMNS[4:]:
+                        columns[c].append(fact.get(c))
+
+
+def _facts_to_table(columns: dict):
+    arrays = []
+    for field in _get_schema():
+        values = columns[field.name]
+        if pa.types.is_date32(field.type):
+            arrays.append(pa.array(values, pa.string()).cast(pa.date32()))
+        elif field.name == "val":
+            arrays.append(pa.array([None if v is None else float(v) for v in values], pa.float64()))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(arrays, schema=_get_schema())
+
+
+def _update_bucket(source: str, bucket_path: str, names: list[str], ciks: list[str]) -> int:
+    '''rewrite a bucket with the facts of ciks replaced by the ones in the files names, runs in a worker process.
+
+    Returns:
+        number of facts in the bucket
+    '''
+    bucket_path = Path(bucket_path)
+    part_path = bucket_path / _PART_FILE
+    tables = []
+    if part_path.is_file():
+        old = pq.read_table(part_path, schema=_get_schema())
+        tables.append(old.filter(pc.invert(pc.is_in(old["cik"], value_set=pa.array(ciks, pa.string())))))
+    columns = {c: [] for c in COLUMNS}
+    zip_file = ZipFile(source, "r") if source.endswith(".zip") else None
+    try:
+        for name in names:
+            try:
+                if zip_file is not None:
+                    content = loads(zip_file.read(name))
+                else:
+                    with open(Path(source) / name, "rb") as f:
+                        content = load(f)
+                file_columns = {c: [] for c in COLUMNS}
+                _flatten_companyfacts(name[3:13], content, file_columns)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                logger.debug(f"couldnt read companyfacts file {name}: {e}")
+                continue
+            for c in COLUMNS:
+                columns[c].extend(file_columns[c])
+    finally:
+        if zip_file is not None:
+            zip_file.close()
+    tables.append(_facts_to_table(columns))
+    table = pa.concat_tables(tables)
+    table = table.take(pc.sort_indices(table, sort_keys=[("taxonomy", "ascending"), ("tag", "ascending"), ("cik", "ascending")]))
+    bucket_path.mkdir(parents=True, exist_ok=True)
+    if table.num_rows == 0:
+        part_path.unlink(missing_ok=True)
+        return 0
+    tmp_path = bucket_path / ("_" + _PART_FILE)
+    pq.write_table(table, tmp_path, row_group_size=64 * 1024)
+    os.replace(tmp_path, part_path)
+    return table.num_rows
@@ -0,0 +1,178 @@
+'''
+json parsing for the large files of the sec (companyfacts, submissions).
+
+loads() uses orjson if it is installed, which is several times faster
+than the json module and returns the same python objects.
+
+the load_* functions parse a file incrementally with ijson if it is
+installed and only build the parts that were asked for, so the memory
+needed stays about the size of the largest selected tag/column instead of
+the whole object tree. without ijson they parse the whole file and drop
+the rest afterwards, the results are the same. a file that isnt valid
+json raises ValueError with either backend.
+
+usage:
+
+    with open(r"C:\\Users\\Download_Folder\\companyfacts\\CIK0000320193.json", "rb") as f:
+        facts = load_companyfacts(f, taxonomies=["us-gaap"], tags=["Revenues"], forms=["10-K"])
+'''
+from typing import BinaryIO
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+CAN_STREAM = ijson is not None
+
+
+def loads(data: bytes | str):
+    '''parse a json document with the fastest available backend'''
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load(f: BinaryIO):
+    '''parse a json file (opened in binary mode) with the fastest available backend'''
+    return loads(f.read())
+
+
+def iter_companyfacts_tags(f: BinaryIO, taxonomies: list[str] = None, tags: list[str] = None, meta: dict = None):
+    '''yield the tags of a companyfacts file one at a time.
+
+    Args:
+        f: companyfacts file opened in binary mode
+        taxonomies: only yield tags of these taxonomies, eg: ["us-gaap"]
+        tags: only yield these tags, eg: ["Revenues"]
+        meta: dict the top level values (cik, entityName) are added to
+    Yields:
+        (taxonomy, tag, tag data) where tag data has the keys label, description and units
+    '''
+    taxonomies = set(taxonomies) if taxonomies is not None else None
+    tags = set(tags) if tags is not None else None
+    if ijson is None:
+        content = load(f)
+        if meta is not None:
+            meta.update({k: v for k, v in content.items() if k != "facts"})
+        for taxonomy, taxonomy_tags in content.get("facts", {}).items():
+            if (taxonomies is not None) and (taxonomy not in taxonomies):
+                continue
+            for tag, tag_data in taxonomy_tags.items():
+                if (tags is None) or (tag in tags):
+                    yield taxonomy, tag, tag_data
+        return
+    events = _parse(f)
+    for prefix, event, value in events:
+        if (meta is not None) and ("." not in prefix) and (event in ("string", "number", "boolean", "null")):
+            meta[prefix] = value
+        elif (event == "map_key") and prefix.startswith("facts.") and (prefix.count(".") == 1):
+            taxonomy = prefix[len("facts."):]
+            wanted = ((taxonomies is None) or (taxonomy in taxonomies)) and ((tags is None) or (value in tags))
+            tag_data = _consume_value(events, build=wanted)
+            if wanted:
+                yield taxonomy, value, tag_data
+
+
+def load_companyfacts(f: BinaryIO, taxonomies: list[str] = None, tags: list[str] = None, forms: list[str] = None) -> dict:
+    '''parse a companyfacts file keeping only the selected facts.
+
+    Args:
+        f: companyfacts file opened in binary mode
+        taxonomies: keep only these taxonomies
+        tags: keep only these tags
+        forms: keep only facts reported in filings of these form types, eg: ["10-K", "10-Q"]
+    Returns:
+        dict like the companyfacts file, without the facts that werent selected
+    '''
+    forms = set(forms) if forms is not None else None
+    content = {}
+    facts = {}
+    for taxonomy, tag, tag_data in iter_companyfacts_tags(f, taxonomies=taxonomies, tags=tags, meta=content):
+        if forms is not None:
+            units = {unit: [v for v in values if v.get("form") in forms] for unit, values in tag_data.get("units", {}).items()}
+            units = {unit: values for unit, values in units.items() if values != []}
+            if units == {}:
+                continue
+            tag_data = {**tag_data, "units": units}
+        facts.setdefault(taxonomy, {})[tag] = tag_data
+    content["facts"] = facts
+    return content
+
+
+def load_submissions(f: BinaryIO, columns: list[str]) -> dict:
+    '''parse a submissions file keeping only some columns of the filings.
+
+    works for the main file (CIK##########.json) and the pages
+    (CIK##########-submissions-001.json). the other values of the main
+    file (name, tickers, ...) are dropped.
+
+    Args:
+        f: submissions file opened in binary mode
+        columns: filing columns to keep, eg: ["accessionNumber", "filingDate", "form"]
+    Returns:
+        main file: {"filings": {"recent": {column: [...]}, "files": [...]}}
+        page: {column: [...]}
+    '''
+    columns = set(columns)
+    if ijson is None:
+        content = load(f)
+        if "filings" not in content:
+            return {k: v for k, v in content.items() if k in columns}
+        filings = {"recent": {k: v for k, v in content["filings"].get("recent", {}).items() if k in columns}}
+        if "files" in content["filings"]:
+            filings["files"] = content["filings"]["files"]
+        return {"filings": filings}
+    content = {}
+    events = _parse(f)
+    for prefix, event, value in events:
+        if event != "map_key":
+            continue
+        if prefix == "":
+            if value == "filings":
+                # read the keys of filings
+                continue
+            target, wanted = content, value in columns
+        elif prefix == "filings":
+            if value == "recent":
+                continue
+            target, wanted = content.setdefault("filings", {}), value == "files"
+        else:
+            target, wanted = content.setdefault("filings", {}).setdefault("recent", {}), value in columns
+        built = _consume_value(events, build=wanted)
+        if wanted:
+            target[value] = built
+    if "filings" in content:
+        content["filings"].setdefault("recent", {})
+    return content
+
+
+def _parse(f: BinaryIO):
+    '''ijson.parse with the errors raised as ValueError like json.loads'''
+    try:
+        yield from ijson.parse(f, use_float=True)
+    except ijson.JSONError as e:
+        raise ValueError(f"invalid json: {e}") from e
+
+
+def _consume_value(events, build: bool):
+    '''read the events of the next value, returns it if build is True'''
+    builder = ijson.ObjectBuilder() if build else None
+    depth = 0
+    for _, event, value in events:
+        if builder is not None:
+            builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+        if depth == 0:
+            break
+    return builder.value if builder is not None else None
@@ -0,0 +1,88 @@
+'''
+download plans built from the local bulk submissions.
+
+a DownloadPlan lists every filing that would be downloaded (with its
+urls and save path) together with the number of requests and the time
+that will take at the rate limit, without having made a single request.
+plans can be saved and executed later, so a run can be repeated exactly.
+
+usage:
+
+    dl = Downloader(r"C:\\Users\\Download_Folder", user_agent="john smith js@test.com")
+    dl.get_bulk_submissions(extract=False)
+    plan = dl.plan_filings(["AAPL", "MSFT"], ["10-K", "8-K"], after_date="2022-01-01")
+    plan.summary()
+    plan.save("nightly_plan.json")
+    dl.execute_plan(DownloadPlan.load("nightly_plan.json"))
+'''
+from pathlib import Path
+import json
+
+
+class DownloadPlan:
+    '''filings to download, see Downloader.plan_filings.
+
+    Args:
+        items: base_meta dicts as created by Downloader._guess_full_url
+               with an additional "save_path"
+        rate: requests per second the estimate is based on
+    '''
+    def __init__(self, items: list[dict], rate: float):
+        self.items = items
+        self.rate = rate
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    @property
+    def expected_requests(self) -> int:
+        '''requests needed if every prefered file exists'''
+        return sum(1 for m in self.items if m["file_url"] is not None)
+
+    @property
+    def max_requests(self) -> int:
+        '''requests needed if every prefered file is missing and the fallback is used'''
+        return self.expected_requests + sum(
+            1 for m in self.items
+            if (m["file_url"] is not None) and (not m["skip"]) and (m["fallback_url"] != m["file_url"]))
+
+    @property
+    def estimated_seconds(self) -> float:
+        '''time the expected requests take at rate'''
+        return self.expected_requests / self.rate
+
+    def summary(self) -> dict:
+        '''get the size of the plan.
+
+        Returns:
+            dict with keys:
+                filings: filings in the plan
+                ciks: number of ciks the filings belong to
+                form_types: {form_type: number of filings}
+                expected_requests, max_requests, estimated_seconds: see the properties
+                rate: requests per second the estimate is based on
+        '''
+        form_types = {}
+        for m in self.items:
+            form_types[m["form_type"]] = form_types.get(m["form_type"], 0) + 1
+        return {
+            "filings": len(self.items),
+            "ciks": len(set(m["cik"] for m in self.items)),
+            "form_types": form_types,
+            "expected_requests": self.expected_requests,
+            "max_requests": self.max_requests,
+            "estimated_seconds": self.estimated_seconds,
+            "rate": self.rate}
+
+    def save(self, path: str | Path):
+        '''write the plan to a json file'''
+        Path(path).write_text(json.dumps({"rate": self.rate, "items": self.items}))
+
+    @classmethod
+    def load(cls, path: str | Path):
+        '''read a plan written by save()'''
+        content = json.loads(Path(path).read_text())
+        return cls(content["items"], content["rate"])
@@ -0,0 +1,347 @@
+'''
+rate limiters used to keep all requests to the sec below their rate limit.
+
+every Downloader draws from the same limiter unless told otherwise, by
+default that is a token bucket whose state lives in a lock file in the
+temp directory, so threads and processes on one host share one budget.
+
+usage:
+
+    # share one budget between all workers on this host (default)
+    dl = Downloader(r"C:\\Users\\Download_Folder", user_agent="john smith js@test.com")
+
+    # or use a custom limiter, eg: a lock file on a shared volume
+    limiter = SharedFileRateLimiter("/mnt/shared/sec_rate_limit", rate=8, burst=2)
+    dl = Downloader(r"C:\\Users\\Download_Folder", user_agent="john smith js@test.com", rate_limiter=limiter)
+'''
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from collections import deque
+from pathlib import Path
+import asyncio
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from ._constants import SEC_RATE_LIMIT_TARGET
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = SEC_RATE_LIMIT_TARGET # requests per second
+DEFAULT_BURST = 1
+DEFAULT_LOCK_FILE = Path(tempfile.gettempdir()) / "pysec_downloader_rate_limit"
+
+
+class RateLimiter(ABC):
+    '''base of all rate limiters.
+
+    subclasses need to implement reserve() and effective_rate, the
+    feedback hooks throttled() and succeeded() are optional.
+    '''
+
+    @abstractmethod
+    def reserve(self) -> float:
+        '''take one token from the budget.
+
+        Returns:
+            seconds to wait before the request may be sent
+        '''
+
+    def acquire(self):
+        '''block until a request may be sent.'''
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        '''wait until a request may be sent without blocking the event loop.
+
+        reserve() runs in a thread, it can block on a lock shared with other processes.
+        '''
+        delay = await asyncio.to_thread(self.reserve)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @property
+    @abstractmethod
+    def effective_rate(self) -> float:
+        '''requests per second currently handed out.'''
+
+    def throttled(self, retry_after: float = None):
+        '''report that the sec throttled a request (403/429).
+
+        Args:
+            retry_after: seconds the sec asked us to wait, if it did
+        '''
+        pass
+
+    def succeeded(self):
+        '''report that a request wasnt throttled.'''
+        pass
+
+    def stats(self) -> dict:
+        '''get metrics of this limiter, see TokenBucketRateLimiter.stats'''
+        return {"effective_rate": self.effective_rate}
+
+
+class TokenBucketRateLimiter(RateLimiter):
+    '''token bucket shared by all threads of this process.
+
+    tokens are handed out in order of arrival, a caller that finds the
+    bucket empty still takes its token (the bucket goes negative) and is
+    told how long to wait, so waiting callers are served first come first served.
+
+    requests are scheduled by their start time, so slow responses dont eat
+    into the budget: at rate=10 a request starts every 100ms no matter how
+    long the previous one took.
+
+    after throttle_threshold throttled requests in a row the rate is halved
+    (down to min_rate_factor * rate) and every request that passes afterwards
+    raises it by recovery_step * rate again, until it is back at rate.
+    a Retry-After pauses the whole bucket.
+
+    Args:
+        rate: target rate, tokens added per second
+        burst: maximum amount of tokens the bucket can hold
+        throttle_threshold: throttled requests in a row before slowing down
+        min_rate_factor: lowest fraction of rate we slow down to
+        recovery_step: fraction of rate regained per successful request
+        stats_window: seconds over which the achieved rate is measured
+    '''
+    def __init__(
+            self,
+            rate: float = DEFAULT_RATE,
+            burst: int = DEFAULT_BURST,
+            throttle_threshold: int = 2,
+            min_rate_factor: float = 0.1,
+            recovery_step: float = 0.02,
+            stats_window: float = 60):
+        if rate <= 0:
+            raise ValueError(f"rate has to be larger than 0, got: {rate}")
+        if burst < 1:
+            raise ValueError(f"burst has to be at least 1, got: {burst}")
+        self.rate = rate
+        self.burst = burst
+        self.throttle_threshold = throttle_threshold
+        self.min_rate_factor = min_rate_factor
+        self.recovery_step = recovery_step
+        self.stats_window = stats_window
+        self._lock = threading.Lock()
+        self._state = self._initial_state(time.time())
+        self._stats_lock = threading.Lock()
+        self._request_starts = deque()
+        self._requests = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._throttle_events = 0
+        self._rate_reductions = 0
+
+    def reserve(self) -> float:
+        delay = self._transaction(self._take_token)
+        with self._stats_lock:
+            self._requests += 1
+            self._wait_total += delay
+            self._wait_max = max(self._wait_max, delay)
+            self._request_starts.append(time.time() + delay)
+        return delay
+
+    def stats(self) -> dict:
+        '''get metrics of the requests made through this instance.
+
+        for a SharedFileRateLimiter these only cover this process, the
+        effective rate is the one shared by everyone.
+
+        Returns:
+            dict with keys:
+                target_rate: the configured rate in requests/s
+                effective_rate: the current rate after throttling in requests/s
+                achieved_rate: requests started per second over the last stats_window seconds
+                requests: tokens handed out
+                queue_wait_total: seconds spent waiting for tokens
+                queue_wait_mean: mean seconds waited per request
+                queue_wait_max: longest wait for a token in seconds
+                throttle_events: throttled responses reported
+                rate_reductions: times the rate was lowered because of throttling
+        '''
+        effective_rate = self.effective_rate
+        now = time.time()
+        with self._stats_lock:
+            while self._request_starts and self._request_starts[0] < now - self.stats_window:
+                self._request_starts.popleft()
+            started = [t for t in self._request_starts if t <= now]
+            if len(started) > 1:
+                achieved_rate = (len(started) - 1) / max(now - started[0], 1e-9)
+            else:
+                achieved_rate = 0.0
+            return {
+                "target_rate": self.rate,
+                "effective_rate": effective_rate,
+                "achieved_rate": achieved_rate,
+                "requests": self._requests,
+                "queue_wait_total": self._wait_total,
+                "queue_wait_mean": self._wait_total / self._requests if self._requests else 0.0,
+                "queue_wait_max": self._wait_max,
+                "throttle_events": self._throttle_events,
+                "rate_reductions": self._rate_reductions}
+
+    @property
+    def effective_rate(self) -> float:
+        return self._transaction(lambda state, now: (state, self.rate * state[2]))
+
+    def throttled(self, retry_after: float = None):
+        def _throttled(state, now):
+            tokens, last, factor, streak = state
+            streak += 1
+            reduced = False
+            if streak >= self.throttle_threshold:
+                factor = max(self.min_rate_factor, factor / 2)
+                streak = 0
+                reduced = True
+                logger.info(f"throttled by the sec, lowering rate to {self.rate * factor:.2f} requests/s")
+            if retry_after:
+                # move the next refill into the future and drain the bucket,
+                # so nobody gets a token before the pause is over
+                last = max(last, now + retry_after)
+                tokens = min(tokens, 0)
+            return [tokens, last, factor, streak], reduced
+        reduced = self._transaction(_throttled)
+        with self._stats_lock:
+            self._throttle_events += 1
+            self._rate_reductions += int(reduced)
+
+    def succeeded(self):
+        def _succeeded(state, now):
+            tokens, last, factor, streak = state
+            return [tokens, last, min(1.0, factor + self.recovery_step), 0], None
+        self._transaction(_succeeded)
+
+    def _initial_state(self, now: float) -> list:
+        '''tokens, time of last refill, rate factor, throttled requests in a row'''
+        return [float(self.burst), now, 1.0, 0]
+
+    def _transaction(self, func):
+        '''apply func(state, now) -> (new_state, result) atomically and return result'''
+        with self._lock:
+            self._state, result = func(self._state, time.time())
+        return result
+
+    def _take_token(self, state: list, now: float):
+        '''refill the bucket for the time passed since last and take one token.
+
+        Returns:
+            new state, delay in seconds
+        '''
+        tokens, last, factor, streak = state
+        rate = self.rate * factor
+        if now > last:
+            tokens = min(float(self.burst), tokens + (now - last) * rate)
+            last = now
+        tokens -= 1
+        delay = (last - now) + max(0, -tokens / rate)
+        return [tokens, last, factor, streak], delay
+
+
+class SharedFileRateLimiter(TokenBucketRateLimiter):
+    '''token bucket whose state is kept in a lock file.
+
+    every process (and thread) using the same path draws from the same bucket
+    and slows down together when the sec throttles one of them. the file only
+    holds the state of the bucket, rate and burst are taken from the instance
+    so all users of a path should use the same values.
+
+    Args:
+        path: location of the lock file, created if it doesnt exist
+        rate: tokens added per second
+        burst: maximum amount of tokens the bucket can hold
+        kwargs: passed to TokenBucketRateLimiter
+    '''
+    _STATE = struct.Struct("<dddd")
+
+    def __init__(self, path: str | Path = DEFAULT_LOCK_FILE, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, **kwargs):
+        super().__init__(rate=rate, burst=burst, **kwargs)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # make sure we can open the file, so errors surface on creation
+        with _locked_file(self.path):
+            pass
+
+    def _transaction(self, func):
+        with self._lock:
+            with _locked_file(self.path) as fd:
+                now = time.time()
+                state, result = func(self._read_state(fd, now), now)
+                self._write_state(fd, state)
+        return result
+
+    def _read_state(self, fd: int, now: float) -> list:
+        os.lseek(fd, 0, os.SEEK_SET)
+        raw = os.read(fd, self._STATE.size)
+        if len(raw) != self._STATE.size:
+            return self._initial_state(now)
+        tokens, last, factor, streak = self._STATE.unpack(raw)
+        return [tokens, last, factor, int(streak)]
+
+    def _write_state(self, fd: int, state: list):
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, self._STATE.pack(*state))
+
+
+@contextmanager
+def _locked_file(path: Path):
+    '''open path and hold an exclusive lock on it. yields the file descriptor.'''
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        if os.name == "nt":
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield fd
+        finally:
+            if os.name == "nt":
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+_default_rate_limiter = None
+_default_rate_limiter_lock = threading.Lock()
+
+def get_default_rate_limiter() -> RateLimiter:
+    '''get the limiter used by every Downloader that wasnt given one.
+
+    creates a SharedFileRateLimiter on first use, falls back to a
+    TokenBucketRateLimiter (only shared within this process) if the
+    lock file cant be created.
+    '''
+    global _default_rate_limiter
+    with _default_rate_limiter_lock:
+        if _default_rate_limiter is None:
+            try:
+                _default_rate_limiter = SharedFileRateLimiter()
+            except OSError as e:
+                logger.warning(
+                    (f"couldnt create shared rate limit file at {DEFAULT_LOCK_FILE}: {e}. "
+                     f"falling back to a rate limiter only shared within this process."))
+                _default_rate_limiter = TokenBucketRateLimiter()
+        return _default_rate_limiter
+
+def set_default_rate_limiter(rate_limiter: RateLimiter):
+    '''replace the limiter used by Downloaders created after this call.'''
+    global _default_rate_limiter
+    if not isinstance(rate_limiter, RateLimiter):
+        raise ValueError(f"rate_limiter is expected to be of type RateLimiter, got type: {type(rate_limiter)}")
+    with _default_rate_limiter_lock:
+        _default_rate_limiter = rate_limiter
@@ -0,0 +1,266 @@
+'''
+IndexHandler that keeps the index in one sqlite database instead of a
+csv and a json file per cik.
+
+the database (index/index.sqlite) runs in WAL mode, so several download
+workers (threads or processes) can write to it while others query it.
+every thread uses its own connection.
+
+usage:
+
+    index_handler = SQLiteIndexHandler(r"C:\\Users\\Download_Folder")
+    # move an existing csv/json index into the database once
+    index_handler.migrate_from_files()
+    dl = Downloader(r"C:\\Users\\Download_Folder", user_agent="john smith js@test.com", index_handler=index_handler)
+'''
+from os import path
+from pathlib import Path
+from csv import reader
+import logging
+import sqlite3
+import threading
+
+import pandas as pd
+
+from .downloader import IndexHandler, _ensure_no_dash_accn
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ["form_type", "file_number", "file_path", "filing_date", "accession_number"]
+
+
+class SQLiteIndexHandler(IndexHandler):
+    '''create, add to and query the index for files downloaded with Downloader.
+
+    has the same query methods as IndexHandler, the rows are kept in the
+    table "filings" with the columns cik, form_type, accession_number,
+    file_number, file_path (relative to root_path/filings) and filing_date.
+    a filing without file number is stored with file_number '' (sqlite
+    treats NULLs as distinct, so they would escape the UNIQUE constraint).
+
+    Attributes:
+        root_path: root path of the files.
+        db_path: location of the database
+    Args:
+        db_path: defaults to root_path/index/index.sqlite
+        columnar_index: ColumnarIndex every new entry is also added to
+    '''
+    def __init__(self, root_path, db_path: str | Path = None, columnar_index=None):
+        super().__init__(root_path, columnar_index=columnar_index)
+        self.db_path = Path(db_path) if db_path else self.root_path / "index" / "index.sqlite"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._get_connection()
+        with conn:
+            conn.execute(
+                ("CREATE TABLE IF NOT EXISTS filings ("
+                 "cik TEXT NOT NULL, form_type TEXT, accession_number TEXT NOT NULL, "
+                 "file_number TEXT, file_path TEXT NOT NULL, filing_date TEXT, "
+                 "UNIQUE (cik, file_number, file_path))"))
+            conn.execute("CREATE INDEX IF NOT EXISTS filings_cik_form_type ON filings (cik, form_type)")
+            conn.execute("CREATE INDEX IF NOT EXISTS filings_cik_file_number ON filings (cik, file_number)")
+            conn.execute("CREATE INDEX IF NOT EXISTS filings_accession_number ON filings (accession_number)")
+            conn.execute("CREATE INDEX IF NOT EXISTS filings_filing_date ON filings (filing_date)")
+            if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                # older databases stored missing file numbers as NULL, the NULL rows left after
+                # the update are duplicates of a row that has ''
+                conn.execute("UPDATE OR IGNORE filings SET file_number = '' WHERE file_number IS NULL")
+                conn.execute("DELETE FROM filings WHERE file_number IS NULL")
+                conn.execute("PRAGMA user_version = 1")
+
+    def get_local_filings_by_form_type(self, cik: str, form_type: str):
+        '''gets all the index entries of form_type and cik.
+
+        Returns:
+            list of dicts with keys: form_type, file_number, file_path, filing_date, accession_number
+        '''
+        rows = self._get_connection().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM filings WHERE cik = ? AND form_type = ? ORDER BY rowid",
+            (cik, form_type)).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def get_local_filings_by_cik(self, cik: str):
+        '''gets all the index entries of this cik
+
+        Returns:
+            list of dicts with keys: form_type, file_number, file_path, filing_date, accession_number
+        '''
+        rows = self._get_connection().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM filings WHERE cik = ? ORDER BY rowid", (cik,)).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def get_related_filings(self, cik: str, file_number: str):
+        '''check the index for other filings with file_number
+
+        Args:
+            cik: cik with leading 0's
+            file_number: the file number
+        Raises:
+            KeyError: if there are no filings with file_number
+        Returns:
+            a list of lists where each of those lists has the fields:
+                form_type, relative_file_path, filing_date
+        '''
+        rows = self._get_connection().execute(
+            "SELECT form_type, file_path, filing_date FROM filings WHERE cik = ? AND file_number = ? ORDER BY rowid",
+            (cik, file_number)).fetchall()
+        if rows == []:
+            raise KeyError(file_number)
+        return [list(row) for row in rows]
+
+    def has_filing(self, cik: str, accession_number: str, check_file: bool = True) -> bool:
+        '''check if a filing is in the index of cik.
+
+        Args:
+            cik: cik with leading 0's
+            accession_number: with or without dashes
+            check_file: also check if the indexed file exists
+        '''
+        row = self._get_connection().execute(
+            "SELECT file_path FROM filings WHERE accession_number = ? AND cik = ? LIMIT 1",
+            (_ensure_no_dash_accn(accession_number), cik)).fetchone()
+        if row is None:
+            return False
+        if check_file is True:
+            return (self.root_path / "filings" / Path(row[0])).is_file()
+        return True
+
+    def check_index(self, dry_run: bool = False, incremental: bool = False, workers: int = 8) -> dict:
+        '''check the index and remove entries whose files dont exist locally.
+
+        duplicates cant be added to the database, so unlike IndexHandler
+        there are none to remove. see IndexHandler.check_index for the
+        arguments, in incremental mode only the folders are compared to the
+        last check.
+
+        Returns:
+            dict with the keys of IndexHandler.check_index, num_index_removed is always 0
+        '''
+        conn = self._get_connection()
+        paths_by_cik = {}
+        for cik, file_path in conn.execute("SELECT DISTINCT cik, file_path FROM filings").fetchall():
+            paths_by_cik.setdefault(cik, []).append(file_path)
+        state = self._load_check_index_state() if incremental is True else {}
+        to_check = [cik for cik in sorted(paths_by_cik) if state.get(cik) != self._get_check_index_signature(cik)]
+        existing_files = self._scan_filings(to_check, workers)
+        missing = {}
+        for cik in to_check:
+            cik_missing = [p for p in paths_by_cik[cik] if p.replace("\\", "/") not in existing_files[cik]]
+            if cik_missing != []:
+                missing[cik] = sorted(cik_missing)
+        pairs = [(cik, p) for cik, paths in missing.items() for p in paths]
+        if dry_run is False:
+            with conn:
+                before = conn.total_changes
+                conn.executemany("DELETE FROM filings WHERE cik = ? AND file_path = ?", pairs)
+                removed = conn.total_changes - before
+            new_state = {cik: state[cik] for cik in paths_by_cik if cik in state}
+            for cik in to_check:
+                new_state[cik] = self._get_check_index_signature(cik)
+            self._save_check_index_state(new_state)
+        else:
+            removed = sum(
+                conn.execute("SELECT COUNT(*) FROM filings WHERE cik = ? AND file_path = ?", pair).fetchone()[0]
+                for pair in pairs)
+        logger.info(f"completed check of index{' (dry run)' if dry_run else ''}: {removed} entries removed")
+        return {
+            "checked_ciks": len(to_check),
+            "skipped_ciks": len(paths_by_cik) - len(to_check),
+            "base_index_removed": removed,
+            "num_index_removed": 0,
+            "missing": missing}
+
+    def migrate_from_files(self, remove: bool = False) -> int:
+        '''copy the csv base indexes (index/base_index/*.csv) into the database.
+
+        the file number index (and its journal) holds the same rows as the
+        base index, so only the base index is read. can be called more than once, rows already
+        in the database are ignored.
+
+        Args:
+            remove: delete the csv and json index files afterwards
+        Returns:
+            number of rows added to the database
+        '''
+        conn = self._get_connection()
+        added = 0
+        for base_index in sorted(self._base_index_path.glob("*.csv")):
+            cik = base_index.stem
+            rows = []
+            with open(base_index, "r", newline="") as f:
+                csv_rows = reader(f)
+                next(csv_rows, None)
+                for row in csv_rows:
+                    try:
+                        form_type, file_number, file_path, filing_date = row
+                        accn = self._get_accession_number_from_relative_path(file_path)
+                    except (ValueError, TypeError):
+                        logger.debug(f"couldnt migrate row of {base_index}: {row}")
+                        continue
+                    rows.append((cik, form_type, accn, file_number or "", file_path, filing_date))
+            with conn:
+                before = conn.total_changes
+                conn.executemany("INSERT OR IGNORE INTO filings VALUES (?, ?, ?, ?, ?, ?)", rows)
+                added += conn.total_changes - before
+            if remove is True:
+                base_index.unlink()
+                self._get_file_num_index_path(cik).unlink(missing_ok=True)
+                self._get_file_num_journal_path(cik).unlink(missing_ok=True)
+        logger.info(f"migrated {added} index entries into {self.db_path}")
+        return added
+
+    def close(self):
+        '''close the connection of this thread'''
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _get_base_index_as_dataframe(self, cik: str):
+        '''get the index of cik as a dataframe with absolute file paths and the accession number added'''
+        return self._set_index_dtypes(pd.DataFrame(self.get_local_filings_by_cik(cik), columns=_COLUMNS))
+
+    def _create_indexes(self, cik: str, form_type: str, accn: str, file_name: str, file_num: str, filing_date: str):
+        '''add a filing to the index. accession number is included in the file_path'''
+        self._create_indexes_bulk(cik, [[form_type, accn, file_name, file_num, filing_date]])
+
+    def _create_indexes_bulk(self, cik: str, items: list[list]):
+        '''add all the entries in items to the index in one transaction
+
+        Args:
+            cik:  a central index key (10 character form/zfilled) eg: 0000234323
+            items: list of entries like so: [[form_type, accn, file_name, file_num, filing_date]] '''
+        inserted = []
+        conn = self._get_connection()
+        with conn:
+            for item in items:
+                form_type, accn, file_name, file_num, filing_date = item
+                rel_file_path = path.join(cik, form_type, accn, file_name)
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO filings VALUES (?, ?, ?, ?, ?, ?)",
+                    (cik, form_type, _ensure_no_dash_accn(accn), file_num or "", rel_file_path, filing_date))
+                # rows that already existed are ignored, only pass on the new ones
+                if cursor.rowcount == 1:
+                    inserted.append(item)
+        if inserted != []:
+            self._add_to_columnar_index(cik, inserted)
+
+    def _get_indexed_ciks(self) -> list[str]:
+        return [row[0] for row in self._get_connection().execute("SELECT DISTINCT cik FROM filings ORDER BY cik")]
+
+    def _get_connection(self) -> sqlite3.Connection:
+        '''get the connection of this thread, connections cant be shared between threads'''
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _row_to_record(self, row: tuple) -> dict:
+        record = dict(zip(_COLUMNS, row))
+        record["file_path"] = self._relative_to_absolute_filing_path(record["file_path"])
+        # like IndexHandler, a filing without file number has None
+        record["file_number"] = record["file_number"] or None
+        return record
@@ -0,0 +1,208 @@
+'''
+columnar copy of the bulk submissions (index/submissions_store/*.parquet).
+
+the bulk submissions are one json file per cik, checking a watchlist for
+new filings means parsing thousands of them. the store is built once from
+the extracted files in /submissions (or from submissions.zip) by a pool of
+processes and holds one row per filing with the columns cik, form,
+accessionNumber, primaryDocument, filingDate and fileNumber, so that
+"filings of forms X after date D for the ciks S" is one filtered scan.
+
+the store has to be rebuilt after the bulk submissions were downloaded
+again, until then it isnt used. needs pyarrow: pip install pysec-downloader[columnar]
+
+usage:
+
+    dl = Downloader(r"C:\\Users\\Download_Folder", user_agent="john smith js@test.com")
+    dl.get_bulk_submissions()
+    dl.index_handler.submissions_store.build()
+    dl.index_handler.get_newer_filings_meta_batch(["0000320193", "0000789019"], "2023-01-01", set(["8-K"]))
+'''
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from zipfile import ZipFile
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from .json_parsing import load, loads
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["cik", "form", "accessionNumber", "primaryDocument", "filingDate", "fileNumber"]
+
+_META_FILE = "_meta.json"
+
+
+class SubmissionsStore:
+    '''parquet files with the filings of all submission files.
+
+    Attributes:
+        path: folder of the store
+    Args:
+        root_path: root path of the Downloader, the submissions are read
+                   from root_path/submissions or root_path/submissions.zip
+    '''
+    def __init__(self, root_path: str | Path):
+        self.root_path = Path(root_path)
+        self.path = self.root_path / "index" / "submissions_store"
+
+    def is_available(self) -> bool:
+        '''check if pyarrow is installed and the store is built from the current submissions'''
+        if (pa is None) or (not (self.path / _META_FILE).is_file()):
+            return False
+        meta = json.loads((self.path / _META_FILE).read_text())
+        return meta["source"] == self._get_source_signature()
+
+    def invalidate(self):
+        '''mark the store as outdated, until the next build() it isnt used'''
+        (self.path / _META_FILE).unlink(missing_ok=True)
+
+    def build(self, workers: int = None, progress: bool = True) -> dict:
+        '''convert the bulk submissions into the store, replaces an existing store.
+
+        reads the extracted files in /submissions if there are any, otherwise
+        the members of submissions.zip. the files of "filings.files"
+        (CIK##########-submissions-###.json) are included.
+
+        Args:
+            workers: number of processes, defaults to os.cpu_count()
+            progress: show a progress bar (in files)
+        Raises:
+            ImportError: if pyarrow isnt installed
+            FileNotFoundError: if there are no bulk submissions
+        Returns:
+            dict with keys: files, filings
+        '''
+        if pa is None:
+            raise ImportError("the submissions store needs pyarrow, install it with: pip install pysec-downloader[columnar]")
+        from tqdm.auto import tqdm
+        source, names = self._get_source()
+        workers = workers if workers else (os.cpu_count() or 1)
+        chunks = [sorted(names[i::workers * 4]) for i in range(min(workers * 4, len(names)))]
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp_path.mkdir(parents=True)
+        stats = {"files": len(names), "filings": 0}
+        with tqdm(total=len(names), unit="files", disable=not progress, desc="building submissions store") as bar:
+            if workers == 1 or len(chunks) <= 1:
+                for idx, chunk in enumerate(chunks):
+                    stats["filings"] += _convert_submissions(str(source), chunk, str(tmp_path / f"part-{idx}.parquet"))
+                    bar.update(len(chunk))
+            else:
+                # spawn, forking a process with running threads can deadlock
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    futures = {
+                        pool.submit(_convert_submissions, str(source), chunk, str(tmp_path / f"part-{idx}.parquet")): len(chunk)
+                        for idx, chunk in enumerate(chunks)}
+                    for future in as_completed(futures):
+                        stats["filings"] += future.result()
+                        bar.update(futures[future])
+        (tmp_path / _META_FILE).write_text(json.dumps({"source": self._get_source_signature(), "stats": stats}))
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        os.replace(tmp_path, self.path)
+        logger.info(f"built submissions store from {source}: {stats}")
+        return stats
+
+    def query(self, ciks: list[str] = None, form_types: list[str] = None, after: str = None):
+        '''get the filings matching all given filters, arguments left as None dont filter.
+
+        Args:
+            ciks: ciks with leading 0's
+            form_types: form types, eg: ["S-3", "S-1"]
+            after: only filings filed on or after this date, format yyyy-mm-dd
+        Returns:
+            pyarrow.Table with the columns of COLUMNS
+        '''
+        expressions = []
+        if ciks is not None:
+            expressions.append(pc.field("cik").isin(list(ciks)))
+        if form_types is not None:
+            expressions.append(pc.field("form").isin(list(form_types)))
+        if after is not None:
+            expressions.append(pc.field("filingDate") >= after)
+        expression = None
+        for e in expressions:
+            expression = e if expression is None else expression & e
+        dataset = ds.dataset(self.path, format="parquet", schema=_get_schema())
+        return dataset.to_table(columns=COLUMNS, filter=expression)
+
+    def _get_source(self) -> tuple[Path, list[str]]:
+        '''get the folder or zip to build from and the names of the submission files in it'''
+        folder = self.root_path / "submissions"
+        if folder.is_dir():
+            names = [e.name for e in os.scandir(folder) if _is_submissions_file(e.name)]
+            if names != []:
+                return folder, names
+        zip_path = self.root_path / "submissions.zip"
+        if zip_path.is_file():
+            with ZipFile(zip_path, "r") as z:
+                return zip_path, [n for n in z.namelist() if _is_submissions_file(n)]
+        raise FileNotFoundError(f"there are no bulk submissions in {folder} or {zip_path}")
+
+    def _get_source_signature(self) -> list:
+        '''mtime and size of /submissions and submissions.zip, changes if they are replaced'''
+        signature = []
+        for p in (self.root_path / "submissions", self.root_path / "submissions.zip"):
+            try:
+                stat = p.stat()
+                signature.append([p.name, stat.st_mtime_ns, stat.st_size if p.is_file() else 0])
+            except FileNotFoundError:
+                signature.append([p.name, None, None])
+        return signature
+
+
+def _get_schema():
+    return pa.schema([(c, pa.string()) for c in COLUMNS])
+
+
+def _is_submissions_file(name: str) -> bool:
+    return name.startswith("CIK") and name.endswith(".json")
+
+
+def _convert_submissions(source: str, names: list[str], out_path: str) -> int:
+    '''write the filings of the submission files names to one parquet file, runs in a worker process.
+
+    Returns:
+        number of filings written
+    '''
+    columns = {c: [] for c in COLUMNS}
+    zip_file = ZipFile(source, "r") if source.endswith(".zip") else None
+    try:
+        for name in names:
+            try:
+                if zip_file is not None:
+                    content = loads(zip_file.read(name))
+                else:
+                    with open(Path(source) / name, "rb") as f:
+                        content = load(f)
+                # paged files (-submissions-001.json) hold the columns at the top level
+                filings = content["filings"]["recent"] if "filings" in content else content
+                count = len(filings["accessionNumber"])
+            except (ValueError, KeyError, TypeError) as e:
+                logger.debug(f"couldnt read submissions file {name}: {e}")
+                continue
+            columns["cik"].extend([name[3:13]] * count)
+            for c in COLUMNS[1:]:
+                values = filings.get(c)
+                columns[c].extend(values if (values is not None) and (len(values) == count) else [None] * count)
+    finally:
+        if zip_file is not None:
+            zip_file.close()
+    table = pa.table(columns, schema=_get_schema())
+    # sorted by cik, so the row group statistics let scans skip other ciks
+    table = table.take(pc.sort_indices(table, sort_keys=[("cik", "ascending"), ("filingDate", "descending")]))
+    pq.write_table(table, out_path)
+    return table.num_rows
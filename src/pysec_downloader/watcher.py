@@ -0,0 +1,197 @@
+'''
+watch a list of ciks for new filings in the bulk submissions.
+
+FilingsWatcher keeps the newest accession number it has seen for every cik
+(its high-water mark) and the signature (mtime/size) of the submissions
+file it read it from. a poll skips every file that didnt change and only
+reports the filings newer than the mark, so the same filing is never
+reported twice and a poll costs one stat() per unchanged cik.
+
+the marks are kept in index/watcher_state.json and only move once the new
+filings were handled (commit() or download_new()).
+
+usage:
+
+    dl = Downloader(r"C:\\Users\\Download_Folder", user_agent="john smith js@test.com")
+    watcher = FilingsWatcher(dl, ["0001718405", "0000320193"], tracked_filings=set(["S-3", "8-K"]), after="2023-01-01")
+    while True:
+        # update the submissions of the watchlist with range requests
+        dl.get_bulk_submissions(ciks=watcher.ciks)
+        watcher.download_new(batch_size=50)
+        time.sleep(600)
+'''
+from pathlib import Path
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+WATCHER_STATE_FILE = "watcher_state.json"
+
+
+class FilingsWatcher:
+    '''report and download the filings of ciks added since the last poll.
+
+    Attributes:
+        ciks: watched ciks with leading 0's
+        tracked_filings: form types reported, set([None]) reports all
+    Args:
+        downloader: Downloader whose index_handler reads the submissions
+        ciks: ciks to watch
+        tracked_filings: set of form types, eg: set(["S-3", "S-1"])
+        after: report filings filed on or after this date (yyyy-mm-dd) for
+               ciks seen for the first time. if None the first poll of a cik
+               only sets its mark and reports nothing.
+        state_path: file the marks are kept in, defaults to root_path/index/watcher_state.json
+    '''
+    def __init__(self, downloader, ciks: list[str], tracked_filings: set = set([None]), after: str = None, state_path: str | Path = None):
+        self.downloader = downloader
+        self.ciks = []
+        self.tracked_filings = tracked_filings
+        self.after = after
+        self.state_path = Path(state_path) if state_path else downloader.root_path / "index" / WATCHER_STATE_FILE
+        self._state = self._load_state() # cik: {"accession_number", "filing_date", "signature"}
+        self._pending = {}
+        self.add(ciks)
+
+    def add(self, ciks: list[str]):
+        '''add ciks to the watchlist'''
+        for cik in ciks:
+            cik = cik.zfill(10)
+            if cik not in self.ciks:
+                self.ciks.append(cik)
+
+    def remove(self, ciks: list[str]):
+        '''remove ciks from the watchlist and forget their marks'''
+        for cik in ciks:
+            cik = cik.zfill(10)
+            if cik in self.ciks:
+                self.ciks.remove(cik)
+            self._state.pop(cik, None)
+            self._pending.pop(cik, None)
+        self._save_state()
+
+    def poll(self) -> dict:
+        '''get the new filings of every cik whose submissions file changed.
+
+        the marks arent moved until commit() is called.
+
+        Returns:
+            dict[key:list] where key is the cik and list is of the form:
+                [form_type, accession_number, main_file_name, file_date, [file_number]]
+            like get_newer_filings_meta, oldest first. ciks without new filings arent included.
+        '''
+        index_handler = self.downloader.index_handler
+        new_filings = {}
+        self._pending = {}
+        unchanged = 0
+        for cik in self.ciks:
+            signature = index_handler._get_submissions_file_signature(f"CIK{cik}.json")
+            mark = self._state.get(cik)
+            if (signature is None) or ((mark is not None) and (mark["signature"] == signature)):
+                unchanged += 1
+                continue
+            filings, newest = self._get_filings_after_mark(cik, mark)
+            self._pending[cik] = {
+                "accession_number": newest["accessionNumber"] if newest else None,
+                "filing_date": newest["filingDate"] if newest else None,
+                "signature": signature}
+            if filings != []:
+                new_filings[cik] = filings
+        logger.info(
+            (f"polled {len(self.ciks)} ciks, {unchanged} unchanged, "
+             f"{sum(len(f) for f in new_filings.values())} new filings of {len(new_filings)} ciks"))
+        return new_filings
+
+    def commit(self, ciks: list[str] = None):
+        '''move the marks of ciks (default: all) to the newest filing of the last poll'''
+        for cik in list(self._pending.keys()) if ciks is None else ciks:
+            pending = self._pending.pop(cik, None)
+            if pending is not None:
+                self._state[cik] = pending
+        self._save_state()
+
+    def download_new(self, batch_size: int = 100, **kwargs) -> dict:
+        '''poll and download the new filings with get_filing_by_accession_number.
+
+        the marks of a cik are committed after the batch with its last
+        filing, ciks with a failed download are polled again next time.
+
+        Args:
+            batch_size: number of filings downloaded between commits
+            kwargs: passed to Downloader.get_filing_by_accession_number
+        Returns:
+            dict with keys: new_filings, downloaded, failed
+        '''
+        new_filings = self.poll()
+        queue = [(cik, meta) for cik, metas in new_filings.items() for meta in metas]
+        remaining = {cik: len(metas) for cik, metas in new_filings.items()}
+        failed_ciks = set()
+        stats = {"new_filings": len(queue), "downloaded": 0, "failed": 0}
+        # ciks that changed without new filings only need their mark moved
+        done = [cik for cik in self._pending if cik not in remaining]
+        for start in range(0, len(queue), batch_size):
+            for cik, meta in queue[start:start + batch_size]:
+                try:
+                    downloaded = self.downloader.get_filing_by_accession_number(cik, *meta, **kwargs)
+                except Exception as e:
+                    logger.info(f"couldnt download {cik}:{meta[1]}: {e}")
+                    downloaded = False
+                if downloaded:
+                    stats["downloaded"] += 1
+                else:
+                    logger.info(f"didnt get {cik}:{meta[1]}")
+                    stats["failed"] += 1
+                    failed_ciks.add(cik)
+                remaining[cik] -= 1
+                if (remaining[cik] == 0) and (cik not in failed_ciks):
+                    done.append(cik)
+            self.downloader.index_handler.flush()
+            self.commit(done)
+            done = []
+        self.commit(done)
+        return stats
+
+    def _get_filings_after_mark(self, cik: str, mark: dict | None) -> tuple[list, dict | None]:
+        '''get the tracked filings newer than mark (oldest first) and the newest filing'''
+        index_handler = self.downloader.index_handler
+        filings = []
+        newest = None
+        for filing in index_handler._iter_submission_filings(cik):
+            if newest is None:
+                newest = filing
+            if mark is None:
+                if (self.after is None) or (filing["filingDate"] < self.after):
+                    break
+            elif mark["accession_number"] is None:
+                # the file had no filings at the last poll, all are new
+                pass
+            elif (filing["accessionNumber"] == mark["accession_number"]) or (filing["filingDate"] < mark["filing_date"]):
+                break
+            if (filing["form"] in self.tracked_filings) or (self.tracked_filings == set([None])):
+                filings.append([
+                    filing["form"],
+                    filing["accessionNumber"].replace("-", ""),
+                    filing["primaryDocument"].split("/")[-1],
+                    filing["filingDate"],
+                    [filing["fileNumber"]]])
+        filings.reverse()
+        if (newest is None) and (mark is not None):
+            # keep the old mark if the file is empty
+            newest = {"accessionNumber": mark["accession_number"], "filingDate": mark["filing_date"]}
+        return filings, newest
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.state_path)
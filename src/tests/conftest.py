@@ -0,0 +1,37 @@
+import pytest
+from src.pysec_downloader.downloader import Downloader
+from src.pysec_downloader.rate_limiter import TokenBucketRateLimiter
+
+USER_AGENT = "test requests mock@this.com"
+
+
+@pytest.fixture
+def make_downloader(tmp_path):
+    '''create Downloaders in tmp_path whose rate limiter doesnt slow the tests down, keyword arguments are passed on'''
+    def make(**kwargs):
+        kwargs.setdefault("root_path", tmp_path)
+        kwargs.setdefault("rate_limiter", TokenBucketRateLimiter(rate=1000))
+        return Downloader(user_agent=USER_AGENT, **kwargs)
+    return make
+
+
+@pytest.fixture
+def dl(make_downloader):
+    return make_downloader()
+
+
+@pytest.fixture
+def search_hit():
+    '''create hits like the ones of the efts search api'''
+    def make(cik: str, accn: str, file_name: str, form: str = "8-K", file_date: str = "2022-01-01", file_nums: list[str] = None):
+        return {
+            "_id": f"{accn}:{file_name}",
+            "_source": {
+                "ciks": [cik],
+                "file_num": file_nums if file_nums is not None else ["001-0001"],
+                "xsl": None,
+                "file_date": file_date,
+                "form": form,
+                "root_form": form,
+                "file_type": form}}
+    return make
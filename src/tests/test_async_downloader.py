@@ -0,0 +1,128 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import threading
+import time
+import pytest
+import requests_mock
+from src.pysec_downloader import downloader
+from src.pysec_downloader.async_downloader import AsyncDownloader
+from src.pysec_downloader.downloader import SEC_SEARCH_API_URL, SEC_API_XBRL_COMPANYFACTS_URL, EDGAR_ARCHIVES_BASE_URL
+
+CIK = "0001234567"
+
+
+@pytest.fixture
+def search_results(search_hit):
+    hits = [search_hit(CIK, f"0001234567-22-00000{i}", f"doc{i}.htm") for i in range(5)]
+    return [
+        {"json": {"hits": {"hits": hits}, "query": {"size": 100}}},
+        {"json": {"hits": {"hits": []}, "query": {"size": 100}}}]
+
+
+@pytest.fixture
+def adl(dl):
+    return AsyncDownloader(downloader=dl)
+
+
+def test_async_get_filings(tmp_path, adl, search_results):
+    with requests_mock.Mocker() as m:
+        m.post(SEC_SEARCH_API_URL, search_results)
+        for i in range(5):
+            m.get(f"{EDGAR_ARCHIVES_BASE_URL}/{CIK}/00012345672200000{i}/doc{i}.htm", content=f"<html><a href='x{i}.htm'>x</a></html>".encode())
+        asyncio.run(adl.get_filings(CIK, "8-K"))
+    saved = sorted(p.name for p in (tmp_path / "filings" / CIK / "8-K").glob("*/*.htm"))
+    assert saved == [f"doc{i}.htm" for i in range(5)]
+    assert len(adl.index_handler.get_local_filings_by_cik(CIK)) == 5
+
+
+def test_async_get_filings_bulk_calls_coroutine_callback(tmp_path, adl, search_results):
+    called = []
+    async def callback(result):
+        called.append(result["meta"]["accession_number"])
+    with requests_mock.Mocker() as m:
+        m.post(SEC_SEARCH_API_URL, search_results)
+        for i in range(5):
+            m.get(f"{EDGAR_ARCHIVES_BASE_URL}/{CIK}/00012345672200000{i}/doc{i}.htm", content=b"<html></html>")
+        asyncio.run(adl.get_filings_bulk(CIK, "8-K", callback=callback))
+    assert len(called) == 5
+    assert len(adl.index_handler.get_local_filings_by_cik(CIK)) == 5
+
+
+def test_downloaded_filings_waiting_to_be_saved_are_bounded(dl, search_results, monkeypatch):
+    adl = AsyncDownloader(downloader=dl, max_in_flight=2)
+    state = {"waiting": 0, "peak": 0}
+    download_filing = adl._download_filing
+    async def download(*args, **kwargs):
+        result = await download_filing(*args, **kwargs)
+        state["waiting"] += 1
+        state["peak"] = max(state["peak"], state["waiting"])
+        return result
+    save_filing = dl._save_filing
+    def slow_save(*args, **kwargs):
+        time.sleep(0.05)
+        save_filing(*args, **kwargs)
+        state["waiting"] -= 1
+    monkeypatch.setattr(adl, "_download_filing", download)
+    monkeypatch.setattr(dl, "_save_filing", slow_save)
+    pages = []
+    iter_search_api_pages = dl._iter_search_api_pages
+    monkeypatch.setattr(dl, "_iter_search_api_pages", lambda *args: pages.append(args) or iter_search_api_pages(*args))
+    with requests_mock.Mocker() as m:
+        m.post(SEC_SEARCH_API_URL, search_results)
+        m.get(requests_mock.ANY, content=b"<html></html>")
+        asyncio.run(adl.get_filings(CIK, "8-K", resolve_urls=False))
+    # the search pages are requested by the iterator of the Downloader
+    assert len(pages) == 1
+    assert state["peak"] <= 2
+    assert len(adl.index_handler.get_local_filings_by_cik(CIK)) == 5
+
+
+def test_async_get_xbrl_companyfacts(adl):
+    with requests_mock.Mocker() as m:
+        m.get(f"{SEC_API_XBRL_COMPANYFACTS_URL}/CIK{CIK}.json", json={"cik": 1234567, "facts": {}})
+        assert asyncio.run(adl.get_xbrl_companyfacts(CIK)) == {"cik": 1234567, "facts": {}}
+
+
+@pytest.fixture
+def slow_server():
+    '''local http server that answers after 0.2s and records the peak of concurrent requests'''
+    state = {"in_flight": 0, "peak": 0, "lock": threading.Lock()}
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with state["lock"]:
+                state["in_flight"] += 1
+                state["peak"] = max(state["peak"], state["in_flight"])
+            time.sleep(0.2)
+            with state["lock"]:
+                state["in_flight"] -= 1
+            self.send_response(200)
+            self.send_header("Content-Length", "13")
+            self.end_headers()
+            self.wfile.write(b"<html></html>")
+        def log_message(self, *args):
+            pass
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", state
+    server.shutdown()
+    server.server_close()
+
+
+def test_requests_overlap_up_to_max_in_flight(dl, search_hit, slow_server, monkeypatch):
+    url, state = slow_server
+    monkeypatch.setattr(downloader, "EDGAR_ARCHIVES_BASE_URL", url)
+    adl = AsyncDownloader(downloader=dl, max_in_flight=3)
+    hits = [search_hit(CIK, f"0001234567-22-00000{i}", f"doc{i}.htm") for i in range(6)]
+    with requests_mock.Mocker(real_http=True) as m:
+        m.post(SEC_SEARCH_API_URL, [
+            {"json": {"hits": {"hits": hits}, "query": {"size": 100}}},
+            {"json": {"hits": {"hits": []}, "query": {"size": 100}}}])
+        started = time.monotonic()
+        asyncio.run(adl.get_filings(CIK, "8-K", resolve_urls=False))
+        elapsed = time.monotonic() - started
+    assert len(adl.index_handler.get_local_filings_by_cik(CIK)) == 6
+    assert state["peak"] == 3
+    assert elapsed < 6 * 0.2
+    # the session of the wrapped Downloader keeps its own connection pool
+    assert adl._session.get_adapter("https://") is not adl.downloader._session.get_adapter("https://")
@@ -0,0 +1,225 @@
+import pytest
+import random
+import re
+import requests_mock
+import zipfile
+from src.pysec_downloader.downloader import SEC_BULK_SUBMISSIONS, SEC_API_SUBMISSIONS_URL
+from src.pysec_downloader.bulk import HttpRangeFile, group_members_by_span, is_cik_member
+
+
+@pytest.fixture
+def bulk_zip(tmp_path):
+    path = tmp_path / "submissions.zip"
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        for cik in range(1, 40):
+            z.writestr(f"CIK{str(cik).zfill(10)}.json", '{"cik": "%s", "filler": "%s"}' % (cik, "x" * 5000 * cik))
+        z.writestr("CIK0000000002-submissions-001.json", '{"page": 1}')
+    return path
+
+
+def serve_ranges(content: bytes):
+    '''requests_mock callback answering range requests on content'''
+    def respond(request, context):
+        match = re.match(r"bytes=(\d*)-(\d*)", request.headers["Range"])
+        start, end = match.groups()
+        if start == "":
+            start, end = max(0, len(content) - int(end)), len(content) - 1
+        else:
+            start, end = int(start), min(int(end) if end else len(content) - 1, len(content) - 1)
+        context.status_code = 206
+        context.headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+        return content[start:end + 1]
+    return respond
+
+
+def test_is_cik_member():
+    assert is_cik_member("CIK0000000002.json", {"0000000002"})
+    assert is_cik_member("CIK0000000002-submissions-001.json", {"0000000002"})
+    assert not is_cik_member("CIK0000000021.json", {"0000000002"})
+
+
+def test_group_members_by_span(bulk_zip):
+    with zipfile.ZipFile(bulk_zip) as z:
+        infos = z.infolist()
+    groups = group_members_by_span(infos, max_gap=0, max_group_size=10 ** 9)
+    assert sum(len(g) for g in groups) == len(infos)
+    assert len(group_members_by_span(infos[:2] + infos[30:31], max_gap=0)) == 2
+
+
+def test_http_range_file_reads_like_a_file(bulk_zip):
+    content = bulk_zip.read_bytes()
+    import requests
+    with requests_mock.Mocker() as m:
+        m.get(SEC_BULK_SUBMISSIONS, content=serve_ranges(content))
+        f = HttpRangeFile(requests.get, SEC_BULK_SUBMISSIONS, min_fetch=16)
+        assert f.size == len(content)
+        f.seek(100)
+        assert f.read(10) == content[100:110]
+        f.seek(-5, 2)
+        assert f.read() == content[-5:]
+
+
+def test_get_bulk_submissions_for_ciks(tmp_path, bulk_zip, make_downloader):
+    content = bulk_zip.read_bytes()
+    dl = make_downloader(root_path=tmp_path / "root")
+    with requests_mock.Mocker() as m:
+        m.get(SEC_BULK_SUBMISSIONS, content=serve_ranges(content))
+        extracted = dl.get_bulk_submissions(ciks=["2", "0000000005"])
+        assert all("Range" in r.headers for r in m.request_history)
+    assert sorted(extracted) == ["CIK0000000002-submissions-001.json", "CIK0000000002.json", "CIK0000000005.json"]
+    assert sorted(p.name for p in (tmp_path / "root" / "submissions").iterdir()) == sorted(extracted)
+    with zipfile.ZipFile(bulk_zip) as z:
+        assert (tmp_path / "root" / "submissions" / "CIK0000000005.json").read_bytes() == z.read("CIK0000000005.json")
+
+
+def test_http_range_file_requires_range_support(bulk_zip):
+    import requests
+    with requests_mock.Mocker() as m:
+        m.get(SEC_BULK_SUBMISSIONS, content=bulk_zip.read_bytes())
+        with pytest.raises(OSError):
+            HttpRangeFile(requests.get, SEC_BULK_SUBMISSIONS)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_extract_zip_parallel(tmp_path, bulk_zip, workers):
+    from src.pysec_downloader.bulk import extract_zip_parallel
+    target = tmp_path / "companyfacts"
+    stats = extract_zip_parallel(bulk_zip, target, workers=workers, progress=False)
+    assert stats["extracted"] == 40
+    with zipfile.ZipFile(bulk_zip) as z:
+        for info in z.infolist():
+            assert (target / info.filename).read_bytes() == z.read(info)
+
+
+def test_extract_zip_parallel_skips_unchanged(tmp_path, bulk_zip):
+    from src.pysec_downloader.bulk import extract_zip_parallel
+    target = tmp_path / "companyfacts"
+    extract_zip_parallel(bulk_zip, target, workers=1, progress=False)
+    (target / "CIK0000000003.json").write_text("changed")
+    stats = extract_zip_parallel(bulk_zip, target, workers=1, skip_unchanged=True, progress=False)
+    assert stats["extracted"] == 1
+    assert stats["skipped"] == 39
+
+
+def test_extract_zip_parallel_stays_in_extract_path(tmp_path):
+    from src.pysec_downloader.bulk import extract_zip_parallel
+    path = tmp_path / "evil.zip"
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("../../outside.txt", "x")
+    extract_zip_parallel(path, tmp_path / "out", workers=1, progress=False)
+    assert (tmp_path / "out" / "outside.txt").is_file()
+
+
+def test_bulk_archive_reads_members_and_persists_index(bulk_zip):
+    from src.pysec_downloader.bulk import BulkArchive
+    with BulkArchive(bulk_zip) as archive:
+        assert len(archive) == 40
+        assert archive.read_json("CIK0000000007.json")["cik"] == "7"
+        with pytest.raises(KeyError):
+            archive.read("CIK0000000099.json")
+    assert (bulk_zip.parent / "submissions.zip.index.json").is_file()
+    with BulkArchive(bulk_zip) as archive:
+        assert archive.read("CIK0000000002-submissions-001.json") == b'{"page": 1}'
+
+
+def test_get_xbrl_companyfacts_from_bulk_archive(tmp_path, dl):
+    from src.pysec_downloader.downloader import SEC_API_XBRL_COMPANYFACTS_URL
+    with zipfile.ZipFile(tmp_path / "companyfacts.zip", "w", compression=zipfile.ZIP_DEFLATED) as z:
+        z.writestr("CIK0000000001.json", '{"cik": 1, "facts": {}}')
+    with requests_mock.Mocker() as m:
+        m.get(f"{SEC_API_XBRL_COMPANYFACTS_URL}/CIK0000000002.json", json={"cik": 2, "facts": {}})
+        assert dl.get_xbrl_companyfacts("1") == {"cik": 1, "facts": {}}
+        assert m.call_count == 0
+        # not in the archive -> falls back to the api
+        assert dl.get_xbrl_companyfacts("2") == {"cik": 2, "facts": {}}
+        assert m.call_count == 1
+
+
+def test_get_newer_filings_meta_from_submissions_zip(tmp_path):
+    import json
+    from src.pysec_downloader.downloader import IndexHandler
+    submission = {"filings": {"recent": {
+        "form": ["S-3", "8-K"],
+        "accessionNumber": ["0000000001-22-000002", "0000000001-21-000001"],
+        "primaryDocument": ["s3.htm", "8k.htm"],
+        "filingDate": ["2022-05-01", "2021-01-01"],
+        "fileNumber": ["333-1", "001-1"]}}}
+    with zipfile.ZipFile(tmp_path / "submissions.zip", "w") as z:
+        z.writestr("CIK0000000001.json", json.dumps(submission))
+    handler = IndexHandler(tmp_path)
+    assert handler.get_newer_filings_meta("1", "2020-01-01", set(["S-3"])) == {
+        "0000000001": [["S-3", "000000000122000002", "s3.htm", "2022-05-01", ["333-1"]]]}
+
+
+def _write_zip(path, members: dict):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        for name, content in members.items():
+            z.writestr(name, content)
+    return path.read_bytes()
+
+
+def serve_ranges_or_whole(content: bytes):
+    '''like serve_ranges, answers requests without a Range header with the whole content'''
+    serve = serve_ranges(content)
+    def respond(request, context):
+        if "Range" not in request.headers:
+            context.headers["Content-Length"] = str(len(content))
+            return content
+        return serve(request, context)
+    return respond
+
+
+def test_sync_bulk_submissions_rewrites_only_changed_members(tmp_path, make_downloader):
+    # filler that doesnt compress, so the zip is larger than the tail fetched by HttpRangeFile
+    members = {f"CIK{str(cik).zfill(10)}.json": '{"cik": "%s", "filler": "%s"}' % (cik, random.Random(cik).randbytes(10000).hex()) for cik in range(1, 30)}
+    dl = make_downloader(root_path=tmp_path / "root")
+    content = _write_zip(tmp_path / "first.zip", members)
+    with requests_mock.Mocker() as m:
+        m.get(SEC_BULK_SUBMISSIONS, content=serve_ranges_or_whole(content))
+        report = dl.sync_bulk_submissions(extract_workers=1)
+    assert (report["mode"], report["files_changed"], report["files_saved"]) == ("full", 29, 0)
+    members["CIK0000000003.json"] = '{"cik": "3", "changed": true}'
+    del members["CIK0000000004.json"]
+    content = _write_zip(tmp_path / "second.zip", members)
+    submissions = tmp_path / "root" / "submissions"
+    before = (submissions / "CIK0000000005.json").stat().st_mtime_ns
+    with requests_mock.Mocker() as m:
+        m.get(SEC_BULK_SUBMISSIONS, content=serve_ranges_or_whole(content))
+        report = dl.sync_bulk_submissions()
+        assert all("Range" in r.headers for r in m.request_history)
+    assert (report["mode"], report["files_checked"], report["files_changed"], report["files_removed"], report["files_saved"]) == ("range", 28, 1, 1, 27)
+    assert report["bytes_saved"] == len(content) - report["bytes_transferred"] > 0
+    assert (submissions / "CIK0000000003.json").read_text() == members["CIK0000000003.json"]
+    assert not (submissions / "CIK0000000004.json").exists()
+    assert (submissions / "CIK0000000005.json").stat().st_mtime_ns == before
+
+
+def test_sync_bulk_submissions_for_ciks_uses_conditional_requests(tmp_path, dl):
+    url = f"{SEC_API_SUBMISSIONS_URL}/CIK0000000001.json"
+    with requests_mock.Mocker() as m:
+        m.get(url, [
+            {"content": b'{"cik": "1"}', "headers": {"ETag": '"v1"'}},
+            {"status_code": 304}])
+        m.get(f"{SEC_API_SUBMISSIONS_URL}/CIK0000000002.json", status_code=404)
+        first = dl.sync_bulk_submissions(ciks=["1", "2"])
+        second = dl.sync_bulk_submissions(ciks=["1"])
+        assert m.request_history[-1].headers["If-None-Match"] == '"v1"'
+    assert (first["files_checked"], first["files_changed"], first["bytes_transferred"]) == (2, 1, 12)
+    assert (second["files_changed"], second["files_saved"], second["bytes_saved"]) == (0, 1, 12)
+    assert (tmp_path / "submissions" / "CIK0000000001.json").read_bytes() == b'{"cik": "1"}'
+
+
+def test_sync_bulk_submissions_for_ciks_fetches_missing_pages(tmp_path, dl):
+    main = b'{"cik": "1", "filings": {"recent": {}, "files": [{"name": "CIK0000000001-submissions-001.json"}]}}'
+    page_url = f"{SEC_API_SUBMISSIONS_URL}/CIK0000000001-submissions-001.json"
+    with requests_mock.Mocker() as m:
+        m.get(f"{SEC_API_SUBMISSIONS_URL}/CIK0000000001.json", [
+            {"content": main, "headers": {"ETag": '"v1"'}},
+            {"status_code": 304}])
+        m.get(page_url, content=b'{"form": ["S-1"]}')
+        first = dl.sync_bulk_submissions(ciks=["1"])
+        second = dl.sync_bulk_submissions(ciks=["1"])
+        assert [r.url for r in m.request_history].count(page_url) == 1
+    assert (first["files_checked"], first["files_changed"]) == (2, 2)
+    assert (second["files_checked"], second["files_changed"], second["files_saved"]) == (1, 0, 1)
+    assert (tmp_path / "submissions" / "CIK0000000001-submissions-001.json").read_bytes() == b'{"form": ["S-1"]}'
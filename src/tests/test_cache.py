@@ -0,0 +1,69 @@
+import pytest
+import requests
+import requests_mock
+from src.pysec_downloader.cache import ResponseCache
+from src.pysec_downloader.downloader import SEC_API_XBRL_COMPANYFACTS_URL, SEC_SEARCH_API_URL
+
+CIK = "0001234567"
+FACTS_URL = f"{SEC_API_XBRL_COMPANYFACTS_URL}/CIK{CIK}.json"
+
+
+def _response(url: str, content: bytes, headers: dict = None):
+    resp = requests.Response()
+    resp.status_code = 200
+    resp.url = url
+    resp._content = content
+    resp.headers.update(headers if headers else {})
+    return resp
+
+
+def test_fresh_responses_are_served_from_the_cache(tmp_path, make_downloader):
+    dl = make_downloader(cache=True)
+    with requests_mock.Mocker() as m:
+        m.get(FACTS_URL, json={"cik": 1234567, "facts": {}})
+        assert dl.get_xbrl_companyfacts(CIK) == {"cik": 1234567, "facts": {}}
+        assert dl.get_xbrl_companyfacts(CIK) == {"cik": 1234567, "facts": {}}
+        assert m.call_count == 1
+    stats = dl.cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    # the cache is persistent
+    assert (tmp_path / "response_cache.sqlite").is_file()
+
+
+def test_expired_responses_are_revalidated(tmp_path, make_downloader):
+    cache = ResponseCache(tmp_path / "cache.sqlite", ttls={"companyfacts": 0})
+    dl = make_downloader(cache=cache)
+    with requests_mock.Mocker() as m:
+        m.get(FACTS_URL, [
+            {"json": {"facts": {"a": 1}}, "headers": {"ETag": '"v1"'}},
+            {"status_code": 304}])
+        assert dl.get_xbrl_companyfacts(CIK) == {"facts": {"a": 1}}
+        assert dl.get_xbrl_companyfacts(CIK) == {"facts": {"a": 1}}
+        assert m.request_history[1].headers["If-None-Match"] == '"v1"'
+    assert cache.stats()["revalidations"] == 1
+
+
+def test_search_requests_are_keyed_by_their_body(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    assert cache.make_key("POST", SEC_SEARCH_API_URL, {"q": "", "from": 0}) == cache.make_key("post", SEC_SEARCH_API_URL, {"from": 0, "q": ""})
+    assert cache.make_key("POST", SEC_SEARCH_API_URL, {"from": 0}) != cache.make_key("POST", SEC_SEARCH_API_URL, {"from": 100})
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_size=250)
+    for i in range(2):
+        key, _, _ = cache.lookup("companyfacts", "GET", f"https://x/{i}")
+        cache.store(key, "companyfacts", _response(f"https://x/{i}", b"x" * 100))
+    # use the first entry, so the second is the least recently used one
+    assert cache.lookup("companyfacts", "GET", "https://x/0")[1] is not None
+    key, _, _ = cache.lookup("companyfacts", "GET", "https://x/2")
+    cache.store(key, "companyfacts", _response("https://x/2", b"x" * 100))
+    assert cache.lookup("companyfacts", "GET", "https://x/1")[1] is None
+    assert cache.lookup("companyfacts", "GET", "https://x/0")[1].content == b"x" * 100
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 200
+
+
+def test_rejects_invalid_max_size(tmp_path):
+    with pytest.raises(ValueError):
+        ResponseCache(tmp_path / "cache.sqlite", max_size=0)
@@ -0,0 +1,94 @@
+import pytest
+import requests_mock
+from src.pysec_downloader.downloader import IndexHandler, SEC_SEARCH_API_URL
+from src.pysec_downloader.sqlite_index import SQLiteIndexHandler
+
+pa = pytest.importorskip("pyarrow")
+from src.pysec_downloader.columnar_index import ColumnarIndex
+
+
+def _items(form_type: str, count: int, year: int, file_num: str = "333-0001"):
+    return [[form_type, f"0001234567{year % 100}{i:06d}", "doc.htm", file_num, f"{year}-0{i % 9 + 1}-01"] for i in range(count)]
+
+
+@pytest.fixture
+def index_handler(tmp_path):
+    columnar_index = ColumnarIndex(tmp_path, flush_size=5)
+    index_handler = IndexHandler(tmp_path, columnar_index=columnar_index)
+    index_handler._create_indexes_bulk("0000000001", _items("424B5", 3, 2022) + _items("424B5", 2, 2023))
+    index_handler._create_indexes_bulk("0000000002", _items("424B5", 1, 2023, "333-0002") + _items("8-K", 2, 2023, "001-0002"))
+    index_handler._create_indexes("0000000003", "10-K/A", "000000000323000001", "10k.htm", "001-0003", "2023-03-01")
+    return index_handler
+
+
+def test_entries_are_added_and_partitioned(tmp_path, index_handler):
+    columnar_index = index_handler.columnar_index
+    # flush_size reached once, the rest is still buffered
+    assert len(columnar_index._buffer) > 0
+    table = columnar_index.query()
+    assert columnar_index._buffer == []
+    assert table.num_rows == 9
+    assert table.column_names == ["cik", "form_type", "accession_number", "file_number", "file_path", "filing_date"]
+    assert sorted(p.name for p in columnar_index.path.iterdir()) == ["year=2022", "year=2023"]
+    row = columnar_index.query(form_types="10-K/A").to_pylist()[0]
+    assert row["file_path"] == index_handler.get_local_filings_by_cik("0000000003")[0]["file_path"][len(str(tmp_path / "filings")) + 1:]
+    assert row["accession_number"] == "000000000323000001"
+
+
+def test_query_filters(index_handler):
+    columnar_index = index_handler.columnar_index
+    df = columnar_index.query(form_types=["424B5"], after_date="2023-01-01", before_date="2023-12-31", as_dataframe=True)
+    assert sorted(df["cik"]) == ["0000000001", "0000000001", "0000000002"]
+    assert columnar_index.query(ciks=["0000000002"], file_numbers="001-0002").num_rows == 2
+    assert columnar_index.query(before_date="2022-12-31").num_rows == 3
+    assert columnar_index.query(form_types="S-1").num_rows == 0
+    assert columnar_index.query(columns=["cik"], ciks="0000000003").to_pylist() == [{"cik": "0000000003"}]
+
+
+def test_compact_merges_files_and_drops_duplicates(tmp_path, index_handler):
+    columnar_index = index_handler.columnar_index
+    # the index handler skips entries it already has, duplicates only come from other writers
+    columnar_index.add("0000000001", _items("424B5", 3, 2022))
+    columnar_index.flush()
+    before = columnar_index.query().num_rows
+    report = columnar_index.compact()
+    assert report["duplicates_removed"] == 3
+    assert columnar_index.query().num_rows == before - 3
+    for partition in columnar_index.path.iterdir():
+        assert len(list(partition.glob("*.parquet"))) == 1
+
+
+def test_partition_by_form_type_and_build_from_index(tmp_path):
+    index_handler = SQLiteIndexHandler(tmp_path)
+    index_handler._create_indexes_bulk("0000000001", _items("424B5", 2, 2022) + _items("10-K/A", 1, 2023))
+    columnar_index = ColumnarIndex(tmp_path, partition_by="form_type")
+    assert columnar_index.build_from_index(index_handler) == 3
+    assert columnar_index.query(form_types="10-K/A").num_rows == 1
+    assert columnar_index.query(after_date="2022-01-01", before_date="2022-12-31").num_rows == 2
+    with pytest.raises(ValueError):
+        ColumnarIndex(tmp_path, partition_by="year")
+
+
+def test_build_from_index_with_empty_file_numbers(tmp_path):
+    index_handler = IndexHandler(tmp_path)
+    index_handler._create_indexes_bulk("0000000001", _items("424B5", 2, 2022, file_num=""))
+    index_handler._create_indexes("0000000001", "10-K", "000000000123000001", "10k.htm", "001-0001", "2023-03-01")
+    columnar_index = ColumnarIndex(tmp_path)
+    assert columnar_index.build_from_index(index_handler) == 3
+    assert sorted(columnar_index.query(columns=["file_number"]).column("file_number").to_pylist(), key=str) == ["001-0001", None, None]
+
+
+def test_downloads_are_flushed_without_calling_flush(tmp_path, make_downloader, search_hit):
+    columnar_index = ColumnarIndex(tmp_path)
+    dl = make_downloader(index_handler=IndexHandler(tmp_path, columnar_index=columnar_index))
+    cik = "0001234567"
+    hits = [search_hit(cik, f"0001234567-22-00000{i}", f"doc{i}.htm") for i in range(2)]
+    with requests_mock.Mocker() as m:
+        m.post(SEC_SEARCH_API_URL, [
+            {"json": {"hits": {"hits": hits}, "query": {"size": 100}}},
+            {"json": {"hits": {"hits": []}, "query": {"size": 100}}}])
+        m.get(requests_mock.ANY, content=b"<html></html>")
+        dl.get_filings(cik, "8-K")
+    assert columnar_index._buffer == []
+    # a new instance only sees what was written to disk
+    assert ColumnarIndex(tmp_path).query(ciks=cik).num_rows == 2
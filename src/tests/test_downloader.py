@@ -23,11 +23,24 @@ def test_zip_file_download_with_extract(tmp_path, get_zip_file):
         user_agent="test requests mock@this.com")
     with requests_mock.Mocker() as m:
         with open(zip_file_path, "rb") as f:
-            m.get(SEC_BULK_SUBMISSIONS, content=f.read(), headers={"Content-Length": "1000"})
+            content = f.read()
+            m.get(SEC_BULK_SUBMISSIONS, content=content, headers={"Content-Length": str(len(content))})
             dl._handle_download_zip_file_with_extract(url=SEC_BULK_SUBMISSIONS, extract_path=(root_path / "submissions"))
         result_dir = root_path / "submissions"
         assert "file1.txt" in [i.parts[-1] for i in result_dir.glob("*")]
         assert (root_path / "temp.zip").exists() is False
+
+
+def test_zip_file_download_with_extract_creates_only_target_folder(tmp_path, get_zip_file):
+    dl = Downloader(
+        root_path=tmp_path,
+        user_agent="test requests mock@this.com")
+    with requests_mock.Mocker() as m:
+        content = get_zip_file.read_bytes()
+        m.get(SEC_BULK_SUBMISSIONS, content=content, headers={"Content-Length": str(len(content))})
+        dl._handle_download_zip_file_with_extract(url=SEC_BULK_SUBMISSIONS, extract_path=(tmp_path / "companyfacts"))
+    assert (tmp_path / "companyfacts" / "file1.txt").is_file()
+    assert not (tmp_path / "submissions").exists()
     
 
 def test_zip_file_download_without_extract(tmp_path, get_zip_file):
@@ -38,8 +51,201 @@ def test_zip_file_download_without_extract(tmp_path, get_zip_file):
         user_agent="test requests mock@this.com")
     with requests_mock.Mocker() as m:
         with open(zip_file_path, "rb") as f:
-            m.get(SEC_BULK_SUBMISSIONS, content=f.read(), headers={"Content-Length": "1000"})
+            content = f.read()
+            m.get(SEC_BULK_SUBMISSIONS, content=content, headers={"Content-Length": str(len(content))})
             dl._handle_download_zip_file_without_extract(url=SEC_BULK_SUBMISSIONS, save_path=(root_path / "submissions.zip"))
         result_file = root_path / "submissions.zip"
         assert result_file.exists() is True
         assert (root_path / "temp.zip").exists() is False
+
+
+def test_zip_file_download_resumes_partial_download(tmp_path, get_zip_file):
+    import json
+    content = get_zip_file.read_bytes()
+    save_path = tmp_path / "submissions.zip"
+    Path(str(save_path) + ".part").write_bytes(content[:50])
+    Path(str(save_path) + ".part.json").write_text(json.dumps(
+        {"url": SEC_BULK_SUBMISSIONS, "etag": '"abc"', "last_modified": None, "size": len(content)}))
+    dl = Downloader(
+        root_path=tmp_path,
+        user_agent="test requests mock@this.com")
+
+    def respond(request, context):
+        assert request.headers["Range"] == "bytes=50-"
+        assert request.headers["If-Range"] == '"abc"'
+        context.status_code = 206
+        context.headers["Content-Range"] = f"bytes 50-{len(content) - 1}/{len(content)}"
+        context.headers["Content-Length"] = str(len(content) - 50)
+        return content[50:]
+
+    with requests_mock.Mocker() as m:
+        m.get(SEC_BULK_SUBMISSIONS, content=respond)
+        dl._handle_download_zip_file_without_extract(url=SEC_BULK_SUBMISSIONS, save_path=save_path)
+        assert m.call_count == 1
+    assert save_path.read_bytes() == content
+    assert not Path(str(save_path) + ".part").exists()
+    assert not Path(str(save_path) + ".part.json").exists()
+
+
+def test_zip_file_download_resumes_after_short_read(tmp_path, get_zip_file):
+    content = get_zip_file.read_bytes()
+    save_path = tmp_path / "submissions.zip"
+    dl = Downloader(
+        root_path=tmp_path,
+        user_agent="test requests mock@this.com")
+    with requests_mock.Mocker() as m:
+        m.get(SEC_BULK_SUBMISSIONS, [
+            # connection dropped after 40 bytes
+            {"content": content[:40], "headers": {"Content-Length": str(len(content)), "ETag": '"abc"'}},
+            {"content": content[40:], "status_code": 206, "headers": {
+                "Content-Range": f"bytes 40-{len(content) - 1}/{len(content)}", "ETag": '"abc"'}}])
+        dl._handle_download_zip_file_without_extract(url=SEC_BULK_SUBMISSIONS, save_path=save_path)
+        assert m.request_history[1].headers["Range"] == "bytes=40-"
+    assert save_path.read_bytes() == content
+
+
+def test_retries_go_through_rate_limiter(tmp_path, monkeypatch, make_downloader):
+    import src.pysec_downloader.downloader as downloader
+    from src.pysec_downloader.rate_limiter import TokenBucketRateLimiter
+    monkeypatch.setattr(downloader, "RETRY_BACKOFF_FACTOR", 0)
+    limiter = TokenBucketRateLimiter(rate=1000, throttle_threshold=2)
+    dl = make_downloader(rate_limiter=limiter)
+    reserved = []
+    reserve = limiter.reserve
+    monkeypatch.setattr(limiter, "reserve", lambda: reserved.append(1) or reserve())
+    with requests_mock.Mocker() as m:
+        m.get(SEC_BULK_SUBMISSIONS, [
+            {"status_code": 403, "headers": {"Retry-After": "0"}},
+            {"status_code": 429},
+            {"status_code": 200, "content": b"ok"}])
+        resp = dl._get(url=SEC_BULK_SUBMISSIONS)
+        assert resp.content == b"ok"
+        assert m.call_count == 3
+    assert len(reserved) == 3
+    assert limiter.effective_rate < 1000
+
+
+@pytest.mark.parametrize("method", ["get_filings", "get_filings_bulk"])
+def test_get_filings_pipeline(tmp_path, get_zip_file, method, dl, search_hit):
+    from src.pysec_downloader.downloader import SEC_SEARCH_API_URL, EDGAR_ARCHIVES_BASE_URL
+    cik = "0001234567"
+    hits = [search_hit(cik, f"0001234567-22-00000{i}", f"doc{i}.htm") for i in range(3)]
+    hits.append(search_hit(cik, "0001234567-22-000009", "data.zip"))
+    written = []
+    with requests_mock.Mocker() as m:
+        m.post(SEC_SEARCH_API_URL, [
+            {"json": {"hits": {"hits": hits}, "query": {"size": 100}}},
+            {"json": {"hits": {"hits": []}, "query": {"size": 100}}}])
+        for i in range(3):
+            m.get(f"{EDGAR_ARCHIVES_BASE_URL}/{cik}/00012345672200000{i}/doc{i}.htm", content=b"<html><img src='a.jpg'/></html>")
+        m.get(f"{EDGAR_ARCHIVES_BASE_URL}/{cik}/000123456722000009/data.zip", content=get_zip_file.read_bytes())
+        getattr(dl, method)(cik, "8-K", prefered_file_type="htm", pipeline=True, pipeline_workers=2,
+                            callback=lambda r: written.append(r["meta"]["accession_number"]))
+    filings = tmp_path / "filings" / cik / "8-K"
+    assert written == [f"00012345672200000{i}" for i in range(3)] + ["000123456722000009"]
+    assert f"{EDGAR_ARCHIVES_BASE_URL}/{cik}/000123456722000000/a.jpg" in (filings / "000123456722000000" / "doc0.htm").read_text()
+    assert (filings / "000123456722000009" / "file1.txt").is_file()
+    assert len(dl.index_handler.get_local_filings_by_cik(cik)) == 4
+
+
+def test_get_filings_bulk_searches_many_forms_and_ciks_in_one_query(tmp_path, get_zip_file, dl, search_hit):
+    from src.pysec_downloader.downloader import SEC_SEARCH_API_URL, EDGAR_ARCHIVES_BASE_URL
+    cik_a, cik_b = "0001234567", "0007654321"
+    hits = [
+        search_hit(cik_a, "0001234567-22-000001", "doc1.htm", form="8-K"),
+        search_hit(cik_b, "0007654321-22-000002", "q2.htm", form="10-Q"),
+        search_hit(cik_a, "0001234567-22-000003", "q3.htm", form="10-Q/A"),
+        search_hit(cik_b, "0007654321-22-000004", "s4.htm", form="S-1")]
+    with requests_mock.Mocker() as m:
+        m.post(SEC_SEARCH_API_URL, [
+            {"json": {"hits": {"hits": hits}, "query": {"size": 100}}},
+            {"json": {"hits": {"hits": []}, "query": {"size": 100}}}])
+        m.get(f"{EDGAR_ARCHIVES_BASE_URL}/{cik_a}/000123456722000001/doc1.htm", content=b"<html></html>")
+        m.get(f"{EDGAR_ARCHIVES_BASE_URL}/{cik_b}/000765432122000002/000765432122000002-xbrl.zip", content=get_zip_file.read_bytes())
+        m.get(f"{EDGAR_ARCHIVES_BASE_URL}/{cik_a}/000123456722000003/000123456722000003-xbrl.zip", status_code=404)
+        m.get(f"{EDGAR_ARCHIVES_BASE_URL}/{cik_a}/000123456722000003/q3.htm", content=b"<html></html>")
+        dl.get_filings_bulk([cik_a, cik_b], ["8-K", "10-Q"], prefered_file_type={"10-Q": "xbrl", "8-K": "htm"})
+        searches = [r.json() for r in m.request_history if r.method == "POST"]
+        downloads = [r.url for r in m.request_history if r.method == "GET"]
+    assert searches[0]["ciks"] == [cik_a, cik_b]
+    assert searches[0]["forms"] == ["8-K", "10-Q"]
+    assert "entityName" not in searches[0]
+    # the amendment is guessed as xbrl too and falls back to its main file
+    assert len(downloads) == 4
+    assert dl.index_handler.has_filing(cik_a, "0001234567-22-000001")
+    assert dl.index_handler.has_filing(cik_a, "0001234567-22-000003")
+    assert dl.index_handler.has_filing(cik_b, "0007654321-22-000002")
+    assert not dl.index_handler.has_filing(cik_b, "0007654321-22-000004")
+
+
+def test_get_filings_many_interleaves_jobs(tmp_path, dl, search_hit):
+    from src.pysec_downloader.downloader import SEC_SEARCH_API_URL, EDGAR_ARCHIVES_BASE_URL
+    big, small = "0001234567", "0007654321"
+    hits = {
+        big: [search_hit(big, f"0001234567-22-00000{i}", f"doc{i}.htm") for i in range(6)],
+        small: [search_hit(small, "0007654321-22-000001", "doc.htm")]}
+
+    def search(request, context):
+        body = request.json()
+        page = hits[body["entityName"]] if body["from"] == 0 else []
+        return {"hits": {"hits": page}, "query": {"size": 100}}
+
+    with requests_mock.Mocker() as m:
+        m.post(SEC_SEARCH_API_URL, json=search)
+        m.get(requests_mock.ANY, content=b"<html></html>")
+        stats = dl.get_filings_many([
+            {"ticker_or_cik": big, "form_type": "8-K"},
+            (small, "8-K", {"number_of_filings": 10})], resolve_urls=False)
+        urls = [r.url for r in m.request_history]
+    # the small job is done before the big one got to its second filing
+    assert urls.index(f"{EDGAR_ARCHIVES_BASE_URL}/{small}/000765432122000001/doc.htm") < urls.index(f"{EDGAR_ARCHIVES_BASE_URL}/{big}/000123456722000001/doc1.htm")
+    assert [(s["search_requests"], s["hits"], s["downloads"], s["error"]) for s in stats] == [(2, 6, 6, None), (2, 1, 1, None)]
+    assert stats[1]["duration"] <= stats[0]["duration"]
+    assert len(dl.index_handler.get_local_filings_by_cik(big)) == 6
+    assert dl.index_handler.has_filing(small, "0007654321-22-000001")
+
+
+def test_get_filings_many_rejects_invalid_jobs(tmp_path):
+    dl = Downloader(root_path=tmp_path, user_agent="test requests mock@this.com")
+    with pytest.raises(ValueError):
+        dl.get_filings_many([{"ticker_or_cik": "0001234567", "form_type": "8-K", "unknown": 1}])
+    with pytest.raises(ValueError):
+        dl.get_filings_many([("0001234567", "8-K")], fairness="fastest_first")
+
+
+def test_get_filings_skips_already_downloaded_filings(tmp_path, dl, search_hit):
+    from src.pysec_downloader.downloader import SEC_SEARCH_API_URL, EDGAR_ARCHIVES_BASE_URL
+    cik = "0001234567"
+    hits = [search_hit(cik, f"0001234567-22-00000{i}", f"doc{i}.htm") for i in range(3)]
+    with requests_mock.Mocker() as m:
+        m.post(SEC_SEARCH_API_URL, [
+            {"json": {"hits": {"hits": hits[:2]}, "query": {"size": 100}}},
+            {"json": {"hits": {"hits": []}, "query": {"size": 100}}},
+            {"json": {"hits": {"hits": hits}, "query": {"size": 100}}},
+            {"json": {"hits": {"hits": []}, "query": {"size": 100}}}])
+        for i in range(3):
+            m.get(f"{EDGAR_ARCHIVES_BASE_URL}/{cik}/00012345672200000{i}/doc{i}.htm", content=b"<html></html>")
+        dl.get_filings(cik, "8-K", resolve_urls=False)
+        # remove one file, it should be downloaded again
+        (tmp_path / "filings" / cik / "8-K" / "000123456722000001" / "doc1.htm").unlink()
+        dl.get_filings(cik, "8-K", resolve_urls=False)
+        downloads = [r.url for r in m.request_history if r.method == "GET"]
+    assert sorted(downloads) == sorted([
+        f"{EDGAR_ARCHIVES_BASE_URL}/{cik}/000123456722000000/doc0.htm",
+        f"{EDGAR_ARCHIVES_BASE_URL}/{cik}/000123456722000001/doc1.htm",
+        f"{EDGAR_ARCHIVES_BASE_URL}/{cik}/000123456722000001/doc1.htm",
+        f"{EDGAR_ARCHIVES_BASE_URL}/{cik}/000123456722000002/doc2.htm"])
+    assert dl.index_handler.has_filing(cik, "0001234567-22-000002")
+    with requests_mock.Mocker() as m:
+        dl.get_filing_by_accession_number(cik, "8-K", "000123456722000000", "doc0.htm", "2022-01-01", ["001-0001"])
+        assert m.call_count == 0
+
+
+def test_get_filing_by_accession_number_resolves_relative_urls(tmp_path, dl):
+    from src.pysec_downloader.downloader import EDGAR_ARCHIVES_BASE_URL
+    cik = "0001234567"
+    with requests_mock.Mocker() as m:
+        m.get(f"{EDGAR_ARCHIVES_BASE_URL}/{cik}/000123456722000000/doc0.htm", content=b'<html><a href="ex1.htm">ex</a></html>')
+        assert dl.get_filing_by_accession_number(cik, "8-K", "000123456722000000", "doc0.htm", "2022-01-01", ["001-0001"]) is True
+    saved = (tmp_path / "filings" / cik / "8-K" / "000123456722000000" / "doc0.htm").read_text()
+    assert f'href="{EDGAR_ARCHIVES_BASE_URL}/{cik}/ex1.htm"' in saved
@@ -0,0 +1,75 @@
+import json
+import os
+import zipfile
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+from src.pysec_downloader.facts_warehouse import FactsWarehouse
+
+
+def _companyfacts(cik: int, value: float):
+    return {"cik": cik, "entityName": f"company {cik}", "facts": {
+        "us-gaap": {
+            "AccountsPayableCurrent": {"label": "Accounts Payable", "units": {"USD": [
+                {"end": "2023-09-30", "val": value, "accn": f"{cik:010d}-23-000001", "fy": 2023, "fp": "Q3", "form": "10-Q", "filed": "2023-11-01", "frame": "CY2023Q3I"},
+                {"end": "2023-12-31", "val": value * 2, "accn": f"{cik:010d}-24-000001", "fy": 2023, "fp": "FY", "form": "10-K", "filed": "2024-02-01", "frame": "CY2023Q4I"}]}},
+            "Revenues": {"units": {"USD": [
+                {"start": "2023-01-01", "end": "2023-12-31", "val": 1000, "accn": f"{cik:010d}-24-000001", "fy": 2023, "fp": "FY", "form": "10-K", "filed": "2024-02-01"}]}}},
+        "dei": {
+            "EntityCommonStockSharesOutstanding": {"units": {"shares": [
+                {"end": "2024-01-15", "val": 500, "accn": f"{cik:010d}-24-000001", "fy": 2023, "fp": "FY", "form": "10-K", "filed": "2024-02-01"}]}}}}}
+
+
+def _write(folder, cik: int, value: float):
+    path = folder / f"CIK{cik:010d}.json"
+    path.write_text(json.dumps(_companyfacts(cik, value)))
+    # make sure the mtime changes even on filesystems with a coarse resolution
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + int(value) * 1_000_000_000))
+
+
+@pytest.fixture
+def companyfacts(tmp_path):
+    folder = tmp_path / "companyfacts"
+    folder.mkdir()
+    for cik in range(1, 9):
+        _write(folder, cik, cik)
+    return folder
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_build_and_query(tmp_path, companyfacts, workers):
+    warehouse = FactsWarehouse(tmp_path, buckets=4)
+    stats = warehouse.build(workers=workers, progress=False)
+    assert (stats["files"], stats["converted"], stats["buckets_updated"], stats["facts"]) == (8, 8, 4, 32)
+    df = warehouse.query(tags="AccountsPayableCurrent", frames="CY2023Q4I", as_dataframe=True)
+    assert sorted(df["cik"]) == [f"{cik:010d}" for cik in range(1, 9)]
+    assert sorted(df["val"]) == [2.0 * cik for cik in range(1, 9)]
+    row = warehouse.query(tags="Revenues", ciks="0000000003").to_pylist()[0]
+    assert (row["taxonomy"], row["unit"], str(row["start"]), row["fy"], row["frame"]) == ("us-gaap", "USD", "2023-01-01", 2023, None)
+    assert warehouse.query(taxonomies="dei", units="shares", columns=["cik"]).num_rows == 8
+    assert warehouse.query(forms="10-Q", fy=2023).num_rows == 8
+
+
+def test_build_is_incremental(tmp_path, companyfacts):
+    warehouse = FactsWarehouse(tmp_path, buckets=4)
+    warehouse.build(workers=1, progress=False)
+    assert warehouse.build(workers=1, progress=False)["buckets_updated"] == 0
+    _write(companyfacts, 5, 50)
+    (companyfacts / "CIK0000000002.json").unlink()
+    stats = warehouse.build(workers=1, progress=False)
+    assert (stats["converted"], stats["removed"], stats["buckets_updated"]) == (1, 1, 2)
+    assert warehouse.query(tags="AccountsPayableCurrent", frames="CY2023Q3I", ciks=["0000000005"]).column("val").to_pylist() == [50.0]
+    assert warehouse.query(ciks="0000000002").num_rows == 0
+    assert warehouse.query().num_rows == 28
+    with pytest.raises(ValueError):
+        FactsWarehouse(tmp_path, buckets=8)
+
+
+def test_build_from_zip(tmp_path):
+    with zipfile.ZipFile(tmp_path / "companyfacts.zip", "w") as z:
+        z.writestr("CIK0000000001.json", json.dumps(_companyfacts(1, 1)))
+        z.writestr("CIK0000000002.json", "{not json")
+    warehouse = FactsWarehouse(tmp_path)
+    assert warehouse.build(workers=1, progress=False)["facts"] == 4
+    assert warehouse.query(tags="Revenues").num_rows == 1
@@ -0,0 +1,202 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from src.pysec_downloader import downloader
+from src.pysec_downloader.downloader import IndexHandler
+
+CIK = "0001234567"
+
+
+def _items(count: int, file_num: str = "001-0001"):
+    return [["8-K", f"0001234567220{i:05d}", "doc.htm", file_num, "2022-01-01"] for i in range(count)]
+
+
+def _write_filing(root_path, item: list):
+    file_path = root_path / "filings" / CIK / item[0] / item[1] / item[2]
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_bytes(b"<html></html>")
+
+
+def test_file_num_index_is_appended_to(tmp_path):
+    index_handler = IndexHandler(tmp_path)
+    for item in _items(3):
+        index_handler._create_indexes(CIK, *item)
+    index_handler._create_indexes_bulk(CIK, _items(2, "333-0001"))
+    journal = tmp_path / "index" / "file_num_index" / f"{CIK}.jsonl"
+    assert len(journal.read_text().splitlines()) == 5
+    assert not (tmp_path / "index" / "file_num_index" / f"{CIK}.json").exists()
+    assert len(index_handler.get_related_filings(CIK, "001-0001")) == 3
+    assert index_handler.get_related_filings(CIK, "333-0001")[0] == ["8-K", f"{CIK}/8-K/000123456722000000/doc.htm", "2022-01-01"]
+
+
+def test_file_num_index_ignores_incomplete_last_line(tmp_path):
+    index_handler = IndexHandler(tmp_path)
+    index_handler._create_indexes_bulk(CIK, _items(2))
+    journal = tmp_path / "index" / "file_num_index" / f"{CIK}.jsonl"
+    with open(journal, "a") as f:
+        f.write('["001-0001", "8-K", "00012')
+    assert len(index_handler.get_related_filings(CIK, "001-0001")) == 2
+
+
+def test_file_num_index_is_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader, "FILE_NUM_JOURNAL_COMPACT_SIZE", 500)
+    index_handler = IndexHandler(tmp_path)
+    for item in _items(10):
+        index_handler._create_indexes(CIK, *item)
+    num_index_path = tmp_path / "index" / "file_num_index"
+    compacted = json.loads((num_index_path / f"{CIK}.json").read_text())
+    journal = num_index_path / f"{CIK}.jsonl"
+    journal_lines = len(journal.read_text().splitlines()) if journal.exists() else 0
+    assert len(compacted["001-0001"]) + journal_lines == 10
+    assert len(index_handler.get_related_filings(CIK, "001-0001")) == 10
+    index_handler.compact_file_num_indexes()
+    assert not journal.exists()
+    assert len(json.loads((num_index_path / f"{CIK}.json").read_text())["001-0001"]) == 10
+
+
+def test_concurrent_appends_and_compactions_keep_every_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader, "FILE_NUM_JOURNAL_COMPACT_SIZE", 300)
+    index_handler = IndexHandler(tmp_path)
+    items = _items(200)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: index_handler._append_to_file_num_index(CIK, [[it[3], it[0], f"{CIK}/{it[1]}", it[4]] for it in items[i:i + 5]]), range(0, 200, 5)))
+    index_handler.compact_file_num_indexes()
+    num_index_path = tmp_path / "index" / "file_num_index"
+    assert len(json.loads((num_index_path / f"{CIK}.json").read_text())["001-0001"]) == 200
+    assert list(num_index_path.glob("*.tmp")) == []
+
+
+def test_interrupted_compaction_is_recovered(tmp_path):
+    index_handler = IndexHandler(tmp_path)
+    index_handler._create_indexes_bulk(CIK, _items(2))
+    index_handler.compact_file_num_indexes()
+    index_handler._create_indexes_bulk(CIK, _items(4)[2:])
+    # crashed after moving the journal aside, before replacing the compacted file
+    num_index_path = tmp_path / "index" / "file_num_index"
+    (num_index_path / f"{CIK}.jsonl").replace(num_index_path / f"{CIK}.jsonl.compacting")
+    index_handler._create_indexes_bulk(CIK, _items(5)[4:])
+    assert len(index_handler.get_related_filings(CIK, "001-0001")) == 5
+    index_handler.compact_file_num_indexes()
+    assert not (num_index_path / f"{CIK}.jsonl.compacting").exists()
+    assert len(index_handler.get_related_filings(CIK, "001-0001")) == 5
+
+
+def test_filing_downloaded_again_isnt_indexed_twice(tmp_path):
+    index_handler = IndexHandler(tmp_path)
+    item = _items(1)[0]
+    index_handler._create_indexes(CIK, *item)
+    # the file is missing, so the filing is downloaded and indexed again
+    assert not index_handler.has_filing(CIK, item[1])
+    index_handler._create_indexes(CIK, *item)
+    index_handler._create_indexes_bulk(CIK, [item])
+    assert len(index_handler.get_local_filings_by_cik(CIK)) == 1
+    assert len(index_handler.get_related_filings(CIK, "001-0001")) == 1
+    # another file number of the same filing is still added
+    index_handler._create_indexes(CIK, item[0], item[1], item[2], "333-0001", item[4])
+    assert len(index_handler.get_local_filings_by_cik(CIK)) == 2
+
+
+def test_check_index_removes_missing_files_from_file_num_index(tmp_path):
+    index_handler = IndexHandler(tmp_path)
+    items = _items(3)
+    index_handler._create_indexes_bulk(CIK, items)
+    _write_filing(tmp_path, items[1])
+    index_handler.check_index()
+    assert index_handler.get_related_filings(CIK, "001-0001") == [["8-K", f"{CIK}/8-K/000123456722000001/doc.htm", "2022-01-01"]]
+    assert not (tmp_path / "index" / "file_num_index" / f"{CIK}.jsonl").exists()
+
+
+def test_check_index_dry_run_only_reports(tmp_path):
+    index_handler = IndexHandler(tmp_path)
+    items = _items(3)
+    index_handler._create_indexes_bulk(CIK, items + items[:1])
+    _write_filing(tmp_path, items[0])
+    report = index_handler.check_index(dry_run=True)
+    assert report["checked_ciks"] == 1
+    assert report["base_index_removed"] == 3
+    assert report["num_index_removed"] == 2
+    assert report["missing"] == {CIK: [f"{CIK}/8-K/000123456722000001/doc.htm", f"{CIK}/8-K/000123456722000002/doc.htm"]}
+    assert len(index_handler.get_local_filings_by_cik(CIK)) == 4
+    assert len(index_handler.get_related_filings(CIK, "001-0001")) == 3
+    assert index_handler.check_index()["base_index_removed"] == 3
+    assert len(index_handler.get_local_filings_by_cik(CIK)) == 1
+
+
+def test_check_index_incremental_skips_unchanged_ciks(tmp_path):
+    index_handler = IndexHandler(tmp_path)
+    items = _items(2)
+    index_handler._create_indexes_bulk(CIK, items)
+    index_handler._create_indexes_bulk("0007654321", [["10-K", "000765432122000001", "10k.htm", "001-0002", "2022-01-01"]])
+    for item in items:
+        _write_filing(tmp_path, item)
+    assert index_handler.check_index(incremental=True)["checked_ciks"] == 2
+    report = index_handler.check_index(incremental=True)
+    assert (report["checked_ciks"], report["skipped_ciks"]) == (0, 2)
+    index_handler._create_indexes(CIK, "8-K", "000123456722000009", "doc.htm", "001-0001", "2022-02-01")
+    report = index_handler.check_index(incremental=True)
+    assert (report["checked_ciks"], report["skipped_ciks"]) == (1, 1)
+    assert report["missing"] == {CIK: [f"{CIK}/8-K/000123456722000009/doc.htm"]}
+
+
+def test_base_index_dataframe_columns_and_dtypes(tmp_path):
+    index_handler = IndexHandler(tmp_path)
+    index_handler._create_indexes_bulk(CIK, _items(3))
+    df = index_handler._get_base_index_as_dataframe(CIK)
+    assert list(df["accession_number"]) == [f"0001234567220{i:05d}" for i in range(3)]
+    assert df["file_path"][0] == str(tmp_path / "filings" / CIK / "8-K" / "000123456722000000" / "doc.htm")
+    assert df["file_path"][0] == index_handler._relative_to_absolute_filing_path(f"{CIK}/8-K/000123456722000000/doc.htm")
+    assert df["form_type"].dtype == "category"
+    assert str(df["filing_date"].dtype).startswith("datetime64")
+    assert list(df["file_number"]) == ["001-0001"] * 3
+    assert len(index_handler.get_local_filings_by_form_type(CIK, "8-K")) == 3
+
+
+def test_base_index_dataframe_is_cached_until_the_file_changes(tmp_path, monkeypatch):
+    index_handler = IndexHandler(tmp_path, dataframe_cache_size=1)
+    index_handler._create_indexes_bulk(CIK, _items(2))
+    index_handler._create_indexes_bulk("0007654321", _items(1))
+    reads = []
+    read_base_index = index_handler._read_base_index
+    monkeypatch.setattr(index_handler, "_read_base_index", lambda p: reads.append(p) or read_base_index(p))
+    index_handler._get_base_index_as_dataframe(CIK)
+    # callers get a copy, changing it doesnt change the cached frame
+    index_handler._get_base_index_as_dataframe(CIK).drop(0, inplace=True)
+    assert len(index_handler._get_base_index_as_dataframe(CIK)) == 2
+    assert len(reads) == 1
+    index_handler._create_indexes(CIK, "8-K", "000123456722099999", "doc.htm", "001-0001", "2022-02-01")
+    assert len(index_handler._get_base_index_as_dataframe(CIK)) == 3
+    assert len(reads) == 2
+    # the least recently used frame is evicted
+    index_handler._get_base_index_as_dataframe("0007654321")
+    index_handler._get_base_index_as_dataframe(CIK)
+    assert len(reads) == 4
+
+
+def test_newer_filings_meta_reads_only_overlapping_pages(tmp_path, monkeypatch):
+    def columns(filings: list[tuple]):
+        return {
+            "form": [f[0] for f in filings],
+            "accessionNumber": [f[1] for f in filings],
+            "primaryDocument": ["doc.htm" for _ in filings],
+            "filingDate": [f[2] for f in filings],
+            "fileNumber": ["333-1" for _ in filings]}
+    pages = [
+        {"name": f"CIK{CIK}-submissions-001.json", "filingCount": 2, "filingFrom": "2015-01-01", "filingTo": "2019-12-31"},
+        {"name": f"CIK{CIK}-submissions-002.json", "filingCount": 1, "filingFrom": "2010-01-01", "filingTo": "2014-12-31"}]
+    submissions = tmp_path / "submissions"
+    submissions.mkdir()
+    (submissions / f"CIK{CIK}.json").write_text(json.dumps({"filings": {
+        "recent": columns([("S-3", "0001234567-22-000003", "2022-01-01"), ("8-K", "0001234567-20-000002", "2020-01-01")]),
+        "files": pages}}))
+    (submissions / pages[0]["name"]).write_text(json.dumps(columns([("S-3", "0001234567-19-000001", "2019-06-01"), ("S-1", "0001234567-14-000001", "2015-01-01")])))
+    (submissions / pages[1]["name"]).write_text(json.dumps(columns([("S-1", "0001234567-10-000001", "2010-01-01")])))
+    index_handler = IndexHandler(tmp_path)
+    loaded = []
+    load_submissions_file = index_handler._load_submissions_file
+    monkeypatch.setattr(index_handler, "_load_submissions_file", lambda name, *args: loaded.append(name) or load_submissions_file(name, *args))
+    new_filings = index_handler.get_newer_filings_meta(CIK, "2016-01-01", set(["S-3", "S-1"]))
+    assert [f[1] for f in new_filings[CIK]] == ["000123456722000003", "000123456719000001"]
+    assert loaded == [f"CIK{CIK}.json", pages[0]["name"]]
+    loaded.clear()
+    assert len(index_handler.get_newer_filings_meta(CIK, "2021-01-01")[CIK]) == 1
+    assert loaded == [f"CIK{CIK}.json"]
+    assert len(index_handler.get_newer_filings_meta(CIK, "2000-01-01")[CIK]) == 5
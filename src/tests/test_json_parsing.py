@@ -0,0 +1,80 @@
+import json
+import zipfile
+from io import BytesIO
+import pytest
+import requests_mock
+from src.pysec_downloader import json_parsing
+from src.pysec_downloader.downloader import IndexHandler, SEC_API_XBRL_COMPANYFACTS_URL
+from src.pysec_downloader.json_parsing import load_companyfacts, load_submissions
+
+COMPANYFACTS = {"cik": 320193, "entityName": "Apple Inc.", "facts": {
+    "dei": {"EntityPublicFloat": {"label": "Public Float", "units": {"USD": [
+        {"end": "2022-03-25", "val": 2.5e12, "accn": "0000320193-22-000108", "fy": 2022, "fp": "FY", "form": "10-K", "filed": "2022-10-28"}]}}},
+    "us-gaap": {
+        "Revenues": {"label": "Revenues", "description": "revenue", "units": {"USD": [
+            {"start": "2021-09-26", "end": "2022-09-24", "val": 394328000000, "accn": "0000320193-22-000108", "fy": 2022, "fp": "FY", "form": "10-K", "filed": "2022-10-28"},
+            {"start": "2022-03-27", "end": "2022-06-25", "val": 82959000000, "accn": "0000320193-22-000070", "fy": 2022, "fp": "Q3", "form": "10-Q", "filed": "2022-07-29"}]}},
+        "AccountsPayableCurrent": {"label": "Accounts Payable", "units": {"USD": [
+            {"end": "2022-06-25", "val": 48343000000.5, "accn": "0000320193-22-000070", "fy": 2022, "fp": "Q3", "form": "10-Q", "filed": "2022-07-29", "frame": "CY2022Q2I"}]}}}}}
+
+SUBMISSION = {"cik": "320193", "name": "Apple Inc.", "tickers": ["AAPL"], "filings": {
+    "recent": {
+        "accessionNumber": ["0000320193-22-000108"], "filingDate": ["2022-10-28"], "form": ["10-K"],
+        "primaryDocument": ["aapl-20220924.htm"], "fileNumber": ["001-36743"], "size": [12345], "isXBRL": [1]},
+    "files": [{"name": "CIK0000320193-submissions-001.json", "filingCount": 1, "filingFrom": "1994-01-26", "filingTo": "2002-01-01"}]}}
+
+PAGE = {
+    "accessionNumber": ["0000320193-01-000001"], "filingDate": ["2001-01-01"], "form": ["10-K405"],
+    "primaryDocument": [""], "fileNumber": ["000-10030"], "size": [1], "items": [""]}
+
+COLUMNS = ["accessionNumber", "filingDate", "form", "primaryDocument", "fileNumber"]
+
+
+@pytest.fixture(params=["stream", "fallback"])
+def backend(request, monkeypatch):
+    if request.param == "stream":
+        pytest.importorskip("ijson")
+    else:
+        monkeypatch.setattr(json_parsing, "ijson", None)
+    return request.param
+
+
+def _file(content: dict):
+    return BytesIO(json.dumps(content).encode())
+
+
+def test_load_companyfacts_keeps_only_the_selected_facts(backend):
+    assert load_companyfacts(_file(COMPANYFACTS)) == COMPANYFACTS
+    content = load_companyfacts(_file(COMPANYFACTS), taxonomies=["us-gaap"], tags=["Revenues", "EntityPublicFloat"])
+    assert content == {"cik": 320193, "entityName": "Apple Inc.", "facts": {"us-gaap": {"Revenues": COMPANYFACTS["facts"]["us-gaap"]["Revenues"]}}}
+    content = load_companyfacts(_file(COMPANYFACTS), forms=["10-Q"])
+    assert list(content["facts"].keys()) == ["us-gaap"]
+    assert [v["val"] for v in content["facts"]["us-gaap"]["Revenues"]["units"]["USD"]] == [82959000000]
+    assert content["facts"]["us-gaap"]["AccountsPayableCurrent"] == COMPANYFACTS["facts"]["us-gaap"]["AccountsPayableCurrent"]
+
+
+def test_load_submissions_keeps_only_the_columns(backend):
+    content = load_submissions(_file(SUBMISSION), COLUMNS)
+    assert content == {"filings": {"recent": {c: SUBMISSION["filings"]["recent"][c] for c in COLUMNS}, "files": SUBMISSION["filings"]["files"]}}
+    assert load_submissions(_file(PAGE), COLUMNS) == {c: PAGE[c] for c in COLUMNS}
+    with pytest.raises(ValueError):
+        load_submissions(BytesIO(b'{"filings": {"recent": {"form": [}'), COLUMNS)
+
+
+def test_index_handler_streams_the_submissions(tmp_path, backend):
+    with zipfile.ZipFile(tmp_path / "submissions.zip", "w") as z:
+        z.writestr("CIK0000320193.json", json.dumps(SUBMISSION))
+        z.writestr("CIK0000320193-submissions-001.json", json.dumps(PAGE))
+    expected = IndexHandler(tmp_path).get_newer_filings_meta("320193", "2000-01-01")
+    assert IndexHandler(tmp_path, stream_json=True).get_newer_filings_meta("320193", "2000-01-01") == expected
+    assert [f[0] for f in expected["0000320193"]] == ["10-K", "10-K405"]
+
+
+@pytest.mark.parametrize("cache", [None, True])
+def test_get_xbrl_companyfacts_with_selectors(make_downloader, backend, cache):
+    dl = make_downloader(cache=cache)
+    with requests_mock.Mocker() as m:
+        m.get(f"{SEC_API_XBRL_COMPANYFACTS_URL}/CIK0000320193.json", content=json.dumps(COMPANYFACTS).encode())
+        assert dl.get_xbrl_companyfacts("320193") == COMPANYFACTS
+        content = dl.get_xbrl_companyfacts("320193", tags=["AccountsPayableCurrent"])
+    assert content["facts"] == {"us-gaap": {"AccountsPayableCurrent": COMPANYFACTS["facts"]["us-gaap"]["AccountsPayableCurrent"]}}
@@ -0,0 +1,60 @@
+import json
+import pytest
+import requests_mock
+from src.pysec_downloader.downloader import EDGAR_ARCHIVES_BASE_URL
+from src.pysec_downloader.planner import DownloadPlan
+from src.pysec_downloader.rate_limiter import TokenBucketRateLimiter
+
+CIK = "0001234567"
+BASE_URL = f"{EDGAR_ARCHIVES_BASE_URL}/{CIK}"
+
+
+@pytest.fixture
+def dl(tmp_path, make_downloader):
+    recent = {
+        "accessionNumber": ["0001234567-22-000004", "0001234567-22-000003", "0001234567-22-000002", "0001234567-22-000001"],
+        "filingDate": ["2022-04-01", "2022-03-01", "2022-02-01", "2021-12-01"],
+        "form": ["8-K", "10-K/A", "S-1", "10-K"],
+        "primaryDocument": ["ev.htm", "xslF345X03/amend.xml", "s1.htm", "10k.htm"],
+        "fileNumber": ["001-0001", "001-0001", "333-0001", "001-0001"]}
+    (tmp_path / "submissions").mkdir()
+    (tmp_path / "submissions" / f"CIK{CIK}.json").write_text(json.dumps({"cik": CIK, "filings": {"recent": recent}}))
+    return make_downloader(rate_limiter=TokenBucketRateLimiter(rate=5))
+
+
+def test_plan_filings_from_local_submissions(tmp_path, dl):
+    with requests_mock.Mocker() as m:
+        plan = dl.plan_filings(CIK, ["8-K", "10-K"], after_date="2022-01-01")
+        assert m.call_count == 0
+    assert [i["accession_number"] for i in plan] == ["000123456722000004", "000123456722000003"]
+    assert plan.items[0]["file_url"] == f"{BASE_URL}/000123456722000004/ev.htm"
+    # the amendment gets the prefered_file_type of 10-K
+    assert plan.items[1]["file_url"] == f"{BASE_URL}/000123456722000003/000123456722000003-xbrl.zip"
+    assert plan.items[1]["fallback_url"] == f"{BASE_URL}/000123456722000003/amend.xml"
+    assert plan.items[1]["save_path"] == str(tmp_path / "filings" / CIK / "10-K.A" / "000123456722000003" / "000123456722000003-xbrl.zip")
+    summary = plan.summary()
+    assert summary["expected_requests"] == 2
+    assert summary["max_requests"] == 3
+    assert summary["estimated_seconds"] == pytest.approx(2 / 5)
+    assert summary["form_types"] == {"8-K": 1, "10-K.A": 1}
+
+
+def test_plan_filings_without_amendments_and_limit(dl):
+    plan = dl.plan_filings(CIK, "10-K", want_amendments=False, number_of_filings=1)
+    assert [i["accession_number"] for i in plan] == ["000123456722000001"]
+
+
+def test_execute_saved_plan(tmp_path, dl):
+    plan = dl.plan_filings(CIK, ["8-K", "S-1"], prefered_file_type="htm")
+    plan.save(tmp_path / "plan.json")
+    loaded = DownloadPlan.load(tmp_path / "plan.json")
+    assert loaded.items == plan.items
+    with requests_mock.Mocker() as m:
+        m.get(f"{BASE_URL}/000123456722000004/ev.htm", content=b"<html></html>")
+        m.get(f"{BASE_URL}/000123456722000002/s1.htm", content=b"<html></html>")
+        dl.execute_plan(loaded, resolve_urls=False)
+        assert m.call_count == 2
+    assert dl.index_handler.has_filing(CIK, "0001234567-22-000004")
+    assert dl.index_handler.has_filing(CIK, "0001234567-22-000002")
+    # already downloaded filings arent planned again
+    assert len(dl.plan_filings(CIK, ["8-K", "S-1"])) == 0
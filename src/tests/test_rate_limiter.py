@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.pysec_downloader.rate_limiter import RateLimiter, TokenBucketRateLimiter, SharedFileRateLimiter
+
+
+def test_token_bucket_spaces_requests():
+    limiter = TokenBucketRateLimiter(rate=50, burst=1)
+    start = time.time()
+    for _ in range(6):
+        limiter.acquire()
+    # first token is free, the other 5 need 1/50s each
+    assert time.time() - start >= 0.09
+
+
+def test_token_bucket_allows_burst():
+    limiter = TokenBucketRateLimiter(rate=1, burst=5)
+    delays = [limiter.reserve() for _ in range(6)]
+    assert delays[:5] == [0, 0, 0, 0, 0]
+    assert delays[5] > 0.9
+
+
+def test_token_bucket_rejects_invalid_arguments():
+    with pytest.raises(ValueError):
+        TokenBucketRateLimiter(rate=0)
+    with pytest.raises(ValueError):
+        TokenBucketRateLimiter(burst=0)
+
+
+def test_shared_file_limiter_shares_budget_between_instances(tmp_path):
+    lock_file = tmp_path / "rate_limit"
+    # separate instances behave like separate processes, they only share the file
+    limiters = [SharedFileRateLimiter(lock_file, rate=50, burst=1) for _ in range(3)]
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        list(pool.map(lambda l: [l.acquire() for _ in range(3)], limiters))
+    # 9 tokens, first is free -> at least 8/50s
+    assert time.time() - start >= 0.15
+
+
+def test_throttling_lowers_and_recovers_effective_rate():
+    limiter = TokenBucketRateLimiter(rate=10, throttle_threshold=2, recovery_step=0.5)
+    limiter.throttled()
+    assert limiter.effective_rate == 10
+    limiter.throttled()
+    assert limiter.effective_rate == 5
+    limiter.succeeded()
+    assert limiter.effective_rate == 10
+
+
+def test_retry_after_pauses_bucket(tmp_path):
+    limiter = SharedFileRateLimiter(tmp_path / "rate_limit", rate=100, burst=5)
+    limiter.throttled(retry_after=2)
+    assert limiter.reserve() > 1.9
+
+
+def test_stats_report_throughput_wait_and_throttling():
+    limiter = TokenBucketRateLimiter(rate=100, burst=1, throttle_threshold=2)
+    for _ in range(11):
+        limiter.acquire()
+    limiter.throttled()
+    limiter.throttled()
+    stats = limiter.stats()
+    assert stats["requests"] == 11
+    assert stats["target_rate"] == 100
+    assert stats["effective_rate"] == 50
+    assert 50 < stats["achieved_rate"] <= 110
+    assert stats["queue_wait_total"] > 0.05
+    assert stats["throttle_events"] == 2
+    assert stats["rate_reductions"] == 1
+
+
+def test_requests_are_scheduled_by_start_time():
+    # slow "responses" dont add to the spacing between request starts
+    limiter = TokenBucketRateLimiter(rate=20, burst=1)
+    start = time.time()
+    for _ in range(5):
+        limiter.acquire()
+        time.sleep(0.04)
+    # 4 * 50ms spacing + 40ms for the last response, not 4 * (50 + 40)ms
+    assert time.time() - start < 0.33
+
+
+def test_acquire_async_doesnt_block_the_event_loop(tmp_path):
+    limiter = SharedFileRateLimiter(tmp_path / "lock", rate=1000)
+    reserve = limiter.reserve
+    limiter.reserve = lambda: time.sleep(0.3) or reserve()
+    ticks = []
+    async def tick():
+        for _ in range(3):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.05)
+    async def main():
+        await asyncio.gather(limiter.acquire_async(), tick())
+    asyncio.run(main())
+    assert ticks[-1] - ticks[0] < 0.25
+
+
+def test_limiter_without_reserve_fails_on_creation():
+    class Incomplete(RateLimiter):
+        @property
+        def effective_rate(self):
+            return 1.0
+    with pytest.raises(TypeError):
+        Incomplete()
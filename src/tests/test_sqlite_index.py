@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import requests_mock
+from src.pysec_downloader.downloader import IndexHandler, SEC_SEARCH_API_URL, EDGAR_ARCHIVES_BASE_URL
+from src.pysec_downloader.sqlite_index import SQLiteIndexHandler
+
+CIK = "0001234567"
+
+
+def _write_filing(root_path, form_type: str, accn: str, file_name: str):
+    file_path = root_path / "filings" / CIK / form_type / accn / file_name
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_bytes(b"<html></html>")
+
+
+@pytest.fixture
+def items():
+    return [
+        ["8-K", "000123456722000001", "doc1.htm", "001-0001", "2022-01-01"],
+        ["8-K", "000123456722000002", "doc2.htm", "001-0001", "2022-02-01"],
+        ["S-1", "000123456722000003", "s1.htm", "333-0001", "2022-03-01"]]
+
+
+def test_downloader_writes_to_sqlite_index(tmp_path, make_downloader, search_hit):
+    index_handler = SQLiteIndexHandler(tmp_path)
+    dl = make_downloader(index_handler=index_handler)
+    hits = [search_hit(CIK, f"0001234567-22-00000{i}", f"doc{i}.htm") for i in range(3)]
+    with requests_mock.Mocker() as m:
+        m.post(SEC_SEARCH_API_URL, [
+            {"json": {"hits": {"hits": hits}, "query": {"size": 100}}},
+            {"json": {"hits": {"hits": []}, "query": {"size": 100}}}])
+        m.get(requests_mock.ANY, content=b"<html></html>")
+        dl.get_filings(CIK, "8-K", resolve_urls=False)
+    assert dl.index_handler is index_handler
+    assert (tmp_path / "index" / "index.sqlite").is_file()
+    assert not (tmp_path / "index" / "base_index" / f"{CIK}.csv").exists()
+    assert len(index_handler.get_local_filings_by_form_type(CIK, "8-K")) == 3
+    assert index_handler.has_filing(CIK, "0001234567-22-000002")
+    assert len(index_handler.get_related_filings(CIK, "001-0001")) == 3
+
+
+def test_migrate_from_files_keeps_query_results(tmp_path, items):
+    csv_index = IndexHandler(tmp_path)
+    csv_index._create_indexes_bulk(CIK, items)
+    sqlite_index = SQLiteIndexHandler(tmp_path)
+    assert sqlite_index.migrate_from_files() == 3
+    assert sqlite_index.migrate_from_files() == 0
+    expected = csv_index.get_local_filings_by_form_type(CIK, "8-K")
+    result = sqlite_index.get_local_filings_by_form_type(CIK, "8-K")
+    assert [r["file_path"] for r in result] == [r["file_path"] for r in expected]
+    assert [r["accession_number"] for r in result] == [r["accession_number"] for r in expected]
+    assert sqlite_index.get_related_filings(CIK, "333-0001") == csv_index.get_related_filings(CIK, "333-0001")
+    with pytest.raises(KeyError):
+        sqlite_index.get_related_filings(CIK, "999-9999")
+
+
+def test_getters_return_the_same_records_as_the_csv_index(tmp_path, items):
+    items.append(["8-K", "000123456722000004", "doc4.htm", "", "2022-04-01"])
+    csv_index = IndexHandler(tmp_path)
+    csv_index._create_indexes_bulk(CIK, items)
+    sqlite_index = SQLiteIndexHandler(tmp_path)
+    sqlite_index._create_indexes_bulk(CIK, items)
+    expected = csv_index.get_local_filings_by_cik(CIK)
+    assert sqlite_index.get_local_filings_by_cik(CIK) == expected
+    assert sqlite_index.get_local_filings_by_form_type(CIK, "8-K") == csv_index.get_local_filings_by_form_type(CIK, "8-K")
+    assert (expected[3]["file_number"], expected[3]["filing_date"]) == (None, "2022-04-01")
+
+
+def test_filing_without_file_number_is_added_once(tmp_path):
+    index_handler = SQLiteIndexHandler(tmp_path)
+    index_handler._create_indexes(CIK, "8-K", "000123456722000001", "doc1.htm", None, "2022-01-01")
+    index_handler._create_indexes(CIK, "8-K", "000123456722000001", "doc1.htm", None, "2022-01-01")
+    index_handler._create_indexes_bulk(CIK, [["8-K", "000123456722000001", "doc1.htm", "", "2022-01-01"]])
+    records = index_handler.get_local_filings_by_cik(CIK)
+    assert len(records) == 1
+    assert records[0]["file_number"] is None
+
+
+def test_only_inserted_rows_are_added_to_the_columnar_index(tmp_path, items):
+    class ColumnarIndexSpy:
+        def __init__(self):
+            self.added = []
+
+        def add(self, cik, items):
+            self.added += items
+
+    index_handler = SQLiteIndexHandler(tmp_path, columnar_index=ColumnarIndexSpy())
+    index_handler._create_indexes_bulk(CIK, items[:2])
+    index_handler._create_indexes_bulk(CIK, items)
+    index_handler._create_indexes(CIK, *items[0])
+    assert index_handler.columnar_index.added == items
+
+
+def test_null_file_numbers_of_older_databases_are_migrated(tmp_path):
+    index_handler = SQLiteIndexHandler(tmp_path)
+    conn = index_handler._get_connection()
+    with conn:
+        row = (CIK, "8-K", "000123456722000001", None, f"{CIK}/8-K/000123456722000001/doc1.htm", "2022-01-01")
+        conn.executemany("INSERT INTO filings VALUES (?, ?, ?, ?, ?, ?)", [row, row])
+        conn.execute("PRAGMA user_version = 0")
+    assert len(SQLiteIndexHandler(tmp_path).get_local_filings_by_cik(CIK)) == 1
+
+
+def test_concurrent_writers(tmp_path):
+    index_handler = SQLiteIndexHandler(tmp_path)
+    def write(worker):
+        for i in range(50):
+            index_handler._create_indexes(CIK, "8-K", f"0001234567220{worker:02d}{i:03d}", "doc.htm", "001-0001", "2022-01-01")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(write, range(4)))
+    # a second handler stands in for another process
+    assert len(SQLiteIndexHandler(tmp_path).get_local_filings_by_cik(CIK)) == 200
+
+
+def test_check_index_removes_missing_files(tmp_path, items):
+    index_handler = SQLiteIndexHandler(tmp_path)
+    index_handler._create_indexes_bulk(CIK, items)
+    _write_filing(tmp_path, "8-K", "000123456722000001", "doc1.htm")
+    report = index_handler.check_index(dry_run=True)
+    assert report["base_index_removed"] == 2
+    assert len(index_handler.get_local_filings_by_cik(CIK)) == 3
+    assert index_handler.check_index()["missing"] == {CIK: [f"{CIK}/8-K/000123456722000002/doc2.htm", f"{CIK}/S-1/000123456722000003/s1.htm"]}
+    assert [r["accession_number"] for r in index_handler.get_local_filings_by_cik(CIK)] == ["000123456722000001"]
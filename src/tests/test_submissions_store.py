@@ -0,0 +1,79 @@
+import json
+import zipfile
+import pytest
+from src.pysec_downloader.downloader import IndexHandler
+
+pa = pytest.importorskip("pyarrow")
+from src.pysec_downloader.submissions_store import SubmissionsStore
+
+
+def _submission(cik: int):
+    return {"cik": str(cik), "filings": {"recent": {
+        "form": ["8-K", "S-3", "10-K"],
+        "accessionNumber": [f"{cik:010d}-22-000003", f"{cik:010d}-22-000002", f"{cik:010d}-21-000001"],
+        "primaryDocument": ["8k.htm", "xslF345X03/s3.xml", "10k.htm"],
+        "filingDate": ["2022-06-01", "2022-05-01", "2021-01-01"],
+        "fileNumber": ["001-1", "333-1", "001-1"]},
+        "files": [{"name": f"CIK{cik:010d}-submissions-001.json", "filingFrom": "2019-01-01", "filingTo": "2019-01-01"}]}}
+
+
+def _page(cik: int):
+    return {
+        "form": ["S-3"],
+        "accessionNumber": [f"{cik:010d}-19-000001"],
+        "primaryDocument": ["old.htm"],
+        "filingDate": ["2019-01-01"],
+        "fileNumber": ["333-0"]}
+
+
+@pytest.fixture
+def submissions(tmp_path):
+    folder = tmp_path / "submissions"
+    folder.mkdir()
+    for cik in range(1, 6):
+        (folder / f"CIK{cik:010d}.json").write_text(json.dumps(_submission(cik)))
+        (folder / f"CIK{cik:010d}-submissions-001.json").write_text(json.dumps(_page(cik)))
+    (folder / "CIK0000000009.json").write_text("{not json")
+    return folder
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_build_and_query(tmp_path, submissions, workers):
+    store = SubmissionsStore(tmp_path)
+    assert not store.is_available()
+    assert store.build(workers=workers, progress=False) == {"files": 11, "filings": 20}
+    assert store.is_available()
+    table = store.query(ciks=["0000000002", "0000000004"], form_types=["S-3"])
+    assert sorted(table.column("accessionNumber").to_pylist()) == [
+        "0000000002-19-000001", "0000000002-22-000002", "0000000004-19-000001", "0000000004-22-000002"]
+    assert store.query(after="2022-06-01").num_rows == 5
+
+
+def test_newer_filings_meta_from_store_matches_the_files(tmp_path, submissions):
+    handler = IndexHandler(tmp_path)
+    from_files = handler.get_newer_filings_meta_batch(["1", "2", "7"], "2022-01-01", set(["S-3"]))
+    # includes the filings of the submissions-001 pages
+    history_from_files = handler.get_newer_filings_meta_batch(["1", "2"], "2018-01-01")
+    handler.submissions_store.build(workers=1, progress=False)
+    from_store = handler.get_newer_filings_meta_batch(["1", "2", "7"], "2022-01-01", set(["S-3"]))
+    assert from_store == from_files
+    assert handler.get_newer_filings_meta_batch(["1", "2"], "2018-01-01") == history_from_files
+    assert from_store == {
+        "0000000001": [["S-3", "000000000122000002", "s3.xml", "2022-05-01", ["333-1"]]],
+        "0000000002": [["S-3", "000000000222000002", "s3.xml", "2022-05-01", ["333-1"]]],
+        "0000000007": []}
+    assert [f[0] for f in handler.get_newer_filings_meta("3", "2020-01-01")["0000000003"]] == ["8-K", "S-3", "10-K"]
+
+
+def test_store_is_not_used_once_the_submissions_change(tmp_path):
+    with zipfile.ZipFile(tmp_path / "submissions.zip", "w") as z:
+        z.writestr("CIK0000000001.json", json.dumps(_submission(1)))
+    store = SubmissionsStore(tmp_path)
+    assert store.build(workers=1, progress=False)["filings"] == 3
+    assert store.is_available()
+    with zipfile.ZipFile(tmp_path / "submissions.zip", "a") as z:
+        z.writestr("CIK0000000002.json", json.dumps(_submission(2)))
+    assert not store.is_available()
+    store.build(workers=1, progress=False)
+    store.invalidate()
+    assert not store.is_available()
@@ -0,0 +1,80 @@
+import json
+import os
+import pytest
+import requests_mock
+from src.pysec_downloader.downloader import EDGAR_ARCHIVES_BASE_URL
+from src.pysec_downloader.watcher import FilingsWatcher
+
+CIK = "0000000001"
+
+
+def _write_submission(root_path, cik: str, filings: list[tuple]):
+    '''filings: [(form, accession_number, filing_date)], newest first'''
+    recent = {
+        "form": [f[0] for f in filings],
+        "accessionNumber": [f[1] for f in filings],
+        "primaryDocument": [f"doc{i}.htm" for i in range(len(filings))],
+        "filingDate": [f[2] for f in filings],
+        "fileNumber": ["333-1" for _ in filings]}
+    path = root_path / "submissions" / f"CIK{cik}.json"
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(json.dumps({"filings": {"recent": recent}}))
+    # make sure the mtime changes even on filesystems with a coarse resolution
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + len(filings) * 1_000_000_000))
+
+
+def test_poll_reports_only_new_filings(tmp_path, dl, monkeypatch):
+    _write_submission(tmp_path, CIK, [("S-3", "0000000001-22-000002", "2022-05-01"), ("8-K", "0000000001-21-000001", "2021-01-01")])
+    watcher = FilingsWatcher(dl, ["1", "2"], tracked_filings=set(["S-3", "S-1"]), after="2021-01-01")
+    assert watcher.poll() == {CIK: [["S-3", "000000000122000002", "doc0.htm", "2022-05-01", ["333-1"]]]}
+    watcher.commit()
+    # unchanged file, the submission isnt read again
+    with monkeypatch.context() as mp:
+        mp.setattr(dl.index_handler, "_iter_submission_filings", None)
+        assert watcher.poll() == {}
+    _write_submission(tmp_path, CIK, [
+        ("S-1", "0000000001-22-000004", "2022-07-01"),
+        ("8-K", "0000000001-22-000003", "2022-06-01"),
+        ("S-3", "0000000001-22-000002", "2022-05-01"),
+        ("8-K", "0000000001-21-000001", "2021-01-01")])
+    # the marks are kept in a file
+    watcher = FilingsWatcher(dl, [CIK], tracked_filings=set(["S-3", "S-1"]))
+    assert [f[1] for f in watcher.poll()[CIK]] == ["000000000122000004"]
+    # not committed, reported again
+    assert [f[1] for f in watcher.poll()[CIK]] == ["000000000122000004"]
+
+
+def test_first_poll_without_after_only_sets_the_mark(tmp_path, dl):
+    _write_submission(tmp_path, CIK, [("S-3", "0000000001-22-000002", "2022-05-01")])
+    watcher = FilingsWatcher(dl, [CIK])
+    assert watcher.poll() == {}
+    watcher.commit()
+    _write_submission(tmp_path, CIK, [("8-K", "0000000001-22-000003", "2022-06-01"), ("S-3", "0000000001-22-000002", "2022-05-01")])
+    assert [f[0] for f in watcher.poll()[CIK]] == ["8-K"]
+
+
+def test_download_new_commits_downloaded_ciks(tmp_path, dl):
+    _write_submission(tmp_path, CIK, [("S-3", "0000000001-22-000003", "2022-06-01"), ("S-3", "0000000001-22-000002", "2022-05-01")])
+    _write_submission(tmp_path, "0000000002", [("S-3", "0000000002-22-000001", "2022-05-01")])
+    watcher = FilingsWatcher(dl, [CIK, "0000000002"], after="2022-01-01")
+    with requests_mock.Mocker() as m:
+        m.get(f"{EDGAR_ARCHIVES_BASE_URL}/{CIK}/000000000122000002/doc1.htm", content=b"<html></html>")
+        m.get(f"{EDGAR_ARCHIVES_BASE_URL}/{CIK}/000000000122000003/doc0.htm", content=b"<html></html>")
+        m.get(f"{EDGAR_ARCHIVES_BASE_URL}/0000000002/000000000222000001/doc0.htm", exc=ConnectionError)
+        stats = watcher.download_new(batch_size=1)
+    assert stats == {"new_filings": 3, "downloaded": 2, "failed": 1}
+    assert dl.index_handler.has_filing(CIK, "000000000122000002")
+    assert dl.index_handler.has_filing(CIK, "000000000122000003")
+    # the cik with the failed download is reported again
+    assert list(watcher.poll().keys()) == ["0000000002"]
+
+
+def test_download_new_keeps_the_mark_if_no_file_was_received(tmp_path, dl, monkeypatch):
+    _write_submission(tmp_path, CIK, [("S-3", "0000000001-22-000002", "2022-05-01")])
+    watcher = FilingsWatcher(dl, [CIK], after="2022-01-01")
+    monkeypatch.setattr(dl, "_download_filing", lambda *args, **kwargs: (None, None))
+    assert watcher.download_new() == {"new_filings": 1, "downloaded": 0, "failed": 1}
+    assert not dl.index_handler.has_filing(CIK, "000000000122000002")
+    assert CIK not in watcher._state
+    assert [f[1] for f in watcher.poll()[CIK]] == ["000000000122000002"]